@@ -0,0 +1,29 @@
+"""
+Benchmarks for srcomp-cli.
+
+Each suite compares its results against baselines stored alongside it, failing
+if any have regressed.
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from benchmarks import commands, scheduler
+
+
+def argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    subparsers = parser.add_subparsers(title="suites", required=True)
+    commands.add_subparser(subparsers)
+    scheduler.add_subparser(subparsers)
+    return parser
+
+
+def main() -> None:
+    settings = argument_parser().parse_args()
+    settings.func(settings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Storage of benchmark results and comparison against stored baselines.
+
+Results map the name of each benchmark to the values of its metrics. Baselines
+are results which have been stored as JSON, against which later results are
+compared. A value regresses if it exceeds its baseline by more than both the
+relative and absolute tolerances of its metric; the absolute tolerance stops
+small values (where noise dominates) from failing spuriously.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Mapping, NamedTuple
+
+Results = Dict[str, Dict[str, float]]
+
+
+class Metric(NamedTuple):
+    description: str
+    relative_tolerance: float
+    absolute_tolerance: float
+
+
+class Regression(NamedTuple):
+    benchmark: str
+    metric: str
+    value: float
+    baseline: float
+
+
+def load(path: Path) -> Results:
+    if not path.exists():
+        return {}
+
+    with path.open() as f:
+        results: Results = json.load(f)
+        return results
+
+
+def save(path: Path, results: Results) -> None:
+    """Store the given results, keeping any baselines not included in them."""
+    baselines = load(path)
+    baselines.update(
+        (benchmark, {name: round(value, 1) for name, value in values.items()})
+        for benchmark, values in results.items()
+    )
+
+    with path.open(mode='w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def is_regression(metric: Metric, value: float, baseline: float) -> bool:
+    return (
+        value > baseline * (1 + metric.relative_tolerance) and
+        value > baseline + metric.absolute_tolerance
+    )
+
+
+def find_regressions(
+    results: Results,
+    baselines: Results,
+    metrics: Mapping[str, Metric],
+) -> list[Regression]:
+    regressions = []
+    for benchmark, values in results.items():
+        for name, value in values.items():
+            baseline = baselines.get(benchmark, {}).get(name)
+            if baseline is not None and is_regression(metrics[name], value, baseline):
+                regressions.append(Regression(benchmark, name, value, baseline))
+    return regressions
+
+
+def print_report(
+    results: Results,
+    baselines: Results,
+    metrics: Mapping[str, Metric],
+) -> None:
+    from tabulate import tabulate
+
+    rows = []
+    for benchmark, values in results.items():
+        for name, value in values.items():
+            baseline = baselines.get(benchmark, {}).get(name)
+            if baseline is None:
+                change, status = None, "new"
+            else:
+                change = f'{(value - baseline) / baseline:+.0%}' if baseline else None
+                status = "REGRESSED" if is_regression(metrics[name], value, baseline) else ""
+            rows.append([
+                benchmark,
+                metrics[name].description,
+                value,
+                baseline,
+                change,
+                status,
+            ])
+
+    print(tabulate(
+        rows,
+        headers=["Benchmark", "Metric", "Value", "Baseline", "Change", ""],
+        floatfmt='.1f',
+    ))
+
+
+def check(
+    results: Results,
+    path: Path,
+    metrics: Mapping[str, Metric],
+    update: bool,
+) -> None:
+    """
+    Report the results against the baselines at the given path, exiting with
+    an error if any have regressed. If ``update`` is set then the results are
+    stored as the new baselines instead.
+    """
+    baselines = load(path)
+    print_report(results, baselines, metrics)
+
+    if update:
+        save(path, results)
+        print(f"Baselines written to {path}.")
+        return
+
+    regressions = find_regressions(results, baselines, metrics)
+    if regressions:
+        print(file=sys.stderr)
+        for regression in regressions:
+            print(
+                f"{regression.benchmark}: {metrics[regression.metric].description} "
+                f"regressed from {regression.baseline:.1f} to {regression.value:.1f}",
+                file=sys.stderr,
+            )
+        exit(f"{len(regressions)} benchmark(s) regressed.")
@@ -0,0 +1,293 @@
+"""
+Benchmark the startup and latency of srcomp commands.
+
+For every command this measures how long it takes a fresh interpreter to import
+what is needed to run it and how many modules that pulls in. For each of the
+commands which read a compstate it also measures, against each of the given
+compstates:
+
+- the latency when run in a fresh interpreter with no snapshot of the compstate
+  cached (cold), along with the peak RSS of that process
+- the latency when run again within an interpreter which has already run it,
+  with a snapshot cached (warm)
+
+By default the compstate in ``tests/dummy`` is used, along with a large
+synthetic compstate generated using ``tests.compstate_factory``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Sequence
+
+from benchmarks import baselines
+from benchmarks.baselines import Metric, Results
+
+ROOT = Path(__file__).parent.parent
+DUMMY_COMPSTATE = ROOT / 'tests' / 'dummy'
+BASELINES = Path(__file__).parent / 'baselines' / 'commands.json'
+
+# Named by the directory they're generated into, which is what results are
+# stored against.
+SYNTHETIC_COMPSTATES: dict[str, dict[str, Any]] = {
+    'synthetic-200-teams': {
+        'num_teams': 200,
+        'num_arenas': 3,
+        'corners': 4,
+        'rounds': 12,
+        'knockout_size': 32,
+        'scored': 1,
+    },
+}
+
+METRICS = {
+    'import_ms': Metric("import time (ms)", 0.5, 20),
+    'modules': Metric("modules imported", 0.1, 10),
+    'cold_ms': Metric("cold latency (ms)", 0.5, 50),
+    'warm_ms': Metric("warm latency (ms)", 0.5, 10),
+    'peak_rss_mib': Metric("peak RSS (MiB)", 0.2, 5),
+}
+
+# Commands which read a compstate (given as their first argument) without
+# modifying it, along with any further arguments they need.
+COMPSTATE_COMMANDS: list[tuple[str, ...]] = [
+    ('awards',),
+    ('knocked-out-teams',),
+    ('match-order-teams',),
+    ('show-league-table',),
+    ('show-match-scores',),
+    ('show-schedule',),
+    ('summary',),
+    ('top-match-points',),
+    ('validate',),
+    ('youtube-chapters', '600'),
+]
+
+IMPORT_CODE = '''
+import json, sys, time
+before = len(sys.modules)
+start = time.perf_counter()
+from sr.comp.cli.command_line import argument_parser
+argument_parser(commands=sys.argv[1:])
+duration = time.perf_counter() - start
+print(json.dumps({'seconds': duration, 'modules': len(sys.modules) - before}))
+'''
+
+# The peak RSS is read from within the process since on Linux the maximum RSS
+# reported by getrusage includes that of the parent before exec.
+MAIN_CODE = '''
+import atexit, os
+def record_peak_rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                with open(os.environ['BENCHMARK_RSS_FILE'], mode='w') as out:
+                    out.write(line.split()[1])
+atexit.register(record_peak_rss)
+from sr.comp.cli.command_line import main
+main()
+'''
+
+
+def measure_import(command: str) -> dict[str, float]:
+    """Measure what a fresh interpreter needs to import to run the command."""
+    import json
+
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_CODE, command],
+        text=True,
+    )
+    result = json.loads(output)
+    return {'import_ms': result['seconds'] * 1000, 'modules': result['modules']}
+
+
+def run_fresh(args: Sequence[str], env: dict[str, str]) -> tuple[float, float]:
+    """
+    Run srcomp with the given arguments in a fresh interpreter.
+
+    Returns the wall time in seconds and the peak RSS in MiB.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        rss_file = Path(tmp) / 'rss'
+
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', MAIN_CODE, *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            env=dict(env, BENCHMARK_RSS_FILE=str(rss_file)),
+        )
+        duration = time.perf_counter() - start
+
+        if result.returncode != 0:
+            raise RuntimeError(f"srcomp {' '.join(args)} failed:\n{result.stderr}")
+
+        peak_rss_kib = int(rss_file.read_text())
+
+    return duration, peak_rss_kib / 1024
+
+
+def run_in_process(args: list[str]) -> float:
+    from sr.comp.cli.command_line import run_captured
+
+    start = time.perf_counter()
+    exit_code, _, stderr = run_captured(args)
+    duration = time.perf_counter() - start
+
+    if exit_code != 0:
+        raise RuntimeError(f"srcomp {' '.join(args)} failed:\n{stderr}")
+
+    return duration
+
+
+def measure_command(
+    compstate: Path,
+    command: tuple[str, ...],
+    repeat: int,
+) -> dict[str, float]:
+    name, *extra_args = command
+    args = [name, str(compstate), *extra_args]
+
+    # Never use a snapshot when cold
+    cold_env = dict(os.environ, SRCOMP_CACHE_DIR='')
+    cold_runs = [run_fresh(args, cold_env) for _ in range(repeat)]
+
+    # The first run imports the command and caches a snapshot
+    run_in_process(args)
+    warm_runs = [run_in_process(args) for _ in range(repeat)]
+
+    return {
+        'cold_ms': statistics.median(x for x, _ in cold_runs) * 1000,
+        'warm_ms': statistics.median(warm_runs) * 1000,
+        'peak_rss_mib': max(x for _, x in cold_runs),
+    }
+
+
+def has_compstate(path: Path) -> bool:
+    # An uninitialised submodule is an empty directory
+    return (path / 'teams.yaml').exists()
+
+
+def run_benchmarks(
+    compstates: Sequence[Path],
+    commands: Sequence[str] | None,
+    repeat: int,
+) -> Results:
+    from sr.comp.cli.command_line import COMMANDS
+
+    results: Results = {}
+
+    for name in ['list-commands', *COMMANDS.keys()]:
+        if commands is None or name in commands:
+            print(f"Importing {name}", file=sys.stderr)
+            import_runs = [measure_import(name) for _ in range(repeat)]
+            results[f'import {name}'] = {
+                'import_ms': statistics.median(x['import_ms'] for x in import_runs),
+                'modules': max(x['modules'] for x in import_runs),
+            }
+
+    for compstate in compstates:
+        for command in COMPSTATE_COMMANDS:
+            if commands is None or command[0] in commands:
+                print(f"Running {command[0]} against {compstate.name}", file=sys.stderr)
+                results[f'{compstate.name} {command[0]}'] = measure_command(
+                    compstate,
+                    command,
+                    repeat,
+                )
+
+    return results
+
+
+def command(args: argparse.Namespace) -> None:
+    compstates: list[Path] = args.compstates
+    if not compstates:
+        if has_compstate(DUMMY_COMPSTATE):
+            compstates = [DUMMY_COMPSTATE]
+        else:
+            print(
+                f"Skipping compstate benchmarks as {DUMMY_COMPSTATE} is not "
+                "available (is the submodule initialised?).",
+                file=sys.stderr,
+            )
+
+    for compstate in compstates:
+        if not has_compstate(compstate):
+            exit(f"{compstate} is not a compstate.")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Use a clean snapshot cache and ensure that no running `srcomp serve`
+        # answers the commands for us.
+        os.environ['SRCOMP_CACHE_DIR'] = str(Path(tmp) / 'cache')
+        os.environ['XDG_RUNTIME_DIR'] = str(Path(tmp) / 'run')
+
+        if args.synthetic:
+            from tests.compstate_factory import build_compstate
+
+            for name, config in SYNTHETIC_COMPSTATES.items():
+                print(f"Generating {name}", file=sys.stderr)
+                compstate = Path(tmp) / name
+                build_compstate(compstate, **config)
+                compstates.append(compstate)
+
+        results = run_benchmarks(compstates, args.commands, args.repeat)
+
+    baselines.check(results, args.baselines, METRICS, update=args.update_baselines)
+
+
+def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]) -> None:
+    help_msg, *_ = __doc__.strip().splitlines()
+    parser = subparsers.add_parser(
+        'commands',
+        help=help_msg,
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--compstate',
+        dest='compstates',
+        type=Path,
+        action='append',
+        default=[],
+        help="a compstate to run the commands against; may be given more than "
+             "once (default: tests/dummy). Results are stored by the name of the "
+             "compstate's directory.",
+    )
+    parser.add_argument(
+        '--no-synthetic',
+        dest='synthetic',
+        action='store_false',
+        help="don't run the commands against the synthetic compstates",
+    )
+    parser.add_argument(
+        '--command',
+        dest='commands',
+        action='append',
+        help="only benchmark the given command; may be given more than once",
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help="how many times to run each measurement (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--baselines',
+        type=Path,
+        default=BASELINES,
+        help="file of baselines to compare against (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--update-baselines',
+        action='store_true',
+        help="store the results as the new baselines rather than checking them",
+    )
+    parser.set_defaults(func=command)
@@ -0,0 +1,182 @@
+"""
+Benchmark the league scheduler across a range of league shapes.
+
+Starting from a typical league, this varies each of the team count, arena
+count, corners per arena, spacing and appearances per round in turn and
+schedules a league of several rounds with each search (as ``schedule-league
+--search``) using fixed seeds. It measures the time taken to find a schedule
+along with the number of rounds proposed and how many times the search
+backtracked. Shapes which can't meet the spacing (where a round has no more
+matches than the spacing) are skipped.
+
+Each run is limited in time, so that shapes for which a search struggles
+don't hold up the rest; runs which reach the limit count the matches they
+left unscheduled instead of the rounds proposed and backtracks.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import statistics
+import sys
+import time
+from contextlib import redirect_stderr
+from pathlib import Path
+from typing import Any, Iterator, NamedTuple, Sequence
+
+from benchmarks import baselines
+from benchmarks.baselines import Metric, Results
+
+BASELINES = Path(__file__).parent / 'baselines' / 'scheduler.json'
+
+DIMENSIONS = {
+    'num_teams': (24, 60, 120, 240),
+    'num_arenas': (1, 2, 3),
+    'num_corners': (2, 3, 4),
+    'spacing': (1, 2, 3, 4),
+    'appearances_per_round': (1, 2),
+}
+SEARCHES = ('shuffle', 'anneal')
+
+NUM_ROUNDS = 6
+SEEDS = (1, 2, 3)
+
+METRICS = {
+    'time_ms': Metric("time to schedule (ms)", 0.5, 50),
+    'attempts': Metric("rounds proposed", 0.2, 100),
+    'backtracks': Metric("backtracks", 0.2, 2),
+    'unscheduled': Metric("matches left unscheduled", 0, 0),
+}
+
+
+class LeagueShape(NamedTuple):
+    num_teams: int
+    num_arenas: int
+    num_corners: int
+    spacing: int
+    appearances_per_round: int
+    search: str
+
+    @property
+    def name(self) -> str:
+        return (
+            f'{self.search} {self.num_teams} teams, {self.num_arenas} arenas, '
+            f'{self.num_corners} corners, spacing {self.spacing}, '
+            f'{self.appearances_per_round} appearances'
+        )
+
+    @property
+    def round_length(self) -> int:
+        entrants = self.num_teams * self.appearances_per_round
+        entrants_per_match = self.num_arenas * self.num_corners
+        return -(-entrants // entrants_per_match)
+
+
+# The shape which the matrix varies, one dimension at a time
+BASE_SHAPE = LeagueShape(
+    num_teams=60,
+    num_arenas=2,
+    num_corners=4,
+    spacing=2,
+    appearances_per_round=1,
+    search='shuffle',
+)
+
+
+def league_shapes(searches: Sequence[str]) -> Iterator[LeagueShape]:
+    seen = set()
+    for dimension, values in DIMENSIONS.items():
+        for value in values:
+            for search in searches:
+                overrides: dict[str, Any] = {dimension: value, 'search': search}
+                shape = BASE_SHAPE._replace(**overrides)
+                if shape not in seen and shape.round_length > shape.spacing:
+                    seen.add(shape)
+                    yield shape
+
+
+def run_scheduler(shape: LeagueShape, seed: int, time_limit: float) -> dict[str, float]:
+    from sr.comp.cli.league_scheduler import Scheduler
+
+    with redirect_stderr(io.StringIO()):
+        scheduler = Scheduler(
+            teams=[f'T{n:03d}' for n in range(shape.num_teams)],
+            max_match_periods=NUM_ROUNDS * shape.round_length,
+            arenas=[chr(ord('A') + n) for n in range(shape.num_arenas)],
+            num_corners=shape.num_corners,
+            random=random.Random(seed),
+            appearances_per_round=shape.appearances_per_round,
+            separation=shape.spacing,
+            enable_lcg=False,
+            search=shape.search,
+            time_limit=time_limit,
+        )
+
+        start = time.perf_counter()
+        matches = scheduler.run()
+        duration = time.perf_counter() - start
+
+    results = {
+        'time_ms': duration * 1000,
+        'unscheduled': scheduler.total_matches - len(matches),
+    }
+    if not scheduler.timed_out:
+        # The progress made before the time limit depends on the machine
+        stats = scheduler.stats.summary()
+        results.update(attempts=stats['attempts'], backtracks=stats['backtracks'])
+    return results
+
+
+def measure_shape(shape: LeagueShape, time_limit: float) -> dict[str, float]:
+    runs = [run_scheduler(shape, seed, time_limit) for seed in SEEDS]
+    return {
+        metric: statistics.median(run[metric] for run in runs)
+        for metric in METRICS
+        if all(metric in run for run in runs)
+    }
+
+
+def command(args: argparse.Namespace) -> None:
+    results: Results = {}
+    for shape in league_shapes(args.searches or SEARCHES):
+        print(f"Scheduling {shape.name}", file=sys.stderr)
+        results[shape.name] = measure_shape(shape, args.time_limit)
+
+    baselines.check(results, args.baselines, METRICS, update=args.update_baselines)
+
+
+def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]) -> None:
+    help_msg, *_ = __doc__.strip().splitlines()
+    parser = subparsers.add_parser(
+        'scheduler',
+        help=help_msg,
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--search',
+        dest='searches',
+        choices=SEARCHES,
+        action='append',
+        help="only benchmark the given search; may be given more than once",
+    )
+    parser.add_argument(
+        '--time-limit',
+        type=float,
+        default=2,
+        help="time limit for scheduling each league, in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--baselines',
+        type=Path,
+        default=BASELINES,
+        help="file of baselines to compare against (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--update-baselines',
+        action='store_true',
+        help="store the results as the new baselines rather than checking them",
+    )
+    parser.set_defaults(func=command)
@@ -83,8 +83,8 @@ def parse_datetime(when_str: str) -> datetime.datetime:
 
 
 def get_current_match_start(compstate_path: Path) -> datetime.datetime:
-    from sr.comp.comp import SRComp
-    compstate = SRComp(compstate_path)
+    from sr.comp.cli import comp_loader
+    compstate = comp_loader.load(compstate_path)
     now = compstate.schedule.datetime_now
     current_matches = tuple(compstate.schedule.matches_at(now))
     if not current_matches:
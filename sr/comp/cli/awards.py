@@ -8,10 +8,10 @@ from sr.comp.types import TLA
 def command(settings: argparse.Namespace) -> None:
     import os.path
 
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
     from sr.comp.winners import Award
 
-    comp = SRComp(os.path.realpath(settings.compstate))
+    comp = comp_loader.load(os.path.realpath(settings.compstate))
 
     def format_team(tla: TLA) -> str:
         team = comp.teams[tla]
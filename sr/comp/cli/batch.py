@@ -0,0 +1,144 @@
+"""
+Run many commands against a compstate, loading it only once.
+
+Commands are read one per line from the given script file, or from stdin if no
+file is given. Each line is a command name followed by its arguments, quoted as
+for a shell, but without the compstate: the compstate given to this command is
+inserted as the first argument of each. Blank lines and lines starting with
+``#`` are ignored. For example::
+
+    summary
+    show-league-table
+    awards
+    knocked-out-teams
+
+The compstate is loaded before the first command and is then shared by all of
+them. If a command changes the compstate (for example ``add-delay``) then it is
+reloaded before it is next used.
+
+Each command's output is preceded by a header line of the form ``==> <command
+line> <==``. Any errors a command reports are written to stderr and a command
+which fails does not stop later commands from running, though the exit status
+of this command will reflect the failure. Lines which can't be parsed (for
+example because of an unbalanced quote) are reported as failed commands, with
+exit status 2. Use ``--json`` for output which is simpler to parse: a JSON
+object per command, one per line, holding the command's line, its arguments
+(``null`` if the line couldn't be parsed), exit code, stdout and stderr.
+
+Commands which ask for input (such as ``deploy``) are not suited to running in a
+batch, as their prompts are captured along with the rest of their output.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Iterator, TextIO
+
+# Commands which don't make sense within a batch
+UNSUPPORTED_COMMANDS = ('batch', 'serve')
+
+
+def read_commands(source: TextIO, prompt: str | None) -> Iterator[str]:
+    """Read the lines of the commands to run."""
+    while True:
+        if prompt:
+            print(prompt, end='', file=sys.stderr, flush=True)
+
+        line = source.readline()
+        if not line:
+            return
+
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def run_command(compstate: str, command: list[str]) -> tuple[int, str, str]:
+    from sr.comp.cli.command_line import run_captured
+
+    name, *args = command
+    if name in UNSUPPORTED_COMMANDS:
+        return 1, '', f"Cannot run {name!r} within a batch.\n"
+
+    return run_captured([name, compstate, *args])
+
+
+def command(settings: argparse.Namespace) -> None:
+    import json
+    import shlex
+
+    from sr.comp.cli import comp_loader
+
+    compstate = comp_loader.WatchedCompstate(Path(settings.compstate))
+
+    if settings.script is None:
+        source = sys.stdin
+        prompt = 'srcomp> ' if sys.stdin.isatty() else None
+    else:
+        source = settings.script.open()
+        prompt = None
+
+    num_failures = 0
+    with source, comp_loader.preloaded(compstate):
+        for line in read_commands(source, prompt):
+            command: list[str] | None
+            try:
+                command = shlex.split(line)
+            except ValueError as e:
+                # Report as argparse does for bad arguments
+                command = None
+                exit_code, stdout, stderr = 2, '', f"Cannot parse {line!r}: {e}.\n"
+            else:
+                exit_code, stdout, stderr = run_command(settings.compstate, command)
+                line = shlex.join(command)
+
+            if exit_code != 0:
+                num_failures += 1
+
+            if settings.json:
+                print(json.dumps({
+                    'line': line,
+                    'command': command,
+                    'exit_code': exit_code,
+                    'stdout': stdout,
+                    'stderr': stderr,
+                }))
+            else:
+                print(f"==> {line} <==")
+                sys.stdout.write(stdout)
+                sys.stderr.write(stderr)
+                if exit_code != 0:
+                    print(
+                        f"{line!r} failed with exit status {exit_code}.",
+                        file=sys.stderr,
+                    )
+
+            sys.stdout.flush()
+
+    if num_failures:
+        exit(f"{num_failures} command(s) failed.")
+
+
+def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]) -> None:
+    help_msg, *_ = __doc__.strip().splitlines()
+    parser = subparsers.add_parser(
+        'batch',
+        help=help_msg,
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('compstate', help="competition state repository")
+    parser.add_argument(
+        'script',
+        nargs='?',
+        type=Path,
+        help="file of commands to run (default: read from stdin)",
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help="output a JSON object for each command rather than plain text",
+    )
+    parser.set_defaults(func=command)
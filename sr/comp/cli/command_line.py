@@ -4,33 +4,151 @@ from __future__ import annotations
 
 import argparse
 import sys
+from pathlib import Path
+from typing import Collection, NamedTuple
 
-from . import (
-    add_delay,
-    awards,
-    delay,
-    deploy,
-    fetch,
-    for_each_match,
-    import_schedule,
-    knocked_out_teams,
-    lighting_controller,
-    list_midi_ports,
-    match_order_teams,
-    print_schedule,
-    schedule_league,
-    scorer,
-    shift_matches,
-    show_league_table,
-    show_match_scores,
-    show_schedule,
-    summary,
-    top_match_points,
-    update_layout,
-    validate,
-    yaml_round_trip,
-    youtube_chapters,
-)
+from sr.comp.cli import timings
+
+
+class Command(NamedTuple):
+    module: str
+    """The dotted path of the module providing the command's ``add_subparser``."""
+
+    help_text: str
+    """Summary of the command, shown in the top-level help."""
+
+    servable: bool = False
+    """
+    Whether the command only reads the compstate and so can be answered by a
+    running ``srcomp serve`` for that compstate.
+    """
+
+
+# Commands are registered by name rather than imported directly so that only
+# the module for the command actually being run needs to be imported. Some of
+# the command modules are relatively expensive to import and many invocations
+# (for example ``list-commands`` from bash completion) don't need them at all.
+COMMANDS: dict[str, Command] = {
+    'add-delay': Command(
+        'sr.comp.cli.add_delay',
+        "Add a delay the competition state.",
+    ),
+    'awards': Command(
+        'sr.comp.cli.awards',
+        "Show who has been given awards.",
+        servable=True,
+    ),
+    'batch': Command(
+        'sr.comp.cli.batch',
+        "Run many commands against a compstate, loading it only once.",
+    ),
+    'delay': Command(
+        'sr.comp.cli.delay',
+        "Add and deploy a delay to the competition.",
+    ),
+    'deploy': Command(
+        'sr.comp.cli.deploy',
+        "Deploy the compstate to its various deployments.",
+    ),
+    'fetch': Command(
+        'sr.comp.cli.fetch',
+        "Fetch the deployed revisions of the compstate from all known hosts.",
+    ),
+    'for-each-match': Command(
+        'sr.comp.cli.for_each_match',
+        "Run a command for each of the given matches.",
+    ),
+    'import-schedule': Command(
+        'sr.comp.cli.import_schedule',
+        "Import a league.yaml file from a schedule file.",
+    ),
+    'knocked-out-teams': Command(
+        'sr.comp.cli.knocked_out_teams',
+        "Show the teams knocked out of each knockout round.",
+        servable=True,
+    ),
+    'list-midi-ports': Command(
+        'sr.comp.cli.list_midi_ports',
+        "List available MIDI output ports.",
+    ),
+    'lighting-controller': Command(
+        'sr.comp.cli.lighting_controller',
+        "A way of controlling lights at the competition.",
+    ),
+    'match-order-teams': Command(
+        'sr.comp.cli.match_order_teams',
+        "Shows a list of teams, ordered by their first matches.",
+    ),
+    'print-schedule': Command(
+        'sr.comp.cli.print_schedule',
+        "Produce a PDF shepherding sheet, suitable for printing.",
+    ),
+    'schedule-league': Command(
+        'sr.comp.cli.schedule_league',
+        "Generate a schedule for a league.",
+    ),
+    'seed-schedules': Command(
+        'sr.comp.cli.seed_schedules',
+        "Summarise a directory of seed schedules.",
+    ),
+    'score': Command(
+        'sr.comp.cli.scorer',
+        "Run the SRComp Scorer UI. Requires ``sr.comp.scorer`` to be installed.",
+    ),
+    'serve': Command(
+        'sr.comp.cli.serve',
+        "Serve a loaded compstate to other commands, reloading it when it changes.",
+    ),
+    'shift-matches': Command(
+        'sr.comp.cli.shift_matches',
+        "Shift the matches to start at the current time.",
+    ),
+    'show-league-table': Command(
+        'sr.comp.cli.show_league_table',
+        "Show the current state of the league table.",
+        servable=True,
+    ),
+    'show-match-scores': Command(
+        'sr.comp.cli.show_match_scores',
+        "Show the game and league points achieved for each match",
+        servable=True,
+    ),
+    'show-schedule': Command(
+        'sr.comp.cli.show_schedule',
+        "Show the match schedule.",
+        servable=True,
+    ),
+    'summary': Command(
+        'sr.comp.cli.summary',
+        "Show summary data about a compstate.",
+        servable=True,
+    ),
+    'top-match-points': Command(
+        'sr.comp.cli.top_match_points',
+        "Summaries the teams scoring the most match points.",
+        servable=True,
+    ),
+    'update-layout': Command(
+        'sr.comp.cli.update_layout',
+        "Update the layout based on a list of teams.",
+    ),
+    'validate': Command(
+        'sr.comp.cli.validate',
+        "Check that the compstate can be loaded and represents a valid state.",
+    ),
+    'round-trip': Command(
+        'sr.comp.cli.yaml_round_trip',
+        "Round-trip a yaml file using compstate loading.",
+    ),
+    'youtube-chapters': Command(
+        'sr.comp.cli.youtube_chapters',
+        'Determine the "chapter" timings for a Youtube livestream based on the '
+        'match timings.',
+    ),
+}
+
+# Options which are accepted before the command name and which take a value
+GLOBAL_OPTIONS_WITH_VALUES = ('--timings-trace', '--profile')
 
 
 def add_list_commands(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]) -> None:
@@ -45,47 +163,174 @@ def add_list_commands(subparsers: argparse._SubParsersAction[argparse.ArgumentPa
     parser.set_defaults(func=command)
 
 
-def argument_parser() -> argparse.ArgumentParser:
-    """A parser for CLI tool command line arguments, from argparse."""
-    parser = argparse.ArgumentParser(description="srcomp command-line interface")
+def add_subparser(
+    subparsers: argparse._SubParsersAction[argparse.ArgumentParser],
+    name: str,
+) -> None:
+    import importlib
+
+    with timings.phase('import command'):
+        module = importlib.import_module(COMMANDS[name].module)
+    module.add_subparser(subparsers)
+
+
+def add_global_options(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group(
+        "profiling",
+        description="Options for finding out where the time goes when running "
+                    "a command. These must be given before the command name.",
+    )
+    group.add_argument(
+        '--timings',
+        action='store_true',
+        help="print how long each phase of running the command took to stderr",
+    )
+    group.add_argument(
+        '--timings-trace',
+        type=Path,
+        metavar='PATH',
+        help="write the timings of each phase to PATH as a JSON trace, "
+             "viewable in Perfetto or chrome://tracing (implies --timings)",
+    )
+    group.add_argument(
+        '--profile',
+        type=Path,
+        metavar='PATH',
+        help="profile the command using cProfile, writing the statistics to "
+             "PATH in pstats format (implies --timings)",
+    )
+
+
+def find_command_name(args: list[str]) -> str | None:
+    """Find the name of the command being run, without doing a full parse."""
+    args_iter = iter(args)
+    for arg in args_iter:
+        if arg in GLOBAL_OPTIONS_WITH_VALUES:
+            # Skip the option's value
+            next(args_iter, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+
+def argument_parser(commands: Collection[str] | None = None) -> argparse.ArgumentParser:
+    """
+    A parser for CLI tool command line arguments, from argparse.
+
+    By default all the commands are fully loaded. If ``commands`` is given then
+    only those commands are; the others are still listed (so that the help
+    output is unaffected) but their arguments are not known.
+    """
+    parser = argparse.ArgumentParser(
+        description="srcomp command-line interface",
+        # Abbreviations of the global options would confuse find_command_name
+        allow_abbrev=False,
+    )
+    add_global_options(parser)
     subparsers = parser.add_subparsers(title="commands")
     add_list_commands(subparsers)
 
-    add_delay.add_subparser(subparsers)
-    awards.add_subparser(subparsers)
-    delay.add_subparser(subparsers)
-    deploy.add_subparser(subparsers)
-    fetch.add_subparser(subparsers)
-    for_each_match.add_subparser(subparsers)
-    import_schedule.add_subparser(subparsers)
-    knocked_out_teams.add_subparser(subparsers)
-    list_midi_ports.add_subparser(subparsers)
-    lighting_controller.add_subparser(subparsers)
-    match_order_teams.add_subparser(subparsers)
-    print_schedule.add_subparser(subparsers)
-    schedule_league.add_subparser(subparsers)
-    scorer.add_subparser(subparsers)
-    shift_matches.add_subparser(subparsers)
-    show_league_table.add_subparser(subparsers)
-    show_match_scores.add_subparser(subparsers)
-    show_schedule.add_subparser(subparsers)
-    summary.add_subparser(subparsers)
-    top_match_points.add_subparser(subparsers)
-    update_layout.add_subparser(subparsers)
-    validate.add_subparser(subparsers)
-    yaml_round_trip.add_subparser(subparsers)
-    youtube_chapters.add_subparser(subparsers)
+    for name, command in COMMANDS.items():
+        if commands is None or name in commands:
+            add_subparser(subparsers, name)
+        else:
+            subparsers.add_parser(name, help=command.help_text)
 
     return parser
 
 
+def run(
+    parser: argparse.ArgumentParser,
+    settings: argparse.Namespace,
+    command_name: str | None,
+    args: list[str],
+) -> None:
+    if 'func' not in settings:
+        parser.print_help()
+        return
+
+    command = COMMANDS.get(command_name or '')
+    if command is not None and command.servable:
+        from sr.comp.cli import serve
+
+        with timings.phase('run via server'):
+            if serve.run_remote(settings.compstate, args):
+                return
+
+    with timings.phase('run command'):
+        settings.func(settings)
+
+
+def run_timed(
+    parser: argparse.ArgumentParser,
+    settings: argparse.Namespace,
+    command_name: str | None,
+    args: list[str],
+    recorder: timings.Recorder,
+) -> None:
+    from contextlib import redirect_stdout
+
+    try:
+        with timings.profiled(settings.profile):
+            with redirect_stdout(timings.TimedStream(sys.stdout)):
+                run(parser, settings, command_name, args)
+                sys.stdout.flush()
+    finally:
+        recorder.print_summary(sys.stderr)
+        if settings.timings_trace:
+            recorder.write_trace(settings.timings_trace)
+            print(f"Trace written to {settings.timings_trace}.", file=sys.stderr)
+        if settings.profile:
+            print(f"Profile written to {settings.profile}.", file=sys.stderr)
+
+
 def main(args: list[str] | None = None) -> None:
     """Run as the CLI tool."""
     if args is None:
         args = sys.argv[1:]
-    parser = argument_parser()
-    settings = parser.parse_args(args)
-    if 'func' in settings:
-        settings.func(settings)
-    else:
-        parser.print_help()
+
+    with timings.recording() as recorder:
+        with timings.phase('parse arguments'):
+            command_name = find_command_name(args)
+            parser = argument_parser(commands=[command_name] if command_name else [])
+            settings = parser.parse_args(args)
+
+        if settings.timings or settings.timings_trace or settings.profile:
+            run_timed(parser, settings, command_name, args, recorder)
+        else:
+            run(parser, settings, command_name, args)
+
+
+def run_captured(args: list[str]) -> tuple[int, str, str]:
+    """
+    Run the CLI tool in-process, as ``main`` would, capturing its output.
+
+    Returns a tuple of the exit code and the content written to stdout and
+    stderr respectively.
+    """
+    import io
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+
+    with io.StringIO() as stdout, io.StringIO() as stderr:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            command_name = find_command_name(args)
+            parser = argument_parser(commands=[command_name] if command_name else [])
+            try:
+                settings = parser.parse_args(args)
+                if 'func' in settings:
+                    settings.func(settings)
+                else:
+                    parser.print_help()
+                exit_code = 0
+            except SystemExit as e:
+                if e.code is None or isinstance(e.code, int):
+                    exit_code = e.code or 0
+                else:
+                    print(e.code, file=sys.stderr)
+                    exit_code = 1
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+
+        return exit_code, stdout.getvalue(), stderr.getvalue()
@@ -0,0 +1,363 @@
+"""
+Loading of compstates for commands which read them.
+
+Commands should load their compstate via ``load`` (or ``load_raw``) rather than
+constructing ``SRComp`` (or ``RawCompstate``) directly, so that an already-loaded
+instance can be used when one is available (for example when running within
+``srcomp serve`` or ``srcomp batch``).
+
+Loaded compstates are also cached on disk as snapshots, keyed by the git tree
+of the compstate's ``HEAD`` along with the state of any files which differ from
+it. Loading a snapshot is much quicker than parsing the compstate, especially
+once many matches have been scored. The snapshots live in
+``~/.cache/srcomp/snapshots`` (respecting ``XDG_CACHE_HOME``) unless
+``SRCOMP_CACHE_DIR`` is set; setting that to an empty value disables them.
+Other commands keep their (much smaller) caches alongside, in ``cache_root``.
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, IO, Iterator, Tuple, TYPE_CHECKING
+
+from sr.comp.cli.timings import phase
+from sr.comp.cli.utils import atomic_file
+
+if TYPE_CHECKING:
+    from sr.comp.comp import SRComp
+    from sr.comp.raw_compstate import RawCompstate
+
+# Bump this if the content of the snapshots changes
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+Fingerprint = Tuple[str, Tuple[Tuple[str, int, int], ...]]
+
+
+def fingerprint(root: Path) -> Fingerprint:
+    """
+    A cheap summary of the state of the compstate, which changes whenever
+    anything which ``SRComp`` loads changes.
+    """
+    import subprocess
+
+    try:
+        revision = subprocess.check_output(
+            ('git', 'rev-parse', 'HEAD'),
+            text=True,
+            cwd=root,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        # Not a usable git repository; loading the compstate will fail and
+        # report why.
+        revision = ''
+
+    stats = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(x for x in dirnames if x not in ('.git', '__pycache__'))
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            stat = os.stat(file_path)
+            stats.append((
+                os.path.relpath(file_path, root),
+                stat.st_mtime_ns,
+                stat.st_size,
+            ))
+
+    return revision, tuple(stats)
+
+
+class WatchedCompstate:
+    """A loaded compstate, which is reloaded whenever it changes."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root.resolve()
+        self._fingerprint: Fingerprint | None = None
+        self._comp: SRComp | None = None
+        self._error: Exception | None = None
+
+    @property
+    def comp(self) -> SRComp | None:
+        """The compstate as last loaded, or ``None`` if it could not be loaded."""
+        return self._comp
+
+    def refresh(self) -> bool:
+        """
+        Reload the compstate if it has changed since it was last loaded.
+
+        Returns whether or not it was reloaded. Errors from loading the
+        compstate are raised (only) when it is reloaded.
+        """
+        with phase('check for changes'):
+            current = fingerprint(self.root)
+        if current == self._fingerprint:
+            return False
+
+        self._fingerprint = current
+        self._comp = None
+        try:
+            with phase('load compstate'):
+                self._comp = load_cached(self.root)
+        except Exception as e:
+            self._error = e
+            raise
+
+        return True
+
+    def load(self) -> SRComp:
+        """Get the current state of the compstate, reloading it if needed."""
+        self.refresh()
+        if self._comp is None:
+            assert self._error is not None
+            raise self._error
+        return self._comp
+
+
+_preloaded: dict[Path, SRComp | WatchedCompstate] = {}
+
+
+def load(compstate: str | Path) -> SRComp:
+    """Load the compstate at the given path, re-using a preloaded one if possible."""
+    source = _preloaded.get(Path(compstate).resolve())
+    if isinstance(source, WatchedCompstate):
+        return source.load()
+    if source is not None:
+        return source
+
+    with phase('load compstate'):
+        return load_cached(compstate)
+
+
+def load_raw(compstate: str | Path, local_only: bool) -> RawCompstate:
+    """
+    Create a ``RawCompstate`` for the compstate at the given path whose
+    ``load`` method loads it via ``load``.
+    """
+    from sr.comp.raw_compstate import RawCompstate
+
+    class LoaderRawCompstate(RawCompstate):
+        def load(self) -> SRComp:
+            return load(compstate)
+
+    return LoaderRawCompstate(compstate, local_only)
+
+
+@contextmanager
+def preloaded(source: SRComp | WatchedCompstate) -> Iterator[None]:
+    """
+    Make the given already-loaded compstate available to ``load``.
+
+    If given a ``WatchedCompstate`` then it is checked for changes each time
+    it is loaded.
+    """
+    key = source.root.resolve()
+    previous = _preloaded.get(key)
+    _preloaded[key] = source
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _preloaded[key]
+        else:
+            _preloaded[key] = previous
+
+
+def cache_root() -> Path | None:
+    """
+    The directory srcomp's caches are kept in, or ``None`` if there's no home
+    directory to keep them in.
+    """
+    xdg_cache = os.environ.get('XDG_CACHE_HOME')
+    if not xdg_cache:
+        try:
+            return Path.home() / '.cache' / 'srcomp'
+        except (KeyError, RuntimeError):
+            return None
+
+    return Path(xdg_cache) / 'srcomp'
+
+
+def cache_dir() -> Path | None:
+    """The directory snapshots are stored in, or ``None`` if caching them is disabled."""
+    configured = os.environ.get('SRCOMP_CACHE_DIR')
+    if configured is not None:
+        return Path(configured) if configured else None
+
+    root = cache_root()
+    return None if root is None else root / 'snapshots'
+
+
+def snapshot_key(root: Path) -> tuple[str, str]:
+    """
+    Compute the key for snapshots of the compstate at the given path.
+
+    Returns a tuple of the key and the commit hash of the compstate's ``HEAD``.
+    The key identifies the tree of ``HEAD``, the content of any files which
+    differ from it, and the versions of the code which loads the compstate.
+    Snapshots are keyed by tree rather than by commit so that changes to
+    history which don't change the content (such as rebases) can still use
+    them, though this means that the commit needs to be set separately.
+    """
+    import hashlib
+    import subprocess
+    import sys
+    from importlib.metadata import version
+
+    revision, tree = subprocess.check_output(
+        ('git', 'rev-parse', 'HEAD', 'HEAD^{tree}'),
+        text=True,
+        cwd=root,
+        stderr=subprocess.DEVNULL,
+    ).split()
+
+    status = subprocess.check_output(
+        (
+            'git',
+            '--no-optional-locks',
+            'status',
+            '--porcelain',
+            '--untracked-files=all',
+            '-z',
+        ),
+        cwd=root,
+        stderr=subprocess.DEVNULL,
+    )
+
+    digest = hashlib.sha256()
+    for part in (
+        str(SNAPSHOT_FORMAT),
+        sys.version,
+        version('sr.comp'),
+        str(root),
+        tree,
+    ):
+        digest.update(part.encode('utf-8') + b'\0')
+
+    digest.update(status)
+    for entry in status.split(b'\0'):
+        # Each entry is a two character status, a space and then the path
+        dirty_path = root / os.fsdecode(entry[3:])
+        if entry and dirty_path.is_file():
+            stat = dirty_path.stat()
+            digest.update(f'{stat.st_mtime_ns}:{stat.st_size}\0'.encode('utf-8'))
+
+    return digest.hexdigest(), revision
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """
+    Pickles an ``SRComp``, excluding the scorer and ranker classes.
+
+    These are loaded from the compstate itself (rather than being importable)
+    and so can't be pickled. They're cheap to load though, so are loaded from
+    the compstate again when the snapshot is loaded.
+    """
+
+    def __init__(self, file: IO[bytes], comp: SRComp) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        league = comp.scores.league
+        self._external = {
+            id(league._scorer): 'scorer',
+            id(league._ranker): 'ranker',
+        }
+
+    def persistent_id(self, obj: object) -> str | None:
+        return self._external.get(id(obj))
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file: IO[bytes], root: Path) -> None:
+        super().__init__(file)
+        self._root = root
+
+    def persistent_load(self, pid: Any) -> Any:
+        from sr.comp.comp import load_ranker, load_scorer
+
+        if pid == 'scorer':
+            return load_scorer(self._root)
+        if pid == 'ranker':
+            return load_ranker(self._root)
+        raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}")
+
+
+def _read_snapshot(snapshot: Path, root: Path) -> SRComp | None:
+    try:
+        with snapshot.open('rb') as f:
+            comp: SRComp = _SnapshotUnpickler(f, root).load()
+    except Exception:
+        # Treat anything we can't load as absent; it'll get replaced.
+        return None
+
+    # Mark as recently used, for eviction
+    os.utime(snapshot)
+    return comp
+
+
+def _write_snapshot(snapshot: Path, comp: SRComp) -> None:
+    snapshot.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    with atomic_file(snapshot, 'wb') as f:
+        _SnapshotPickler(f, comp).dump(comp)
+
+
+def evict_snapshots(directory: Path, max_bytes: int = SNAPSHOT_CACHE_MAX_BYTES) -> None:
+    """Remove the least recently used snapshots until the cache fits within ``max_bytes``."""
+    snapshots = []
+    for snapshot in directory.glob('*.pickle'):
+        try:
+            stat = snapshot.stat()
+        except FileNotFoundError:
+            continue
+        snapshots.append((stat.st_mtime, stat.st_size, snapshot))
+
+    total = sum(size for _, size, _ in snapshots)
+    for _, size, snapshot in sorted(snapshots, key=lambda x: x[0]):
+        if total <= max_bytes:
+            break
+        snapshot.unlink(missing_ok=True)
+        total -= size
+
+
+def load_cached(compstate: str | Path) -> SRComp:
+    """
+    Load the compstate at the given path, from a snapshot if there is a
+    matching one.
+    """
+    import subprocess
+
+    from sr.comp.comp import SRComp
+
+    directory = cache_dir()
+    if directory is None:
+        return SRComp(compstate)
+
+    root = Path(compstate).resolve()
+    try:
+        with phase('git status'):
+            key, revision = snapshot_key(root)
+    except (OSError, subprocess.CalledProcessError):
+        # Not something we can key; let SRComp report any problems
+        return SRComp(compstate)
+
+    snapshot = directory / f'{key}.pickle'
+    with phase('read snapshot'):
+        comp = _read_snapshot(snapshot, root)
+    if comp is not None:
+        comp.state = revision
+        return comp
+
+    comp = SRComp(root)
+
+    try:
+        with phase('write snapshot'):
+            _write_snapshot(snapshot, comp)
+            evict_snapshots(directory)
+    except Exception:
+        # Caching is only an optimisation
+        pass
+
+    return comp
@@ -4,18 +4,19 @@ import argparse
 from pathlib import Path
 
 from sr.comp.cli import add_delay, deploy
+from sr.comp.cli.timings import phase
 
 
 def command(args: argparse.Namespace) -> None:
-    from sr.comp.raw_compstate import RawCompstate
+    from sr.comp.cli import comp_loader
 
-    compstate = RawCompstate(args.compstate, local_only=False)
+    compstate = comp_loader.load_raw(args.compstate, local_only=False)
     hosts = deploy.get_deployments(compstate)
 
     deploy.require_no_changes(compstate)
 
     if not args.no_pull:
-        with deploy.exit_on_exception():
+        with deploy.exit_on_exception(), phase('git pull'):
             compstate.pull_fast_forward()
 
     how_long, when = add_delay.command(args)
@@ -28,7 +29,7 @@ def command(args: argparse.Namespace) -> None:
 
     deploy.require_valid(compstate)
 
-    with deploy.exit_on_exception(kind=RuntimeError):
+    with deploy.exit_on_exception(kind=RuntimeError), phase('git commit'):
         compstate.stage('schedule.yaml')
         msg = f"Adding {args.how_long} delay at {when}"
         compstate.commit(msg)
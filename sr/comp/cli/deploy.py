@@ -30,6 +30,8 @@ import warnings
 from contextlib import contextmanager
 from typing import Any, cast, Iterable, Iterator, Sequence, TYPE_CHECKING
 
+from sr.comp.cli.timings import phase
+
 if TYPE_CHECKING:
     from sr.comp.raw_compstate import RawCompstate
 
@@ -109,7 +111,8 @@ def print_buffer(buf: io.StringIO) -> None:
 
 def get_input(prompt: str) -> str:
     # Wrapper to simplify mocking
-    return input(prompt)
+    with phase('wait for input'):
+        return input(prompt)
 
 
 def query(
@@ -176,7 +179,7 @@ def deploy_to(compstate: RawCompstate, host: str, revision: str, verbose: bool)
         # revision exists in the target, since this push will simply no-op
         # if it's already present
         revspec = '{0}:refs/heads/deploy-{0}'.format(revision)
-        with exit_on_exception(kind=RuntimeError):
+        with exit_on_exception(kind=RuntimeError), phase('git push'):
             compstate.push(
                 url,
                 revspec,
@@ -186,7 +189,8 @@ def deploy_to(compstate: RawCompstate, host: str, revision: str, verbose: bool)
         cmd = f"./update '{revision}'"
         stdout, stderr = io.StringIO(), io.StringIO()
         try:
-            result = connection.run(cmd, out_stream=stdout, err_stream=stderr)
+            with phase('ssh'):
+                result = connection.run(cmd, out_stream=stdout, err_stream=stderr)
         except UnexpectedExit as e:
             result = e.result
 
@@ -210,7 +214,8 @@ def get_current_state(host: str) -> str | None:
 
     url = f'http://{host}/comp-api/state'
     try:
-        response = requests.get(url, timeout=API_TIMEOUT_SECONDS)
+        with phase('query host state'):
+            response = requests.get(url, timeout=API_TIMEOUT_SECONDS)
         response.raise_for_status()
         raw_state = response.json()
     except Exception as e:
@@ -280,7 +285,10 @@ def check_host_state(compstate: RawCompstate, host: str, revision: str, verbose:
 
 
 def require_no_changes(compstate: RawCompstate) -> None:
-    if compstate.has_changes:
+    with phase('git status'):
+        has_changes = compstate.has_changes
+
+    if has_changes:
         print_fail(
             "Cannot deploy state with local changes.",
             "Commit or remove them and re-run.",
@@ -292,10 +300,11 @@ def require_no_changes(compstate: RawCompstate) -> None:
 def require_valid(compstate: RawCompstate) -> None:
     from sr.comp.validation import validate
 
-    with exit_on_exception("State cannot be loaded: {0}"):
+    with exit_on_exception("State cannot be loaded: {0}"), phase('load compstate'):
         comp = compstate.load()
 
-    num_errors = validate(comp)
+    with phase('validate'):
+        num_errors = validate(comp)
     if num_errors:
         query_warn("State has validation errors (see above)")
 
@@ -323,10 +332,10 @@ def run_deployments(
 
 
 def command(args: argparse.Namespace) -> None:
-    from sr.comp.raw_compstate import RawCompstate
+    from sr.comp.cli import comp_loader
 
     with guard_unicode_output(sys.stdout), guard_unicode_output(sys.stderr):
-        compstate = RawCompstate(args.compstate, local_only=False)
+        compstate = comp_loader.load_raw(args.compstate, local_only=False)
         hosts = get_deployments(compstate)
 
         require_no_changes(compstate)
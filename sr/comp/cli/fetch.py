@@ -12,6 +12,7 @@ import sys
 
 
 def command(args: argparse.Namespace) -> None:
+    from sr.comp.cli import comp_loader
     from sr.comp.cli.deploy import (
         BOLD,
         ENDC,
@@ -20,9 +21,8 @@ def command(args: argparse.Namespace) -> None:
         get_deployments,
         ref_compstate,
     )
-    from sr.comp.raw_compstate import RawCompstate
 
-    compstate = RawCompstate(args.compstate, local_only=False)
+    compstate = comp_loader.load_raw(args.compstate, local_only=False)
     hosts = get_deployments(compstate)
 
     print("Fetching upstream... ", end="")
@@ -75,11 +75,11 @@ def replace_placeholders(match: Match, command: list[str]) -> list[str]:
 def command(args: argparse.Namespace) -> None:
     import subprocess
 
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
 
     from .deploy import print_fail
 
-    compstate = SRComp(args.compstate)
+    compstate = comp_loader.load(args.compstate)
 
     if args.arena:
         if args.arena not in compstate.arenas:
@@ -18,6 +18,9 @@ result hash characters may be used to start line comments.
 Example schedules for 48, 52 or 56 teams are available  at:
 https://github.com/PeterJCLaw/srobo-schedules/tree/master/seed_schedules
 
+Given a directory of schedule files rather than a single file, the one which
+best fits the compstate is used (see the seed-schedules command).
+
 Teams which are marked as having dropped out before the first match being
 scheduled will not be considered for inclusion in the schedule.
 """
@@ -26,10 +29,10 @@ from __future__ import annotations
 
 import argparse
 from pathlib import Path
-from typing import Iterable
+from typing import Collection, Iterable
 
 from sr.comp.cli.import_schedule import loading, teams_mapping
-from sr.comp.cli.import_schedule.types import Configuration, RawMatch
+from sr.comp.cli.import_schedule.types import Configuration, ID, RawMatch
 from sr.comp.types import MatchNumber
 
 
@@ -69,12 +72,27 @@ def get_configuration(
     return Configuration(arena_ids, team_ids, teams_per_game, first_match_number)
 
 
+def choose_seed(
+    library: Path,
+    config: Configuration,
+    ids_to_ignore: Collection[ID],
+) -> Path:
+    from sr.comp.cli.import_schedule import seeds
+
+    ranked = seeds.rank_seeds(seeds.load_library(library), config, ids_to_ignore)
+    if not ranked:
+        exit(
+            f"None of the seed schedules in {library} fit {config.num_teams} teams "
+            f"in {config.num_arenas} arenas.",
+        )
+
+    print(f"Using seed schedule {ranked[0].path.name}.")
+    return ranked[0].path
+
+
 def command(args: argparse.Namespace) -> None:
     from sr.comp.cli.import_schedule import core
 
-    with open(args.schedule) as sfp:
-        schedule_lines = loading.tidy(sfp.readlines())
-
     league_yaml = loading.league_yaml_path(args.compstate)
     existing_matches: dict[MatchNumber, RawMatch] = {}
     if args.extend:
@@ -86,11 +104,17 @@ def command(args: argparse.Namespace) -> None:
         existing_matches.keys(),
     )
 
-    matches, bad_matches = core.build_schedule(
-        config,
-        schedule_lines,
-        args.ignore_ids,
-    )
+    schedule_path = args.schedule
+    if schedule_path.is_dir():
+        schedule_path = choose_seed(schedule_path, config, args.ignore_ids or ())
+
+    with open(schedule_path) as sfp:
+        matches, bad_matches = core.build_schedule(
+            config,
+            sfp,
+            args.ignore_ids,
+            args.jobs,
+        )
 
     # Print any warnings about the matches
     for bad_match in bad_matches:
@@ -132,6 +156,22 @@ def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser
         type=teams_mapping.Strategy,
         help="How to map schedule ids to TLAs",
     )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help=(
+            "Number of processes to search for the best ids to leave empty with. "
+            "More searches further in about the same time."
+        ),
+    )
     parser.add_argument('compstate', type=Path, help="competition state repository")
-    parser.add_argument('schedule', type=Path, help="schedule to import")
+    parser.add_argument(
+        'schedule',
+        type=Path,
+        help=(
+            "schedule to import, or a directory of seed schedules from which to "
+            "import the best fitting"
+        ),
+    )
     parser.set_defaults(func=command)
@@ -1,7 +1,18 @@
 from __future__ import annotations
 
 import collections
-from typing import Collection, Iterator, Mapping, Sequence, TypeVar
+import functools
+import math
+import operator
+from typing import (
+    Collection,
+    Iterable,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    TypeVar,
+)
 
 from sr.comp.types import ArenaName, MatchNumber, TLA
 
@@ -10,6 +21,14 @@ from .types import BadMatch, Configuration, ID, RawMatch
 
 T = TypeVar('T')
 
+# Limit on the number of partial choices examined when searching for the best
+# ids to leave empty, beyond which the best choice found so far is used
+MAX_SEARCH_STEPS = 100_000
+
+# When searching in parallel, the share of each task's steps which it has in
+# the first of the two waves of tasks (see ``EmptyIdSearch.search_in_parallel``)
+FIRST_WAVE_SHARE = 0.25
+
 
 def chunks_of_size(list_: list[T], size: int) -> Iterator[list[T]]:
     if len(list_) % size != 0:
@@ -18,12 +37,8 @@ def chunks_of_size(list_: list[T], size: int) -> Iterator[list[T]]:
             f"size {size}.",
         )
 
-    list_ = list_[:]
-    while len(list_):
-        chunk = []
-        for _ in range(size):
-            chunk.append(list_.pop(0))
-        yield chunk
+    for start in range(0, len(list_), size):
+        yield list_[start:start + size]
 
 
 def ignore_ids(ids: list[ID], ids_to_remove: list[ID]) -> None:
@@ -31,57 +46,455 @@ def ignore_ids(ids: list[ID], ids_to_remove: list[ID]) -> None:
         ids.remove(i)
 
 
-def get_id_subsets(ids: Collection[T], limit: int) -> Iterator[Collection[T]]:
-    num_ids = len(ids)
-
-    extra = num_ids - limit
-
-    if extra == 0:
-        # Only one possibility -- use all of them
-        yield ids
-
-    elif extra == 1:
-        for idx in range(len(ids)):
-            ids_clone = list(ids)
-            ids_clone.pop(idx)
-            yield ids_clone
-
-    elif extra == 2:
-        for idx1 in range(len(ids)):
-            for idx2 in range(idx1 + 1, len(ids)):
-                ids_clone = list(ids)
-                ids_clone.pop(idx2)
-                ids_clone.pop(idx1)
-                yield ids_clone
-
-    elif extra == 3:
-        for idx1 in range(len(ids)):
-            for idx2 in range(idx1 + 1, len(ids)):
-                for idx3 in range(idx2 + 1, len(ids)):
-                    ids_clone = list(ids)
-                    ids_clone.pop(idx3)
-                    ids_clone.pop(idx2)
-                    ids_clone.pop(idx1)
-                    yield ids_clone
-
-    else:
-        # TODO: consider generalising the above or adding more handling
-        raise Exception(f"Too many empty slots to compensate for ({extra}).")
+class SearchResult(NamedTuple):
+    # The cost of the best choice found, if any
+    cost: int | None
+    # The indices of the ids in that choice
+    chosen: list[int]
+    # Whether the search finished, rather than running out of steps
+    finished: bool
+
+
+class EmptyIdSearch:
+    """
+    Search for which of a schedule's ids to leave without a team, so as to have
+    the best set of bad matches (those with at least half their places empty),
+    as ``are_better_matches`` compares them. Ids in the schedule which aren't
+    among the given ``ids`` are always empty.
+
+    Each game with ``n`` empty places, where that's enough to make it bad,
+    costs ``W ** n`` for ``W`` more than the number of games, so that comparing
+    the total costs of choices compares their bad matches in the same way as
+    ``are_better_matches`` does.
+
+    The search is a branch and bound which tries leaving the cheapest ids
+    empty first (see ``branch_order``), so that good choices are found early;
+    of equally good choices the first found is used. Leaving another id empty
+    never lowers the cost of a game, which bounds the cost of the choices
+    following from a partial one (see ``min_extra_cost``), and means that once
+    the cheapest ids left can't complete a better choice than the best so far
+    none of the others can either. A choice found greedily beforehand limits
+    the search from the start.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[ID],
+        schedule: list[list[ID]],
+        teams_per_game: int,
+    ) -> None:
+        self.ids = ids
+        positions = {id_: idx for idx, id_ in enumerate(ids)}
+
+        # Which games each id is in, which ids each game has and how many
+        # places each game has empty
+        self.games_of: list[list[int]] = [[] for _ in ids]
+        self.members: list[list[int]] = []
+        self.empty_places: list[int] = []
+        for match_ids in schedule:
+            for game_ids in chunks_of_size(match_ids, teams_per_game):
+                game_idx = len(self.empty_places)
+                self.members.append([])
+                self.empty_places.append(0)
+                for id_ in game_ids:
+                    if id_ in positions:
+                        self.games_of[positions[id_]].append(game_idx)
+                        self.members[game_idx].append(positions[id_])
+                    else:
+                        self.empty_places[game_idx] += 1
+
+        # Bitmasks of the other ids which each id shares a game with
+        game_masks = [
+            functools.reduce(operator.or_, (1 << idx for idx in members), 0)
+            for members in self.members
+        ]
+        self.shared_games = [
+            functools.reduce(operator.or_, (game_masks[x] for x in games), 0) & ~(1 << idx)
+            for idx, games in enumerate(self.games_of)
+        ]
+
+        # At least three, so that each place a game has empty costs more extra
+        # than the one before
+        self.weight = max(len(self.empty_places) + 1, 3)
+        self.min_bad_empty_places = -(-teams_per_game // 2)
+
+        # The cost of a game gaining an empty place, by how many it had before
+        # (a game with no places left to empty never gains another)
+        self.extra_costs = [
+            self.game_cost(n + 1) - self.game_cost(n)
+            for n in range(teams_per_game)
+        ] + [0]
+        # The least extra cost of leaving two ids in the same game empty,
+        # beyond the costs of leaving each of them empty on its own
+        self.pair_cost = self.game_cost(2) - 2 * self.game_cost(1) + self.game_cost(0)
+
+        # The cost of leaving each id empty, as well as those already. These
+        # are kept up to date as ids are left empty or filled, which only
+        # touches the games of the id in question.
+        self.id_costs = [
+            sum(self.extra_costs[self.empty_places[game]] for game in games)
+            for games in self.games_of
+        ]
+
+    def game_cost(self, num_empty_places: int) -> int:
+        if num_empty_places < self.min_bad_empty_places:
+            return 0
+        cost: int = self.weight ** num_empty_places
+        return cost
+
+    def _change_empty_places(self, idx: int, change: int) -> None:
+        extra_costs = self.extra_costs
+        empty_places = self.empty_places
+        id_costs = self.id_costs
+        for game in self.games_of[idx]:
+            before = empty_places[game]
+            empty_places[game] = after = before + change
+            difference = extra_costs[after] - extra_costs[before]
+            if difference:
+                for member in self.members[game]:
+                    id_costs[member] += difference
+
+    def leave_empty(self, idx: int) -> None:
+        self._change_empty_places(idx, 1)
+
+    def fill(self, idx: int) -> None:
+        self._change_empty_places(idx, -1)
+
+    def branch_order(self, allowed: int) -> list[int]:
+        """
+        The indices of the ids in the bitmask ``allowed``, in the order to try
+        leaving them empty: cheapest first, then in the order of the ids.
+        """
+        id_costs = self.id_costs
+        indices = []
+        while allowed:
+            bit = allowed & -allowed
+            indices.append(bit.bit_length() - 1)
+            allowed ^= bit
+        indices.sort(key=lambda idx: id_costs[idx])
+        return indices
+
+    def min_extra_cost(self, allowed: int, remaining: int) -> int:
+        """
+        A lower bound on the extra cost of leaving ``remaining`` more of the ids
+        in the bitmask ``allowed`` empty.
+
+        The ids are split into groups which all share games with each other.
+        Leaving ``n`` ids in a group empty costs at least their costs on their
+        own plus ``pair_cost`` for each of the ``n * (n - 1) / 2`` pairs of them,
+        so each id left empty from a group costs at least ``pair_cost`` more for
+        each one before it.
+        """
+        id_costs = self.id_costs
+        # Grouping the ids which cost nothing on their own separately leaves
+        # fewer groups of them, which is where most of the bound comes from
+        free = costly = 0
+        candidates = allowed
+        while candidates:
+            bit = candidates & -candidates
+            if id_costs[bit.bit_length() - 1]:
+                costly |= bit
+            else:
+                free |= bit
+            candidates ^= bit
+
+        costs: list[int] = []
+        for pool in (free, costly):
+            while pool:
+                group_costs = []
+                candidates = pool
+                while candidates:
+                    bit = candidates & -candidates
+                    idx = bit.bit_length() - 1
+                    group_costs.append(id_costs[idx])
+                    pool &= ~bit
+                    candidates &= self.shared_games[idx]
+                group_costs.sort()
+                costs.extend(x + self.pair_cost * n for n, x in enumerate(group_costs))
+        costs.sort()
+        return sum(costs[:remaining])
+
+    def choose_greedily(self, num_empty: int) -> tuple[int, list[int]]:
+        """
+        Choose ids to leave empty by repeatedly taking the cheapest, then
+        swapping them for others while that's cheaper. Returns the cost of the
+        choice and the indices of the ids chosen.
+        """
+        chosen: list[int] = []
+        cost = 0
+        for _ in range(num_empty):
+            extra, idx = min(
+                (self.id_costs[idx], idx)
+                for idx in range(len(self.ids))
+                if idx not in chosen
+            )
+            chosen.append(idx)
+            self.leave_empty(idx)
+            cost += extra
+
+        improved = True
+        while improved:
+            improved = False
+            for position, idx in enumerate(chosen):
+                self.fill(idx)
+                saving = self.id_costs[idx]
+                extra, other = min(
+                    (self.id_costs[other], other)
+                    for other in range(len(self.ids))
+                    if other not in chosen
+                )
+                if extra < saving:
+                    chosen[position] = idx = other
+                    cost += extra - saving
+                    improved = True
+                self.leave_empty(idx)
+
+        for idx in chosen:
+            self.fill(idx)
+        return cost, sorted(chosen)
+
+    def search_from(
+        self,
+        chosen: list[int],
+        allowed: int,
+        num_empty: int,
+        max_cost: int,
+        max_steps: int,
+    ) -> SearchResult:
+        """
+        Search the choices of ``num_empty`` ids to leave empty which follow on
+        from those already ``chosen`` by adding ids from the bitmask
+        ``allowed``, for the first costing least and no more than
+        ``max_cost``, examining at most ``max_steps`` partial choices.
+        """
+        chosen = list(chosen)
+        best_cost: int | None = None
+        best_chosen: list[int] = []
+        # The most a choice can cost and still be better than any found so far
+        limit = max_cost
+        steps = 0
+
+        def search(allowed: int, cost: int) -> bool:
+            """Search the choices following from ``chosen``, returning whether to stop."""
+            nonlocal best_cost, best_chosen, limit, steps
+
+            steps += 1
+            if steps > max_steps:
+                return True
+
+            remaining = num_empty - len(chosen)
+            if remaining == 0:
+                if cost <= limit:
+                    best_cost = cost
+                    best_chosen = sorted(chosen)
+                    limit = cost - 1
+                return False
+
+            bound = cost + self.min_extra_cost(allowed, remaining)
+            if bound > limit:
+                return False
+
+            order = self.branch_order(allowed)
+            costs = [self.id_costs[idx] for idx in order]
+            for position in range(len(order) - remaining + 1):
+                # The ids are in order of cost, which leaving others empty never
+                # lowers, so neither this choice nor any after it can cost less
+                if cost + sum(costs[position:position + remaining]) > limit:
+                    break
+
+                # Choices which leave this id empty are all found from here, so
+                # those after it needn't consider it
+                idx = order[position]
+                allowed ^= 1 << idx
+                chosen.append(idx)
+                self.leave_empty(idx)
+
+                stop = search(allowed, cost + costs[position])
+
+                chosen.pop()
+                self.fill(idx)
+
+                if stop:
+                    return True
+                if bound > limit:
+                    # Nothing following from here can do better
+                    return False
+            return False
+
+        cost = 0
+        for idx in chosen:
+            cost += self.id_costs[idx]
+            self.leave_empty(idx)
+
+        finished = not search(allowed, cost)
+
+        for idx in chosen:
+            self.fill(idx)
+
+        return SearchResult(best_cost, best_chosen, finished)
+
+    def search(self, num_empty: int, max_steps: int) -> tuple[list[ID], bool]:
+        """
+        Choose ``num_empty`` ids to leave empty, examining at most ``max_steps``
+        partial choices. Returns the ids and whether they're known to be the
+        best choice, which they may not be if the search ran out of steps.
+        """
+        # Choices can only replace the greedy one by costing less, while the
+        # first of those found which cost the same can't be replaced
+        greedy_cost, greedy_chosen = self.choose_greedily(num_empty)
+
+        result = self.search_from(
+            [],
+            (1 << len(self.ids)) - 1,
+            num_empty,
+            greedy_cost,
+            max_steps,
+        )
 
+        return self.choice(greedy_cost, greedy_chosen, [result])
+
+    def search_in_parallel(
+        self,
+        num_empty: int,
+        max_steps: int,
+        num_jobs: int,
+    ) -> tuple[list[ID], bool]:
+        """
+        As ``search``, but searching the choices which start with each of the
+        first ids ``search`` branches on in a separate task, spread across
+        ``num_jobs`` processes.
+
+        Each task examines at most its share of ``max_steps * num_jobs``
+        partial choices, in proportion to the number of choices it searches, so
+        the tasks for the first ids (which have the most) examine the most.
+
+        The tasks are run in two waves, so that they can limit each other as
+        when searching in turn. The first has a ``FIRST_WAVE_SHARE`` of each
+        task's steps, and the second the rest, for those which didn't finish
+        in the first, limited by the best choice the first wave found. Tasks in
+        the second wave start again, but find their way back quickly with that
+        limit. The steps and the limits of the tasks don't depend on how they
+        happen to be scheduled, so neither does the choice.
+
+        Of equally good choices the first is still used, so once a task finds a
+        choice which nothing can beat those after it aren't waited for.
+        """
+        from multiprocessing import Pool
+
+        from sr.comp.cli.utils import ignore_interrupts
+
+        greedy_cost, greedy_chosen = self.choose_greedily(num_empty)
+        all_ids = (1 << len(self.ids)) - 1
+        min_cost = self.min_extra_cost(all_ids, num_empty)
+
+        order = self.branch_order(all_ids)
+        first_choices = range(len(self.ids) - num_empty + 1)
+        # The number of choices each task searches, from those of the ids after
+        # its first
+        task_choices = [
+            math.comb(len(self.ids) - first - 1, num_empty - 1)
+            for first in first_choices
+        ]
+        total_steps = max_steps * num_jobs
+        num_choices = sum(task_choices)
+        task_max_steps = [
+            max(total_steps * x // num_choices, 1)
+            for x in task_choices
+        ]
+        first_wave_steps = [max(int(x * FIRST_WAVE_SHARE), 1) for x in task_max_steps]
+        waves = [
+            first_wave_steps,
+            [max(x - y, 1) for x, y in zip(task_max_steps, first_wave_steps)],
+        ]
+
+        results: dict[int, SearchResult] = {}
+        num_needed = len(first_choices)
+        max_cost = greedy_cost
+        for wave_max_steps in waves:
+            tasks = [
+                x
+                for x in range(num_needed)
+                if x not in results or not results[x].finished
+            ]
+            if not tasks:
+                break
+
+            search_task = functools.partial(
+                search_from_choice,
+                self,
+                order,
+                num_empty,
+                max_cost,
+                wave_max_steps,
+            )
+            # Leaving the block terminates any tasks which are still running
+            with Pool(num_jobs, initializer=ignore_interrupts) as pool:
+                remaining = set(tasks)
+                for first, result in pool.imap_unordered(search_task, tasks):
+                    results[first] = result
+                    remaining.remove(first)
+                    if result.cost == min_cost:
+                        num_needed = min(num_needed, first + 1)
+                    if not any(x < num_needed for x in remaining):
+                        break
+
+            # Only the tasks which are needed, all of which have run, limit the
+            # next wave (choices costing the same are still found, as they may
+            # come first)
+            for first in range(num_needed):
+                cost = results[first].cost
+                if cost is not None:
+                    max_cost = min(max_cost, cost)
+
+        return self.choice(
+            greedy_cost,
+            greedy_chosen,
+            [results[x] for x in range(num_needed)],
+        )
 
-def build_id_team_maps(ids: list[ID], team_ids: Sequence[TLA]) -> Iterator[dict[ID, TLA]]:
-    # If there are more ids than team_ids we want to ensure that we minimize
-    # the number of matches which have empty places and also the number of
-    # empty places in any given match.
-    # This function generates possible mappings of ids to teams as needed
-    # in order to explore excluding different ids.
-    #
-    # Note: this function does _not_ explore mapping the same subset of
-    # ids to the given teams since that doesn't achieve any changes in
-    # which matches have empty spaces.
+    def choice(
+        self,
+        greedy_cost: int,
+        greedy_chosen: list[int],
+        results: list[SearchResult],
+    ) -> tuple[list[ID], bool]:
+        """
+        Combine the results of searching, in the order of their choices, with
+        the greedy choice. Returns the ids chosen and whether they're known to
+        be the best choice.
+        """
+        # Searches only find choices which cost no more than the greedy one, so
+        # prefer the first of those which cost least
+        best_cost = min([greedy_cost, *(x.cost for x in results if x.cost is not None)])
+        best_chosen = next(
+            (x.chosen for x in results if x.cost == best_cost),
+            greedy_chosen,
+        )
 
-    for id_subset in get_id_subsets(ids, len(team_ids)):
-        yield dict(zip(id_subset, team_ids))
+        finished = all(x.finished for x in results)
+        return [self.ids[idx] for idx in best_chosen], finished
+
+
+def search_from_choice(
+    search: EmptyIdSearch,
+    order: list[int],
+    num_empty: int,
+    max_cost: int,
+    max_steps: list[int],
+    first: int,
+) -> tuple[int, SearchResult]:
+    """
+    Search the choices which start with the id at position ``first`` in the
+    ``order`` the search branches on them, in a separate process.
+    """
+    allowed = functools.reduce(operator.or_, (1 << idx for idx in order[first + 1:]), 0)
+    return first, search.search_from(
+        [order[first]],
+        allowed,
+        num_empty,
+        max_cost,
+        max_steps[first],
+    )
 
 
 def build_matches(
@@ -130,8 +543,8 @@ def are_better_matches(
 
     # Even single matches with lots of empty slots are bad
     for num_empty_places in sorted(possible_empty_places, reverse=True):
-        if new_map[num_empty_places] < best_map[num_empty_places]:
-            return True
+        if new_map[num_empty_places] != best_map[num_empty_places]:
+            return new_map[num_empty_places] < best_map[num_empty_places]
 
     return False
 
@@ -140,39 +553,40 @@ def get_best_fit(
     config: Configuration,
     ids: list[ID],
     schedule: list[list[ID]],
+    num_jobs: int = 1,
 ) -> tuple[
     dict[MatchNumber, RawMatch],
     list[BadMatch],
 ]:
-    best: tuple[
-        dict[MatchNumber, RawMatch],
-        list[BadMatch],
-    ] | None = None
-    for id_team_map in build_id_team_maps(ids, config.team_ids):
-        matches, bad_matches = build_matches(
-            id_team_map,
-            schedule,
-            config.arena_ids,
-            config.teams_per_game,
-            config.first_match_number,
+    search = EmptyIdSearch(ids, schedule, config.teams_per_game)
+    num_empty = len(ids) - config.num_teams
+    if num_jobs > 1 and num_empty > 0:
+        empty_ids, is_best = search.search_in_parallel(num_empty, MAX_SEARCH_STEPS, num_jobs)
+    else:
+        empty_ids, is_best = search.search(num_empty, MAX_SEARCH_STEPS)
+    if not is_best:
+        print(
+            "Warning: stopped searching for the best ids to leave empty before "
+            "finishing, so there may be better matches than these.",
         )
 
-        if len(bad_matches) == 0:
-            # Nothing bad about these, ship them
-            return matches, bad_matches
-
-        if best is None or are_better_matches(best[1], bad_matches, config.teams_per_game):
-            best = (matches, bad_matches)
+    empty_ids_set = set(empty_ids)
+    used_ids = [id_ for id_ in ids if id_ not in empty_ids_set]
 
-    assert best is not None
-
-    return best
+    return build_matches(
+        dict(zip(used_ids, config.team_ids)),
+        schedule,
+        config.arena_ids,
+        config.teams_per_game,
+        config.first_match_number,
+    )
 
 
 def build_schedule(
     config: Configuration,
-    schedule_lines: list[str],
+    schedule_lines: Iterable[str],
     ids_to_ignore: list[ID],
+    num_jobs: int = 1,
 ) -> tuple[
     dict[MatchNumber, RawMatch],
     list[BadMatch],
@@ -195,6 +609,6 @@ def build_schedule(
         )
 
     # Get matches
-    matches, bad_matches = get_best_fit(config, ids, schedule)
+    matches, bad_matches = get_best_fit(config, ids, schedule, num_jobs)
 
     return matches, bad_matches
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 from sr.comp.types import ArenaName, MatchNumber, TLA
 
@@ -12,10 +12,12 @@ def parse_ids(ids: str, sep: str = ',') -> list[ID]:
     return [ID(x) for x in ids.split(sep)]
 
 
-def tidy(lines: Iterable[str]) -> list[str]:
-    "Strip comments and trailing whitespace"
-    schedule = []
-    for line in lines:
+def tidy_numbered(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """
+    Strip comments and surrounding whitespace, yielding the lines which have
+    anything left along with their (1-based) line numbers.
+    """
+    for line_num, line in enumerate(lines, start=1):
         idx = line.find('#')
         if idx > -1:
             line = line[:idx]
@@ -23,9 +25,12 @@ def tidy(lines: Iterable[str]) -> list[str]:
         line = line.strip()
 
         if line:
-            schedule.append(line)
+            yield line_num, line
 
-    return schedule
+
+def tidy(lines: Iterable[str]) -> list[str]:
+    "Strip comments and trailing whitespace"
+    return [line for _, line in tidy_numbered(lines)]
 
 
 def league_yaml_path(compstate_path: Path) -> Path:
@@ -79,39 +84,41 @@ def load_ids_schedule(
     a tuple: ``(ids, schedule)``. The ``ids`` is a list of unique ids
     in the order which they first appear, the ``schedule`` is a list of
     lists of ids in each line.
+
+    The lines are read one at a time, with comments and blank lines ignored
+    (see ``tidy``), so may come straight from a schedule file. Errors give the
+    line number of the match within the lines.
     """
 
     max_teams_per_slot = teams_per_game * num_arenas
 
-    ids: list[ID] = []
+    # Dicts keep the order in which the ids are added
+    ids: dict[ID, None] = {}
     schedule: list[list[ID]] = []
 
-    for match_num, match in enumerate(schedule_lines):
+    for match_num, (line_num, match) in enumerate(tidy_numbered(schedule_lines)):
         match_ids = parse_ids(match, sep='|')
 
         uniq_match_ids = set(match_ids)
         if len(match_ids) != len(uniq_match_ids):
             raise ValueError(
-                f"Match {match_num} contains the same id more than once. "
-                f"(got ids {match_ids!r})",
+                f"Match {match_num} (line {line_num}) contains the same id more "
+                f"than once. (got ids {match_ids!r})",
             )
 
         if len(match_ids) > max_teams_per_slot:
             raise ValueError(
-                f"Match {match_num} has too many ids. (got {len(match_ids)}, "
-                f"can cope with {max_teams_per_slot})",
+                f"Match {match_num} (line {line_num}) has too many ids. (got "
+                f"{len(match_ids)}, can cope with {max_teams_per_slot})",
             )
 
         if len(match_ids) % teams_per_game != 0:
             raise ValueError(
-                f"Match {match_num} has incompatible number of ids: "
-                f"{len(match_ids)} is not a multiple of {teams_per_game}.",
+                f"Match {match_num} (line {line_num}) has incompatible number of "
+                f"ids: {len(match_ids)} is not a multiple of {teams_per_game}.",
             )
 
         schedule.append(match_ids)
+        ids.update(dict.fromkeys(match_ids))
 
-        for id_ in match_ids:
-            if id_ not in ids:
-                ids.append(id_)
-
-    return ids, schedule
+    return list(ids), schedule
@@ -0,0 +1,237 @@
+"""
+Libraries of seed schedules, directories of schedule files (in the format
+which ``import-schedule`` reads) from which to pick the one which best fits a
+competition.
+
+What's needed to pick a seed is found from a single pass over each file and
+kept in an index in the srcomp cache directory, so that files are only read
+again once they've changed.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from typing import Any, Collection, Iterable, NamedTuple
+
+from . import loading
+from .types import Configuration, ID
+
+INDEX_FILE = 'seed-schedules.json'
+
+# Bump this when changing what's stored for each schedule
+INDEX_VERSION = 1
+
+
+class SeedSchedule(NamedTuple):
+    path: Path
+
+    num_matches: int
+
+    # The distinct numbers of ids in the matches
+    match_sizes: list[int]
+
+    # How many matches each id appears in, in the order the ids first appear
+    appearances: dict[ID, int]
+
+    # The fewest matches between any two appearances of an id, if any appear
+    # more than once
+    min_spacing: int | None
+
+    @property
+    def num_ids(self) -> int:
+        return len(self.appearances)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            'num_matches': self.num_matches,
+            'match_sizes': self.match_sizes,
+            'appearances': self.appearances,
+            'min_spacing': self.min_spacing,
+        }
+
+    @classmethod
+    def from_json(cls, path: Path, data: dict[str, Any]) -> SeedSchedule:
+        return cls(
+            path,
+            data['num_matches'],
+            data['match_sizes'],
+            data['appearances'],
+            data['min_spacing'],
+        )
+
+
+def summarise(path: Path, lines: Iterable[str]) -> SeedSchedule:
+    """Summarise the schedule in the given lines, reading them one at a time."""
+    appearances: dict[ID, int] = {}
+    last_match: dict[ID, int] = {}
+    match_sizes = set()
+    min_spacing: int | None = None
+
+    num_matches = 0
+    for match_num, (line_num, match) in enumerate(loading.tidy_numbered(lines)):
+        match_ids = loading.parse_ids(match, sep='|')
+        if len(match_ids) != len(set(match_ids)):
+            raise ValueError(
+                f"Match {match_num} (line {line_num}) contains the same id more "
+                f"than once. (got ids {match_ids!r})",
+            )
+
+        match_sizes.add(len(match_ids))
+        for id_ in match_ids:
+            appearances[id_] = appearances.get(id_, 0) + 1
+            if id_ in last_match:
+                spacing = match_num - last_match[id_] - 1
+                if min_spacing is None or spacing < min_spacing:
+                    min_spacing = spacing
+            last_match[id_] = match_num
+
+        num_matches += 1
+
+    return SeedSchedule(path, num_matches, sorted(match_sizes), appearances, min_spacing)
+
+
+def index_path() -> Path | None:
+    from sr.comp.cli.comp_loader import cache_root
+
+    directory = cache_root()
+    return None if directory is None else directory / INDEX_FILE
+
+
+def load_index(path: Path | None) -> dict[str, Any]:
+    if path is not None:
+        try:
+            with path.open() as f:
+                index: dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            pass
+        else:
+            if index.get('version') == INDEX_VERSION:
+                return index
+
+    return {'version': INDEX_VERSION, 'schedules': {}}
+
+
+def save_index(path: Path | None, index: dict[str, Any]) -> None:
+    if path is None:
+        return
+
+    from sr.comp.cli.utils import write_atomically
+
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        write_atomically(path, json.dumps(index, separators=(',', ':')))
+    except OSError:
+        # Only an optimisation, so carry on without it
+        pass
+
+
+def load_library(directory: Path) -> list[SeedSchedule]:
+    """
+    Load the summaries of the seed schedules in the given directory, which are
+    all the files in it other than hidden ones, in order of their names.
+
+    Files which can't be read as schedules are skipped, with a warning.
+    """
+    directory = directory.resolve()
+    index_file = index_path()
+    index = load_index(index_file)
+    entries: dict[str, Any] = index['schedules']
+    changed = False
+
+    seeds = []
+    found = set()
+    for path in sorted(directory.iterdir()):
+        if path.name.startswith('.') or not path.is_file():
+            continue
+
+        key = str(path)
+        found.add(key)
+        stat = path.stat()
+        entry = entries.get(key)
+        current = (stat.st_mtime_ns, stat.st_size)
+        if entry is None or (entry['mtime_ns'], entry['size']) != current:
+            try:
+                with path.open() as f:
+                    seed = summarise(path, f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: skipping {path.name} ({e}).", file=sys.stderr)
+                continue
+
+            entries[key] = entry = {
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                **seed.to_json(),
+            }
+            changed = True
+
+        seeds.append(SeedSchedule.from_json(path, entry))
+
+    # Forget files which have gone from the directory
+    for key in list(entries):
+        if Path(key).parent == directory and key not in found:
+            del entries[key]
+            changed = True
+
+    if changed:
+        save_index(index_file, index)
+
+    return seeds
+
+
+def fit(
+    seed: SeedSchedule,
+    config: Configuration,
+    ids_to_ignore: Collection[ID] = (),
+) -> tuple[int, bool, int, int] | None:
+    """
+    How well the seed schedule fits the configuration, lower being better, or
+    ``None`` if it can't be used for it.
+
+    Seeds with fewer spare ids (which leave fewer empty places) fit better,
+    then those whose matches fill every arena, then those which space out
+    appearances further and then those which give teams more even numbers of
+    matches.
+    """
+    max_match_size = config.num_arenas * config.teams_per_game
+    if any(
+        size > max_match_size or size % config.teams_per_game != 0
+        for size in seed.match_sizes
+    ):
+        return None
+
+    appearances = [
+        count
+        for id_, count in seed.appearances.items()
+        if id_ not in ids_to_ignore
+    ]
+    if len(appearances) < config.num_teams:
+        return None
+
+    min_spacing = seed.num_matches if seed.min_spacing is None else seed.min_spacing
+    return (
+        len(appearances) - config.num_teams,
+        seed.match_sizes != [max_match_size],
+        -min_spacing,
+        max(appearances, default=0) - min(appearances, default=0),
+    )
+
+
+def rank_seeds(
+    seeds: Iterable[SeedSchedule],
+    config: Configuration,
+    ids_to_ignore: Collection[ID] = (),
+) -> list[SeedSchedule]:
+    """
+    The seed schedules which can be used for the configuration, best fitting
+    first. Those which fit equally well are kept in their original order.
+    """
+    usable = []
+    for seed in seeds:
+        fit_ = fit(seed, config, ids_to_ignore)
+        if fit_ is not None:
+            usable.append((fit_, seed))
+
+    usable.sort(key=lambda x: x[0])
+    return [seed for _, seed in usable]
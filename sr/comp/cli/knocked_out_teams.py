@@ -17,9 +17,9 @@ def round_name(rounds_left: int) -> str:
 
 
 def command(settings: argparse.Namespace) -> None:
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
 
-    comp = SRComp(settings.compstate)
+    comp = comp_loader.load(settings.compstate)
 
     teams_last_round: set[TLA | None] = set()
     last_round_num = len(comp.schedule.knockout_rounds) - 1
@@ -1,7 +1,10 @@
+import json
+import math
 import random
 import sys
+import time
+from array import array
 from collections import Counter
-from itertools import product
 from math import gcd
 
 
@@ -10,8 +13,8 @@ class PatienceCounter:
         self.threshold = threshold
         self.level = 0
 
-    def bump(self):
-        self.level += 1
+    def bump(self, amount=1):
+        self.level += amount
 
     def reset(self):
         self.level = 0
@@ -20,6 +23,70 @@ class PatienceCounter:
         return self.level >= self.threshold
 
 
+class Backtracker:
+    """
+    Unwind the schedule when no round can be found to follow it, remembering
+    (by their fingerprints) the schedules which were found to be such dead
+    ends so that the search doesn't return to them.
+
+    A single round is unwound at first. Each time the search fails again
+    without having got any further than before, twice as many rounds are
+    unwound as the time before, so that dead ends which were set up several
+    rounds earlier can be escaped.
+    """
+
+    def __init__(self, separation, round_length):
+        self.separation = separation
+        self.round_length = round_length
+        self.dead_ends = set()
+        self.depth = 1
+        # The length of the longest schedule found to be a dead end
+        self.frontier = 0
+
+    def is_dead_end(self, state):
+        if not self.dead_ends:
+            return False
+        return state.fingerprint(self.separation) in self.dead_ends
+
+    def backtrack(self, state, min_length):
+        """
+        Unwind rounds from the given schedule, leaving at least ``min_length``
+        matches. Returns the number of rounds unwound.
+        """
+        if len(state.matches) > self.frontier:
+            self.frontier = len(state.matches)
+            self.depth = 1
+        else:
+            num_rounds = (len(state.matches) - min_length) // self.round_length
+            self.depth = max(min(self.depth * 2, num_rounds), 1)
+        # Only the schedule as it is has been found to be a dead end, not those
+        # leading up to it, which other rounds may yet follow
+        self.dead_ends.add(state.fingerprint(self.separation))
+        unwound = 0
+        while unwound < self.depth and len(state.matches) > min_length:
+            state.pop()
+            unwound += 1
+        return unwound
+
+    def reset(self):
+        """Forget the dead ends, which may not be any more once the constraints change."""
+        self.dead_ends.clear()
+        self.depth = 1
+        self.frontier = 0
+
+    def getstate(self):
+        return {
+            'dead_ends': sorted(list(x) for x in self.dead_ends),
+            'depth': self.depth,
+            'frontier': self.frontier,
+        }
+
+    def setstate(self, data):
+        self.dead_ends = {tuple(x) for x in data['dead_ends']}
+        self.depth = data['depth']
+        self.frontier = data['frontier']
+
+
 def prime_factors(n):
     d = 2
     while d * d <= n:
@@ -31,6 +98,233 @@ def prime_factors(n):
         yield n
 
 
+# How each round is searched for:
+#  shuffle: shuffle all the teams until a round that meets the constraints turns up
+#  anneal: start from a shuffled round and repair it, swapping teams involved in
+#          violations between games (by simulated annealing)
+SEARCHES = ('shuffle', 'anneal')
+
+# Limits on the search for each round, for each kind of search: the number of
+# attempts at finding a round and, for annealing, the number of swaps per attempt
+SHUFFLE_ATTEMPTS = 10000
+ANNEAL_ATTEMPTS = 20
+ANNEAL_STEPS = 2000
+ANNEAL_START_TEMPERATURE = 2.0
+ANNEAL_COOLING = 0.998
+
+
+# Time between reports of the progress of the search, in seconds
+STATS_INTERVAL = 10
+
+# Name of the file (in the srcomp cache directory) LCG parameters are
+# remembered in
+LCG_MEMO_FILE = 'lcg-params.json'
+
+
+def find_lcg_params(m, round_length, entrants_per_match_period, separation):
+    """
+    Find parameters ``(a, c)`` for an LCG ``x -> (a * x + c) % m`` which
+    permutes the teams of one round into the next such that no team appears
+    in the last ``separation`` matches of one round and the first few of the
+    next, or return ``None`` if there aren't any.
+
+    The largest suitable ``a`` is used, then the largest suitable ``c``.
+    """
+    epm = entrants_per_match_period
+    # By the Hull-Dobell theorem, for the LCG to be a permutation a - 1 must be
+    # divisible by each prime factor of m (and 4), and c coprime with m.
+    step = 4
+    for factor in set(prime_factors(m)):
+        step = step * factor // gcd(step, factor)
+    windows = [
+        # The entrants of the match ``sm`` from the end of the round must not
+        # be placed in the first ``1 + separation - sm`` matches of the next
+        ((round_length - sm) * epm, epm * (1 + separation - sm))
+        for sm in range(1, separation + 1)
+    ]
+    for a in range(1 + step * ((m - 2) // step), 1, -step):
+        for c in range(m - 1, 0, -1):
+            if gcd(c, m) != 1:
+                continue
+            if all(
+                _lcg_window_avoids(a, c, m, src_start, epm, dst_end)
+                for src_start, dst_end in windows
+            ):
+                return a, c
+    return None
+
+
+def _lcg_window_avoids(a, c, m, src_start, length, dst_end):
+    """Whether the LCG maps none of ``length`` values from ``src_start`` below ``dst_end``."""
+    value = (a * src_start + c) % m
+    for _ in range(length):
+        if value < dst_end:
+            return False
+        value += a
+        if value >= m:
+            value -= m
+    return True
+
+
+def lcg_memo_path():
+    """Where LCG parameters are remembered, or ``None`` if they can't be."""
+    from sr.comp.cli.comp_loader import cache_root
+
+    directory = cache_root()
+    return None if directory is None else directory / LCG_MEMO_FILE
+
+
+def memoised_lcg_params(m, round_length, entrants_per_match_period, separation):
+    """
+    Find LCG parameters as ``find_lcg_params`` does, remembering them on disk
+    (in the srcomp cache directory) as the search can be slow for large leagues.
+    """
+    key = f'{m},{round_length},{entrants_per_match_period},{separation}'
+    memo_path = lcg_memo_path()
+    memo = {}
+    if memo_path is not None:
+        try:
+            with memo_path.open() as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            pass
+        else:
+            if key in memo:
+                params = memo[key]
+                return None if params is None else tuple(params)
+
+    params = find_lcg_params(m, round_length, entrants_per_match_period, separation)
+
+    if memo_path is not None:
+        from sr.comp.cli.utils import write_atomically
+
+        memo[key] = params
+        try:
+            memo_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            write_atomically(memo_path, json.dumps(memo))
+        except OSError:
+            # Only an optimisation, so carry on without it
+            pass
+
+    return params
+
+
+class SearchStats:
+    """
+    Counters describing the search for a schedule: how many rounds were
+    proposed, accepted and backtracked over, and why proposed rounds were
+    rejected.
+
+    Rejections are counted by the constraint which failed: ``spacing``
+    (teams scheduled too close together), ``matchups`` (teams meeting too
+    often), ``pseudo_teams`` (more than one empty place in a game) and
+    ``duplicates`` (a team appearing twice in a match), plus ``unrepaired``
+    for rounds the annealing search couldn't repair and ``dead_end`` for
+    rounds which would return to a schedule the search has already had to
+    backtrack from.
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.end = None
+        self.attempts = 0
+        self.accepted = 0
+        self.backtracks = 0
+        self.rounds_backtracked = 0
+        self.anneal_steps = 0
+        self.rejections = Counter()
+
+    def finish(self):
+        self.end = time.monotonic()
+
+    def summary(self):
+        end = time.monotonic() if self.end is None else self.end
+        elapsed = end - self.start
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'attempts': self.attempts,
+            'attempts_per_second': round(self.attempts / elapsed, 1) if elapsed else None,
+            'accepted_rounds': self.accepted,
+            'backtracks': self.backtracks,
+            'rounds_backtracked': self.rounds_backtracked,
+            'anneal_steps': self.anneal_steps,
+            'rejections': dict(self.rejections.most_common()),
+        }
+
+    def describe(self):
+        summary = self.summary()
+        rejections = ", ".join(
+            f"{reason}: {count}"
+            for reason, count in summary['rejections'].items()
+        )
+        return (
+            f"{summary['attempts']} attempts ({summary['attempts_per_second']}/s), "
+            f"{summary['accepted_rounds']} rounds accepted, "
+            f"{summary['backtracks']} backtracks; rejections: {rejections or 'none'}"
+        )
+
+
+class ScheduleState:
+    """
+    The running state of a schedule as it is built up, a round at a time.
+
+    This holds what's needed to check new matches against the constraints
+    without re-examining the whole schedule: how many times each pair of
+    teams has faced each other and which teams are in each match. Rounds can
+    be removed again (in the reverse order to which they were added) in order
+    to backtrack.
+
+    A hash of the matchup counts is kept up to date as well, from which
+    ``fingerprint`` identifies schedules which constrain what can follow them
+    in the same way.
+
+    Teams are identified by their index (see ``Scheduler``), of which there
+    are ``num_teams`` real teams. The matchups are held as a square matrix,
+    flattened into an array indexed by ``a * num_teams + b`` for teams ``a <
+    b``, and the entrants of each match as a bitmask with a bit per team.
+    """
+
+    def __init__(self, num_teams):
+        self.num_teams = num_teams
+        self.matches = []
+        self.matchups = array('i', [0]) * (num_teams * num_teams)
+        self.entrant_masks = []
+        self.matchup_hash = 0
+        self._pushed = []
+
+    def push(self, matches, entrant_masks, matchups):
+        """
+        Append matches to the schedule, given the bitmasks of their entrants
+        and the indices of the matchups within them.
+        """
+        self.matches.extend(matches)
+        self.entrant_masks.extend(entrant_masks)
+        for matchup in matchups:
+            self.matchups[matchup] += 1
+            # Each level a matchup's count reaches contributes to the hash,
+            # which so doesn't depend on the order the matchups were added in
+            self.matchup_hash += hash((matchup, self.matchups[matchup]))
+        self._pushed.append((len(matches), matchups))
+
+    def pop(self):
+        """Remove the most recently pushed matches from the schedule."""
+        num_matches, matchups = self._pushed.pop()
+        del self.matches[-num_matches:]
+        del self.entrant_masks[-num_matches:]
+        for matchup in matchups:
+            self.matchup_hash -= hash((matchup, self.matchups[matchup]))
+            self.matchups[matchup] -= 1
+
+    def fingerprint(self, separation):
+        """
+        Identify the schedule by what constrains the matches which can follow
+        it: its length, how often each pair of teams has met and who is in the
+        last ``separation`` matches.
+        """
+        recent_masks = self.entrant_masks[-separation:] if separation else []
+        return (len(self.matches), self.matchup_hash, *recent_masks)
+
+
 class Scheduler:
     def __init__(
         self,
@@ -44,19 +338,41 @@ class Scheduler:
         max_matchups=2,
         enable_lcg=True,
         base_matches=(),
+        search='shuffle',
+        time_limit=None,
+        checkpoint=None,
+        checkpoint_interval=60,
+        progress=None,
     ):
+        if search not in SEARCHES:
+            raise ValueError(f"Unknown search {search!r}")
         self.tag = ''
+        self.search = search
+        self.time_limit = time_limit
+        # Called with the data for a checkpoint (see ``resume``), at most once
+        # per ``checkpoint_interval`` seconds
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        # Called with the number of the first match which has changed and the
+        # matches from there on each time the schedule grows or is unwound
+        self.progress = progress
+        self._resume_from = None
+        self._zone_seed = 0
+        # Details of how the last run fell short, if it did; see ``relaxations``
+        self.timed_out = False
+        self.eased_max_matchups = max_matchups
+        self._num_scheduled = 0
+        self.stats = SearchStats()
         self.num_corners = num_corners
         self.random = random
         self.arenas = tuple(arenas)
         self.max_match_periods = max_match_periods
         self.appearances_per_round = appearances_per_round
-        self._base_matches = list(base_matches)
-        for match in base_matches:
-            for n, entry in enumerate(match):
-                if entry is None:
-                    match[n] = '~'
-        self._calculate_teams(teams)
+        self._calculate_teams(teams, base_matches)
+        self._base_matches = [
+            [self._team_ids[entry] for entry in match]
+            for match in base_matches
+        ]
         self._calculate_rounds()
         if len(self._base_matches) % self.round_length > 0:
             self.lprint(
@@ -70,20 +386,34 @@ class Scheduler:
         else:
             self._lcg_params = None
 
-    def lprint(self, *args, **kwargs):
-        if self.tag:
-            print(self.tag, end='', file=sys.stderr)
-        print(*args, file=sys.stderr, **kwargs)
+    def lprint(self, *args):
+        # Write each line at once so that output from parallel workers doesn't
+        # get interleaved within lines
+        message = ' '.join(str(arg) for arg in args)
+        sys.stderr.write(f'{self.tag}{message}\n')
 
     @property
     def entrants_per_match_period(self):
         return len(self.arenas) * self.num_corners
 
     def _is_pseudo(self, team):
-        return team[0] == '~'
+        return team >= self._num_real_teams
+
+    def _calculate_teams(self, base_teams, base_matches):
+        # Teams are handled by index: real teams (including any which only
+        # appear in the base matches) first, then the pseudo teams which pad
+        # out the matches. Names are only needed again in the output.
+        names = list(dict.fromkeys(base_teams))
+        known_names = set(names)
+        for match in base_matches:
+            for entry in match:
+                if entry is not None and entry != '~' and entry not in known_names:
+                    names.append(entry)
+                    known_names.add(entry)
+        self._num_real_teams = len(names)
+        team_ids = {name: n for n, name in enumerate(names)}
 
-    def _calculate_teams(self, base_teams):
-        teams = list(base_teams) * self.appearances_per_round
+        teams = [team_ids[team] for team in base_teams] * self.appearances_per_round
         # account for overflow
         overflow = (
             self.entrants_per_match_period -
@@ -91,7 +421,15 @@ class Scheduler:
         )
         if overflow < self.entrants_per_match_period:
             for n in range(overflow):
-                teams.append(f'~{n}')
+                team_ids[f'~{n}'] = len(names)
+                teams.append(len(names))
+                names.append(f'~{n}')
+        # Empty places in the base matches
+        team_ids[None] = team_ids['~'] = len(names)
+        names.append('~')
+
+        self._team_names = names
+        self._team_ids = team_ids
         self._teams = teams
 
     @property
@@ -106,100 +444,215 @@ class Scheduler:
         )
         self.round_length = len(self._teams) // self.entrants_per_match_period
 
-    def _validate(
+    def _check_matches(
         self,
-        schedule,
+        state,
+        new_matches,
         matchup_max=None,
         matchup_impatience_bump=lambda: None,
     ):
-        is_pseudo = self._is_pseudo
+        """
+        Check whether the given matches can be appended to the schedule so far.
+
+        Only the new matches are examined, relying on ``state`` for what's
+        needed from the existing schedule, so this costs time proportional to
+        the number of new matches rather than the length of the schedule.
+
+        Returns the bitmasks of the entrants of the new matches and the indices
+        of the matchups within them if they are acceptable, for passing to
+        ``state.push``, or ``None`` otherwise.
+        """
+        num_real_teams = self._num_real_teams
+        num_corners = self.num_corners
+        separation = self.separation
+        matchup_counts = state.matchups
         if matchup_max is None:
             matchup_max = self.max_matchups
-        multi_per_match_mode = self.appearances_per_round > 1
         # 4 tests in this function:
         #  (1) validate that teams aren't scheduled too tightly
         #  (2) validate that matchups aren't too frequent
         #  (3) validate that no match has two teams sitting out (or if it is, that it's blank)
         # if operating multiple appearances per match, also:
         #  (4) make sure that a team doesn't appear in a match twice
-        matchups = Counter()
-        for match_id, match in enumerate(schedule):
-            entrants = set(
-                entrant
-                for entrant in match
-                if not is_pseudo(entrant)
-            )
-            if multi_per_match_mode:
-                # Test constraint (4)
-                if len(entrants) != len([
-                    entrant
-                    for entrant in match
-                    if not is_pseudo(entrant)
-                ]):
-                    return False
+        recent_masks = state.entrant_masks[-separation:] if separation else []
+        new_masks = []
+        real_games = []
+        for match in new_matches:
+            mask = 0
+            for game_start in range(0, len(match), num_corners):
+                game = match[game_start:game_start + num_corners]
+                real = [team for team in game if team < num_real_teams]
+                # Test constraint (3)
+                if len(game) - len(real) > 1 and real:
+                    self.stats.rejections['pseudo_teams'] += 1
+                    return None
+                for team in real:
+                    bit = 1 << team
+                    # Test constraint (4)
+                    if mask & bit:
+                        self.stats.rejections['duplicates'] += 1
+                        return None
+                    mask |= bit
+                real_games.append(real)
             # Test constraint (1)
-            previous_matches = schedule[match_id - self.separation:match_id]
-            for previous_match in previous_matches:
-                for previous_entrant in previous_match:
-                    if is_pseudo(previous_entrant):
-                        continue
-                    if previous_entrant in entrants:
-                        return False
-            # Update constraint (2)
-            for arena_id in range(len(self.arenas)):
-                game = match[arena_id * self.num_corners:(arena_id + 1) * self.num_corners]
-                for a, b in product(game, repeat=2):
-                    if a >= b:
-                        continue
-                    a_pseudo, b_pseudo = is_pseudo(a), is_pseudo(b)
-                    # Check constraint (3) while we're here
-                    if (
-                        a_pseudo and
-                        b_pseudo and
-                        not all(is_pseudo(x) for x in game)
-                    ):
-                        return False
-                    elif not a_pseudo and not b_pseudo:
-                        matchups.update([(a, b)])
+            for previous_mask in recent_masks[-separation:]:
+                if previous_mask & mask:
+                    self.stats.rejections['spacing'] += 1
+                    return None
+            if separation:
+                recent_masks.append(mask)
+            new_masks.append(mask)
         # No collisions, determine whether teams face a broad range of other teams
-        top_repeated_matchups = max(matchups.values())
-        if top_repeated_matchups > self.max_matchups:
+        matchups = []
+        too_many_matchups = False
+        for real in real_games:
+            for n, a in enumerate(real):
+                for b in real[n + 1:]:
+                    if a < b:
+                        matchup = a * num_real_teams + b
+                    else:
+                        matchup = b * num_real_teams + a
+                    matchups.append(matchup)
+                    matchup_counts[matchup] += 1
+                    if matchup_counts[matchup] > matchup_max:
+                        too_many_matchups = True
+                        break
+                if too_many_matchups:
+                    break
+            if too_many_matchups:
+                break
+        # The counts are only updated to check them, leave them as they were
+        for matchup in matchups:
+            matchup_counts[matchup] -= 1
+        if too_many_matchups:
             # team faces off against one other team too many times
+            self.stats.rejections['matchups'] += 1
             matchup_impatience_bump()
-            return False
+            return None
         # No objections, your honour!
-        return True
+        return new_masks, matchups
+
+    def _validate(
+        self,
+        schedule,
+        matchup_max=None,
+        matchup_impatience_bump=lambda: None,
+    ):
+        """Check the whole of the given (encoded) schedule against the constraints."""
+        checked = self._check_matches(
+            ScheduleState(self._num_real_teams),
+            schedule,
+            matchup_max,
+            matchup_impatience_bump,
+        )
+        return checked is not None
+
+    def _initial_state(self):
+        """
+        Build the state for the base matches, which are taken as given rather
+        than being checked against the constraints.
+        """
+        state = ScheduleState(self._num_real_teams)
+        for match in self._base_matches:
+            self._push_unchecked(state, [match])
+        return state
+
+    def _push_unchecked(self, state, matches):
+        """Append matches to the schedule without checking them against the constraints."""
+        num_real_teams = self._num_real_teams
+        masks = []
+        matchups = []
+        for match in matches:
+            mask = 0
+            for game_start in range(0, len(match), self.num_corners):
+                game = match[game_start:game_start + self.num_corners]
+                real = sorted(team for team in game if team < num_real_teams)
+                for n, a in enumerate(real):
+                    mask |= 1 << a
+                    matchups.extend(a * num_real_teams + b for b in real[n + 1:] if a != b)
+            masks.append(mask)
+        state.push(matches, masks, matchups)
+
+    def resume(self, checkpoint):
+        """
+        Continue the next run from the given checkpoint, as passed to the
+        ``checkpoint`` callback by an earlier run with the same options.
+
+        Resuming continues exactly as the earlier run would have done, so for
+        the same seed produces the same schedule. This includes checkpoints
+        saved on reaching the time limit partway through a round, which record
+        how many attempts at the round had been made.
+        """
+        self._resume_from = checkpoint
+
+    def _save_checkpoint(
+        self,
+        state,
+        teams,
+        max_matchups,
+        matchup_impatience,
+        backtracker,
+        round_attempts=None,
+        force=False,
+    ):
+        if self.checkpoint is None:
+            return
+        if not force and time.monotonic() < self._next_checkpoint:
+            return
+        names = self._team_names
+        version, internal_state, gauss_next = self.random.getstate()
+        self.checkpoint({
+            'matches': [
+                [names[team] for team in match]
+                for match in state.matches[len(self._base_matches):]
+            ],
+            'teams': [names[team] for team in teams],
+            'random_state': [version, list(internal_state), gauss_next],
+            'max_matchups': max_matchups,
+            'patience': matchup_impatience.level,
+            'backtracking': backtracker.getstate(),
+            # Attempts made at the round in progress, if saved partway through one
+            'round_attempts': round_attempts,
+        })
+        self._next_checkpoint = time.monotonic() + self.checkpoint_interval
+
+    def _restore_checkpoint(self, state, checkpoint, matchup_impatience, backtracker):
+        """
+        Restore the state of a run from a checkpoint, returning the order of
+        the teams, the maximum matchups it had reached and the number of
+        attempts made at the round in progress (``None`` if between rounds).
+        """
+        team_ids = self._team_ids
+        matches = [
+            [team_ids[name] for name in match]
+            for match in checkpoint['matches']
+        ]
+        # Push a round at a time, so that backtracking works as it would have done
+        for n in range(0, len(matches), self.round_length):
+            self._push_unchecked(state, matches[n:n + self.round_length])
+        version, internal_state, gauss_next = checkpoint['random_state']
+        self.random.setstate((version, tuple(internal_state), gauss_next))
+        matchup_impatience.level = checkpoint['patience']
+        backtracker.setstate(checkpoint['backtracking'])
+        self.lprint(f"Resuming with {len(state.matches)} matches scheduled")
+        return (
+            [team_ids[name] for name in checkpoint['teams']],
+            checkpoint['max_matchups'],
+            checkpoint.get('round_attempts'),
+        )
 
     def _compute_lcg_params(self):
-        m = len(self._teams)
-        for a in range(m - 1, 1, -1):
-            am1 = a - 1
-            if am1 % 4 != 0:
-                continue
-            if any(am1 % factor != 0 for factor in prime_factors(m)):
-                continue
-            for c in range(m - 1, 0, -1):
-                if gcd(c, m) != 1:
-                    continue
-                epm = self.entrants_per_match_period
-                acceptable = True
-                for sm in range(1, self.separation + 1):
-                    overlap = 1 + self.separation - sm
-                    dst_a = 0
-                    dst_b = epm * overlap
-                    src_a = (self.round_length - sm) * epm
-                    src_b = (1 + self.round_length - sm) * epm
-                    src = set((a * x + c) % m for x in range(src_a, src_b))
-                    dst = set(range(dst_a, dst_b))
-                    if not src.isdisjoint(dst):
-                        acceptable = False
-                if not acceptable:
-                    continue
-                self._lcg_params = (a, c)
-                self.lprint(f"Found LCG settings: ({a}, {c})")
-                return
-        self.lprint("No valid LCG parameters")
-        self._lcg_params = None
+        params = memoised_lcg_params(
+            len(self._teams),
+            self.round_length,
+            self.entrants_per_match_period,
+            self.separation,
+        )
+        if params is None:
+            self.lprint("No valid LCG parameters")
+        else:
+            self.lprint(f"Found LCG settings: {params}")
+        self._lcg_params = params
 
     def _lcg_permute(self, teams):
         if self._lcg_params is None:
@@ -214,44 +667,315 @@ class Scheduler:
         return permutation
 
     def run(self):
+        """
+        Build the schedule.
+
+        If a time limit was given and it is reached then the longest schedule
+        found so far is returned instead, which may be incomplete; see
+        ``relaxations`` for how the constraints were relaxed.
+        """
         matchup_impatience = PatienceCounter(200000)
+        backtracker = Backtracker(self.separation, self.round_length)
         max_matchups = self.max_matchups
-        matches = list(self._base_matches)
+        if self.time_limit is None:
+            deadline = None
+        else:
+            deadline = time.monotonic() + self.time_limit
+        state = self._initial_state()
+        # Drawn first so that resuming from a checkpoint (which restores the
+        # state of the random number generator) gets the same one
+        self._zone_seed = self.random.randrange(2 ** 32)
         teams = list(self._teams)
         self.random.shuffle(teams)
+        round_attempts = None
+        if self._resume_from is not None:
+            teams, max_matchups, round_attempts = self._restore_checkpoint(
+                state,
+                self._resume_from,
+                matchup_impatience,
+                backtracker,
+            )
+        self._report_progress(state, 0)
+        best_matches = list(state.matches)
+        best_max_matchups = max_matchups
+        self.timed_out = False
+        self.stats = SearchStats()
+        next_report = time.monotonic() + STATS_INTERVAL
+        self._next_checkpoint = time.monotonic() + self.checkpoint_interval
         while (
-            len(matches) < self.total_matches and
-            len(matches) + self.round_length <= self.max_match_periods
+            len(state.matches) < self.total_matches and
+            len(state.matches) + self.round_length <= self.max_match_periods
         ):
-            this_round = len(matches) // self.round_length
+            this_round = len(state.matches) // self.round_length
             self.lprint("Scheduling round {round} ({prev}/{tot} complete)".format(
                 round=this_round,
-                prev=len(matches),
+                prev=len(state.matches),
                 tot=self.total_matches,
             ))
-            # Attempt the LCG
-            lcg_round = self._lcg_permute(teams)
+            # Attempt the LCG, unless resuming partway through a round (which
+            # already tried it)
+            lcg_round = None if round_attempts is not None else self._lcg_permute(teams)
             if lcg_round is not None:
-                matches_prime = matches + self._match_partition(lcg_round)
-                if self._validate(matches_prime, max_matchups, matchup_impatience.bump):
-                    matches = matches_prime
+                self.stats.attempts += 1
+                new_matches = self._match_partition(lcg_round)
+                checked = self._check_matches(
+                    state,
+                    new_matches,
+                    max_matchups,
+                    matchup_impatience.bump,
+                )
+                if checked is not None and self._push_round(
+                    state,
+                    new_matches,
+                    checked,
+                    backtracker,
+                ):
                     self.lprint("  completed via LCG permutation")
+                    if len(state.matches) > len(best_matches):
+                        best_matches = list(state.matches)
+                        best_max_matchups = max_matchups
+                    self._save_checkpoint(
+                        state,
+                        teams,
+                        max_matchups,
+                        matchup_impatience,
+                        backtracker,
+                    )
                     continue
-            for _ in range(10000):
+            if self.search == 'anneal':
+                attempts = ANNEAL_ATTEMPTS
+                propose_round = self._anneal_round
+            else:
+                attempts = SHUFFLE_ATTEMPTS
+                propose_round = self._shuffle_round
+            used_attempts = round_attempts or 0
+            round_attempts = None
+            while used_attempts < attempts:
+                now = time.monotonic()
+                if deadline is not None and now > deadline:
+                    self.timed_out = True
+                    break
+                if now >= next_report:
+                    self.lprint("  " + self.stats.describe())
+                    next_report = now + STATS_INTERVAL
+                used_attempts += 1
+                self.stats.attempts += 1
                 if matchup_impatience.reached():
                     matchup_impatience.reset()
                     self.lprint("  Easing off on matchup constraint.")
                     max_matchups += 1
-                self.random.shuffle(teams)
-                matches_prime = matches + self._match_partition(teams)
-                if self._validate(matches_prime, max_matchups, matchup_impatience.bump):
-                    matches = matches_prime
+                    backtracker.reset()
+                if not propose_round(state, teams, max_matchups, matchup_impatience.bump):
+                    continue
+                new_matches = self._match_partition(teams)
+                checked = self._check_matches(
+                    state,
+                    new_matches,
+                    max_matchups,
+                    matchup_impatience.bump,
+                )
+                if checked is not None and self._push_round(
+                    state,
+                    new_matches,
+                    checked,
+                    backtracker,
+                ):
+                    if len(state.matches) > len(best_matches):
+                        best_matches = list(state.matches)
+                        best_max_matchups = max_matchups
+                    self._save_checkpoint(
+                        state,
+                        teams,
+                        max_matchups,
+                        matchup_impatience,
+                        backtracker,
+                    )
                     break
             else:
-                if len(matches) > len(self._base_matches):
-                    self.lprint("  backtracking")
-                    matches = matches[:-self.round_length]
-        return self._clean(matches)
+                if len(state.matches) > len(self._base_matches):
+                    unwound = backtracker.backtrack(state, len(self._base_matches))
+                    self.lprint(f"  backtracking {unwound} round(s)")
+                    self.stats.backtracks += 1
+                    self.stats.rounds_backtracked += unwound
+                    self._report_progress(state, len(state.matches))
+            if self.timed_out:
+                self.lprint("  Reached the time limit.")
+                # So that the search can be continued
+                self._save_checkpoint(
+                    state,
+                    teams,
+                    max_matchups,
+                    matchup_impatience,
+                    backtracker,
+                    round_attempts=used_attempts,
+                    force=True,
+                )
+                break
+        if not self.timed_out:
+            best_matches = state.matches
+            best_max_matchups = max_matchups
+        self.eased_max_matchups = best_max_matchups
+        self._num_scheduled = len(best_matches)
+        self.stats.finish()
+        self.lprint("Search statistics: " + json.dumps(self.stats.summary()))
+        return self._clean(best_matches)
+
+    def _push_round(self, state, new_matches, checked, backtracker):
+        """
+        Append a checked round to the schedule, unless that leads to one which
+        has already been found to be a dead end. Returns whether it was added.
+        """
+        state.push(new_matches, *checked)
+        if backtracker.is_dead_end(state):
+            state.pop()
+            self.stats.rejections['dead_end'] += 1
+            return False
+        self.stats.accepted += 1
+        self._report_progress(state, len(state.matches) - len(new_matches))
+        return True
+
+    def _report_progress(self, state, first_match):
+        if self.progress is None:
+            return
+        self.progress(first_match, self._clean(state.matches[first_match:], first_match))
+
+    def relaxations(self):
+        """
+        Describe how the schedule from the last run falls short of what was
+        asked for, as a list of messages (empty if it doesn't).
+        """
+        messages = []
+        if self.timed_out:
+            messages.append(
+                f"Stopped at the time limit with {self._num_scheduled} of "
+                f"{self.total_matches} matches scheduled.",
+            )
+        if self.eased_max_matchups > self.max_matchups:
+            messages.append(
+                f"Eased the maximum repeated matchups from {self.max_matchups} "
+                f"to {self.eased_max_matchups}.",
+            )
+        return messages
+
+    def _shuffle_round(self, state, teams, matchup_max, matchup_impatience_bump):
+        """Propose a round by shuffling the teams, leaving the checking to the caller."""
+        self.random.shuffle(teams)
+        return True
+
+    def _round_violations(self, state, teams, matchup_max):
+        """
+        Measure how far the given round (as a list of teams, in match order) is
+        from meeting the constraints.
+
+        Returns the total cost of the violations, the positions within
+        ``teams`` of the entrants involved in them and how much of the cost is
+        from matchups. Each team appearing too soon after a previous
+        appearance, each excess pseudo team in a game and each matchup beyond
+        ``matchup_max`` costs one.
+        """
+        num_real_teams = self._num_real_teams
+        num_corners = self.num_corners
+        separation = self.separation
+        epm = self.entrants_per_match_period
+        recent_masks = state.entrant_masks[-separation:] if separation else []
+        cost = 0
+        bad_positions = set()
+        matchups = {}
+        for match_start in range(0, len(teams), epm):
+            mask = 0
+            previous_mask = 0
+            for previous in recent_masks[-separation:]:
+                previous_mask |= previous
+            for position in range(match_start, match_start + epm):
+                team = teams[position]
+                if team >= num_real_teams:
+                    continue
+                bit = 1 << team
+                if (previous_mask | mask) & bit:
+                    # Too soon after a previous appearance, or twice in this match
+                    cost += 1
+                    bad_positions.add(position)
+                mask |= bit
+            if separation:
+                recent_masks.append(mask)
+
+            for game_start in range(match_start, match_start + epm, num_corners):
+                real = []
+                pseudo = []
+                for position in range(game_start, game_start + num_corners):
+                    if teams[position] < num_real_teams:
+                        real.append(position)
+                    else:
+                        pseudo.append(position)
+                if real and len(pseudo) > 1:
+                    cost += len(pseudo) - 1
+                    bad_positions.update(pseudo)
+                for n, position_a in enumerate(real):
+                    for position_b in real[n + 1:]:
+                        a, b = teams[position_a], teams[position_b]
+                        if a > b:
+                            a, b = b, a
+                        matchup = a * num_real_teams + b
+                        matchups.setdefault(matchup, []).append((position_a, position_b))
+
+        matchup_counts = state.matchups
+        matchup_excess = 0
+        for matchup, positions in matchups.items():
+            excess = matchup_counts[matchup] + len(positions) - matchup_max
+            if excess > 0:
+                matchup_excess += excess
+                for pair in positions:
+                    bad_positions.update(pair)
+
+        return cost + matchup_excess, bad_positions, matchup_excess
+
+    def _anneal_round(self, state, teams, matchup_max, matchup_impatience_bump):
+        """
+        Propose a round by starting from a shuffle of the teams and repairing it.
+
+        Each step swaps a team involved in a violation with one in another game,
+        keeping the swap if it doesn't make things worse or, with a probability
+        which falls as the search cools, even if it does. Returns whether a
+        round meeting the constraints was found, leaving it in ``teams``.
+        """
+        rng = self.random
+        num_corners = self.num_corners
+        self.random.shuffle(teams)
+        cost, bad_positions, matchup_excess = self._round_violations(
+            state,
+            teams,
+            matchup_max,
+        )
+        temperature = ANNEAL_START_TEMPERATURE
+        for _ in range(ANNEAL_STEPS):
+            if cost == 0:
+                return True
+            a = rng.choice(sorted(bad_positions))
+            b = rng.randrange(len(teams))
+            if a // num_corners == b // num_corners or teams[a] == teams[b]:
+                continue
+            teams[a], teams[b] = teams[b], teams[a]
+            self.stats.anneal_steps += 1
+            new_cost, new_bad_positions, new_matchup_excess = self._round_violations(
+                state,
+                teams,
+                matchup_max,
+            )
+            delta = new_cost - cost
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                cost, bad_positions = new_cost, new_bad_positions
+                matchup_excess = new_matchup_excess
+            else:
+                teams[a], teams[b] = teams[b], teams[a]
+            temperature *= ANNEAL_COOLING
+        if cost == 0:
+            return True
+        self.stats.rejections['unrepaired'] += 1
+        if matchup_excess:
+            # Count the steps spent towards easing off the matchup constraint,
+            # in proportion to how much of what's left to repair is down to it
+            matchup_impatience_bump(ANNEAL_STEPS * matchup_excess // cost)
+        return False
 
     def _match_partition(self, teams):
         entries = []
@@ -259,18 +983,24 @@ class Scheduler:
             entries.append(teams[n:n + self.entrants_per_match_period])
         return entries
 
-    def _clean(self, matches):
+    def _clean(self, matches, first_match=0):
         def get_match(match_id, match):
+            # Seeded by the match number so that a match comes out the same
+            # however it's reported, for as long as it's in the schedule
+            zone_random = random.Random(self._zone_seed + match_id)
             data = {}
             for arena_id, arena in enumerate(self.arenas):
                 entrants = match[arena_id * self.num_corners:(arena_id + 1) * self.num_corners]
                 # Shuffle entrants to get statistically sensible zone distribution
                 if match_id >= len(self._base_matches):  # don't shuffle provided matches!
-                    self.random.shuffle(entrants)
+                    zone_random.shuffle(entrants)
                 entrants = [
-                    None if self._is_pseudo(entrant) else entrant
+                    None if self._is_pseudo(entrant) else self._team_names[entrant]
                     for entrant in entrants
                 ]
                 data[arena] = entrants
             return data
-        return {match_id: get_match(match_id, match) for match_id, match in enumerate(matches)}
+        return {
+            match_id: get_match(match_id, match)
+            for match_id, match in enumerate(matches, start=first_match)
+        }
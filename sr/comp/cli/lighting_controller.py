@@ -5,8 +5,6 @@ import time
 from datetime import timedelta
 from enum import Enum
 
-from sr.comp.comp import SRComp
-
 __description__ = "A way of controlling lights at the competition."
 
 
@@ -146,7 +144,9 @@ class MidiLightingController(LightingController):
 
 
 def command(args: argparse.Namespace) -> None:
-    comp = SRComp(args.compstate)
+    from sr.comp.cli import comp_loader
+
+    comp = comp_loader.load(args.compstate)
 
     controller = None
 
@@ -4,9 +4,9 @@ import argparse
 
 
 def command(args: argparse.Namespace) -> None:
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
 
-    comp = SRComp(args.compstate)
+    comp = comp_loader.load(args.compstate)
     matches = comp.schedule.matches
 
     remaining_teams = dict(comp.teams)
@@ -298,11 +298,10 @@ class ScheduleGenerator:
 def command(settings: argparse.Namespace) -> None:
     import os.path
 
-    from sr.comp.comp import SRComp
-    from sr.comp.raw_compstate import RawCompstate
+    from sr.comp.cli import comp_loader
 
-    comp = SRComp(os.path.realpath(settings.compstate))
-    raw_comp = RawCompstate(
+    comp = comp_loader.load(os.path.realpath(settings.compstate))
+    raw_comp = comp_loader.load_raw(
         os.path.realpath(settings.compstate),
         local_only=True,
     )
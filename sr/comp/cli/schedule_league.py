@@ -2,6 +2,37 @@ from __future__ import annotations
 
 import argparse
 from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from sr.comp.cli.utils import ignore_interrupts, write_atomically
+
+if TYPE_CHECKING:
+    from sr.comp.types import ArenaName, TLA
+
+# The schedule, as written to league.yaml
+Matches = Dict[int, Dict[str, List[Optional[str]]]]
+
+# Called with the number of the first match which has changed and the matches
+# from there on, as the schedule is built
+Progress = Callable[[int, Matches], None]
+
+# Minimum time between checkpoints, in seconds
+CHECKPOINT_INTERVAL = 30
+
+# Minimum time between rewrites of a streamed output file, in seconds, other
+# than for rounds which take the schedule further than it has been before
+STREAM_INTERVAL = 5
 
 
 def max_possible_match_periods(sched_db):
@@ -19,65 +50,429 @@ def max_possible_match_periods(sched_db):
     return int(total_league_time.total_seconds() // match_period_length)
 
 
-def command(args: argparse.Namespace) -> None:
+def worker_seeds(seed: int, num_workers: int) -> list[int]:
+    """Derive a seed for each of the parallel workers from the given seed."""
     import random
+
+    rng = random.Random(seed)
+    return [rng.randrange(2 ** 32) for _ in range(num_workers)]
+
+
+class Result(NamedTuple):
+    seed: int
+    matches: Matches
+    # How the schedule falls short of what was asked for, if it does
+    relaxations: List[str]
+    timed_out: bool
+    # Statistics of the search, see SearchStats
+    stats: Dict[str, Any]
+    # For schedules found by one of the workers of a parallel run, the number
+    # of that worker and the seed which the workers' seeds were derived from
+    worker: Optional[Tuple[int, int]] = None
+
+
+def checkpoint_options(scheduler_options: dict[str, Any]) -> dict[str, Any]:
+    """
+    The options which must be the same to resume from a checkpoint, in the
+    form they're stored in it.
+    """
+    import json
+
+    options = dict(scheduler_options)
+    # Resuming with a different time limit is fine
+    options.pop('time_limit')
+    return cast(Dict[str, Any], json.loads(json.dumps(options)))
+
+
+def save_checkpoint(
+    path: Path,
+    seed: int,
+    scheduler_options: dict[str, Any],
+    data: dict[str, Any],
+) -> None:
+    import json
+
+    write_atomically(path, json.dumps({
+        'seed': seed,
+        'options': checkpoint_options(scheduler_options),
+        'scheduler': data,
+    }))
+
+
+def load_checkpoint(
+    path: Path,
+    scheduler_options: dict[str, Any],
+) -> tuple[int, dict[str, Any]]:
+    """
+    Load a checkpoint, checking that it's for the given options. Returns the
+    seed of the run and the checkpoint data for the scheduler.
+    """
+    import json
+
+    try:
+        with path.open() as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        exit(f"Checkpoint {path} does not exist.")
+
+    if checkpoint['options'] != checkpoint_options(scheduler_options):
+        exit(
+            f"Checkpoint {path} is from a run with different options or a "
+            "different compstate, so cannot be resumed from.",
+        )
+
+    return checkpoint['seed'], checkpoint['scheduler']
+
+
+def run_scheduler(
+    scheduler_options: dict[str, Any],
+    seed: int,
+    tag: str = '',
+    checkpoint_path: Path | None = None,
+    resume_from: dict[str, Any] | None = None,
+    progress: Progress | None = None,
+) -> Result:
+    import functools
+    import random
+
+    from sr.comp.cli.league_scheduler import Scheduler
+
+    scheduler = Scheduler(random=random.Random(seed), **scheduler_options)
+    scheduler.tag = tag
+    scheduler.lprint(f"Using seed {seed}")
+    if checkpoint_path is not None:
+        scheduler.checkpoint = functools.partial(
+            save_checkpoint,
+            checkpoint_path,
+            seed,
+            scheduler_options,
+        )
+        scheduler.checkpoint_interval = CHECKPOINT_INTERVAL
+    if resume_from is not None:
+        scheduler.resume(resume_from)
+    scheduler.progress = progress
+    matches = scheduler.run()
+    return Result(
+        seed,
+        matches,
+        scheduler.relaxations(),
+        scheduler.timed_out,
+        scheduler.stats.summary(),
+    )
+
+
+def run_worker(
+    scheduler_options: dict[str, Any],
+    seeds: Sequence[int],
+    worker: int,
+) -> tuple[int, Result]:
+    """Run a scheduler in a worker process, using that worker's seed."""
+    return worker, run_scheduler(scheduler_options, seeds[worker], f'[Worker {worker}] ')
+
+
+def memoise_lcg_params(scheduler_options: dict[str, Any]) -> None:
+    """
+    Find and memoise the LCG parameters for schedulers with the given options,
+    as each of them would on starting. This does nothing without anywhere to
+    memoise them.
+    """
+    from sr.comp.cli.league_scheduler import lcg_memo_path, memoised_lcg_params
+
+    if lcg_memo_path() is None:
+        return
+
+    # Schedulers pad the teams out to fill every match period of a round
+    entrants_per_match_period = (
+        len(scheduler_options['arenas']) * scheduler_options['num_corners']
+    )
+    num_entrants = (
+        len(scheduler_options['teams']) * scheduler_options['appearances_per_round']
+    )
+    round_length = -(-num_entrants // entrants_per_match_period)
+    memoised_lcg_params(
+        round_length * entrants_per_match_period,
+        round_length,
+        entrants_per_match_period,
+        scheduler_options['separation'],
+    )
+
+
+def run_parallel(
+    scheduler_options: dict[str, Any],
+    seed: int,
+    num_workers: int,
+) -> Result:
+    """
+    Race schedulers in separate processes, each with a different seed derived
+    from the given one, for the first to find a schedule. The others are
+    stopped once one has done so.
+
+    If the schedulers have a time limit and all of them reach it then the
+    longest of their schedules is used.
+    """
+    import functools
     import sys
     from multiprocessing import Pool
 
+    seeds = worker_seeds(seed, num_workers)
+
+    if scheduler_options['enable_lcg']:
+        # Find the LCG parameters here first so that the workers find them
+        # already memoised, rather than each searching for them
+        memoise_lcg_params(scheduler_options)
+
+    print(f"Using {num_workers} workers, seeded from {seed}", file=sys.stderr)
+    best: tuple[int, Result] | None = None
+    # Leaving the block terminates any workers which are still running
+    with Pool(num_workers, initializer=ignore_interrupts) as pool:
+        results = pool.imap_unordered(
+            functools.partial(run_worker, scheduler_options, seeds),
+            range(num_workers),
+        )
+        try:
+            for worker, result in results:
+                if best is None or len(result.matches) > len(best[1].matches):
+                    best = worker, result
+                if not result.timed_out:
+                    break
+        except KeyboardInterrupt:
+            exit("Interrupted, stopping workers.")
+
+    assert best is not None
+    worker, result = best
+    print(f"Worker {worker} (seed {result.seed}) found a schedule.", file=sys.stderr)
+    return result._replace(worker=(worker, seed))
+
+
+def dump_league(comment: str, matches: Matches) -> str:
+    """Render the contents of a league.yaml, starting with the given comment."""
+    import io
+
     from sr.comp.cli import yaml_round_trip as yaml
-    from sr.comp.cli.league_scheduler import Scheduler
+
+    with io.StringIO() as buffer:
+        for line in comment.splitlines():
+            buffer.write(f"# {line}\n")
+        yaml.dump({'matches': matches}, dest=buffer)
+        return buffer.getvalue()
+
+
+def write_output(result: Result, output: Path | None) -> None:
+    """
+    Write the schedule to the given file, or stdout, noting the seed which
+    produced it and any relaxations of the constraints. Files are replaced
+    atomically, so are never left partially written.
+    """
+    import sys
+
+    comment = f"Generated by 'srcomp schedule-league' with seed {result.seed}"
+    if result.worker is not None:
+        worker, parallel_seed = result.worker
+        comment += (
+            f",\nby worker {worker} of a '--parallel' run seeded from {parallel_seed}"
+        )
+    comment += "."
+    if not result.timed_out:
+        # Schedules cut short by the time limit depend on how fast the search ran
+        comment += f" Run with\n'--seed {result.seed}' and the same options"
+        if result.worker is not None:
+            # Which worker finishes first depends on how fast each of them ran
+            comment += " but without\n'--parallel'"
+        comment += " to regenerate it."
+    for message in result.relaxations:
+        comment += f"\n{message}"
+    content = dump_league(comment, result.matches)
+
+    if output is None:
+        sys.stdout.write(content)
+    else:
+        write_atomically(output, content)
+
+
+class StreamToFile:
+    """
+    Keep a league.yaml up to date with the schedule as it's built, rewriting
+    it atomically so that it's always a valid (if partial) league.
+
+    Rounds can still be replaced until the schedule is complete, if the
+    search backtracks over them.
+    """
+
+    def __init__(self, path: Path, seed: int) -> None:
+        self.path = path
+        self.seed = seed
+        self.matches: Matches = {}
+        self.longest = 0
+        self.next_write = 0.0
+
+    def __call__(self, first_match: int, matches: Matches) -> None:
+        import time
+
+        for match_num in range(first_match, len(self.matches)):
+            del self.matches[match_num]
+        self.matches.update(matches)
+
+        # Rendering large schedules is slow, so while the search is going back
+        # over old ground the file is only rewritten occasionally
+        now = time.monotonic()
+        if len(self.matches) > self.longest or now >= self.next_write:
+            self.longest = max(self.longest, len(self.matches))
+            self.next_write = now + STREAM_INTERVAL
+            write_atomically(self.path, dump_league(
+                f"Partial schedule, still being generated by 'srcomp schedule-league'\n"
+                f"with seed {self.seed}. Later rounds may yet be replaced.",
+                self.matches,
+            ))
+
+
+def stream_json_lines(first_match: int, matches: Matches) -> None:
+    """
+    Write a change to the schedule to stdout, as a line of JSON giving the
+    matches which replace those from ``first_match`` onwards.
+    """
+    import json
+    import sys
+
+    sys.stdout.write(json.dumps({'first_match': first_match, 'matches': matches}) + '\n')
+    sys.stdout.flush()
+
+
+def load_base_matches(
+    compstate: Path,
+    arenas: Sequence[ArenaName],
+    num_corners: int,
+    num_matches: int,
+) -> list[list[TLA | None]]:
+    """
+    Load the matches from the league.yaml which are being kept when
+    rescheduling, as the entrants of each match slot across the arenas.
+    """
+    from sr.comp.cli.import_schedule import loading
+    from sr.comp.types import MatchNumber
+
+    if not num_matches:
+        return []
+
+    league_yaml = loading.league_yaml_path(compstate)
+    try:
+        league = loading.load_league_yaml(league_yaml)
+    except FileNotFoundError:
+        exit(f"Cannot reschedule from match {num_matches} without a {league_yaml}.")
+
+    empty_match: list[TLA | None] = [None] * num_corners
+    base_matches = []
+    for n in range(num_matches):
+        match = league.get(MatchNumber(n))
+        if match is None:
+            exit(
+                f"Cannot reschedule from match {num_matches} as {league_yaml} "
+                f"has no match {n}.",
+            )
+        match_slot: list[TLA | None] = []
+        for arena in arenas:
+            match_slot.extend(match.get(arena, empty_match))
+        base_matches.append(match_slot)
+    return base_matches
+
+
+def command(args: argparse.Namespace) -> None:
+    import json
+    import random
+    import sys
+
+    from sr.comp.cli import yaml_round_trip as yaml
+    from sr.comp.teams import load_teams
+    from sr.comp.types import MatchNumber
 
     with open(args.compstate / 'arenas.yaml') as f:
         arenas_db = yaml.load(f)
-        arenas = arenas_db['arenas'].keys()
+        arenas = list(arenas_db['arenas'].keys())
         num_corners = len(arenas_db['corners'])
 
-    with open(args.compstate / 'teams.yaml') as f:
-        teams = yaml.load(f)['teams'].keys()
+    # Teams which have dropped out by the first match being scheduled can only
+    # appear in the matches being kept
+    first_match = MatchNumber(args.reschedule_from)
+    teams = [
+        team.tla
+        for team in load_teams(args.compstate / 'teams.yaml').values()
+        if team.is_still_around(first_match)
+    ]
 
     with open(args.compstate / 'schedule.yaml') as f:
         sched_db = yaml.load(f)
         max_periods = max_possible_match_periods(sched_db)
 
-    base_matches = []
-    for n in range(args.reschedule_from):
-        match_slot = []
-        for arena in arenas:
-            match_slot.extend(sched_db['matches'][n][arena])
-        base_matches.append(match_slot)
-
-    scheduler = Scheduler(
-        teams=teams,
-        max_match_periods=max_periods,
-        arenas=arenas,
-        num_corners=num_corners,
-        separation=args.spacing,
-        max_matchups=args.max_repeated_matchups,
-        appearances_per_round=args.appearances_per_round,
-        base_matches=base_matches,
-        enable_lcg=args.lcg,
+    base_matches = load_base_matches(
+        args.compstate,
+        arenas,
+        num_corners,
+        args.reschedule_from,
     )
-    if args.parallel > 1:
-        scheduler.lprint(f'Using {args.parallel} threads')
-        pool = Pool(args.parallel)
 
-        def get_output(data):
-            yaml.dump({'matches': data}, dest=sys.stdout)
-            pool.terminate()
+    scheduler_options = {
+        'teams': teams,
+        'max_match_periods': max_periods,
+        'arenas': arenas,
+        'num_corners': num_corners,
+        'separation': args.spacing,
+        'max_matchups': args.max_repeated_matchups,
+        'appearances_per_round': args.appearances_per_round,
+        'base_matches': base_matches,
+        'enable_lcg': args.lcg,
+        'search': args.search,
+        'time_limit': args.time_limit,
+    }
+    seed = args.seed
+    resume_from = None
+    if args.resume:
+        if args.checkpoint is None:
+            exit("--resume needs the --checkpoint to resume from.")
+        seed, resume_from = load_checkpoint(args.checkpoint, scheduler_options)
+        if args.seed is not None and args.seed != seed:
+            exit(f"Checkpoint {args.checkpoint} is from a run with seed {seed}.")
+    elif seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
 
-        for n in range(args.parallel):
-            scheduler.random = random.Random()
-            scheduler.tag = f'[Thread {n}] '
-            pool.apply_async(scheduler.run, callback=get_output)
+    progress: Progress | None = None
+    if args.stream:
+        if args.output is None:
+            progress = stream_json_lines
+        else:
+            progress = StreamToFile(args.output, seed)
 
-        pool.close()
-        pool.join()
+    if args.parallel > 1:
+        if args.checkpoint is not None:
+            exit("Checkpoints are not supported with --parallel.")
+        if args.stream:
+            exit("Streaming is not supported with --parallel.")
+        result = run_parallel(scheduler_options, seed, args.parallel)
     else:
-        output_data = scheduler.run()
-        yaml.dump({'matches': output_data}, dest=sys.stdout)
+        result = run_scheduler(
+            scheduler_options,
+            seed,
+            checkpoint_path=args.checkpoint,
+            resume_from=resume_from,
+            progress=progress,
+        )
+
+    for message in result.relaxations:
+        print(message, file=sys.stderr)
+
+    if args.stream and args.output is None:
+        # The last line gives the whole schedule, which may not be where the
+        # search had got to if it stopped at the time limit
+        stream_json_lines(0, result.matches)
+    else:
+        write_output(result, args.output)
+
+    if args.stats is not None:
+        stats = {'seed': result.seed, **result.stats}
+        write_atomically(args.stats, json.dumps(stats, indent=2) + '\n')
 
 
 def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]) -> None:
+    from sr.comp.cli.league_scheduler import SEARCHES
+
     help_msg = "Generate a schedule for a league."
     parser = subparsers.add_parser(
         'schedule-league',
@@ -116,17 +511,93 @@ def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser
         dest='lcg',
         help="enable LCG permutation",
     )
+    parser.add_argument(
+        '--search',
+        choices=SEARCHES,
+        default='shuffle',
+        help=(
+            "how to search for each round: by shuffling the teams until the "
+            "constraints are met, or by repairing a shuffled round by simulated "
+            "annealing (which is much faster for larger leagues) "
+            "(default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        '--time-limit',
+        type=float,
+        metavar='SECONDS',
+        help=(
+            "stop searching after this long and output the longest schedule "
+            "found so far, which may be incomplete (such schedules can't "
+            "necessarily be regenerated from their seed)"
+        ),
+    )
+    parser.add_argument(
+        '--stats',
+        type=Path,
+        metavar='PATH',
+        help=(
+            "file to write statistics of the search to, as JSON, such as the "
+            "number of rounds rejected for each constraint"
+        ),
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=Path,
+        metavar='PATH',
+        help=(
+            "file to periodically save the progress of the search to, so that "
+            "it can be resumed with --resume"
+        ),
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help=(
+            "resume the search saved in the --checkpoint file, which must have "
+            "been made with the same options"
+        ),
+    )
     parser.add_argument(
         '--parallel',
         type=int,
         default=1,
-        help="number of parallel threads",
+        help="number of worker processes to race against each other",
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help=(
+            "seed for the random number generator (default: random); with "
+            "--parallel, the seeds of the workers are derived from this"
+        ),
     )
     parser.add_argument(
         '-f',
         '--reschedule-from',
         type=int,
         default=0,
-        help="first match to reschedule from",
+        help=(
+            "first match to reschedule from, keeping the matches before it in "
+            "the league.yaml; teams which have dropped out by then are left "
+            "out of the rescheduled matches"
+        ),
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        type=Path,
+        help="file to write the schedule to (default: stdout)",
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help=(
+            "write out each round as soon as it is found, rather than only the "
+            "finished schedule: the --output file is rewritten as a partial "
+            "league.yaml, otherwise each change is written to stdout as a line "
+            "of JSON giving the matches which replace those from 'first_match' "
+            "onwards; rounds may be replaced if the search backtracks"
+        ),
     )
     parser.set_defaults(func=command)
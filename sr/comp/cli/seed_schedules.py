@@ -0,0 +1,85 @@
+"""
+Summarise a directory of seed schedules, in the format which import-schedule
+reads.
+
+For each schedule this shows the number of ids and matches, the numbers of ids
+in its matches, the range of the number of matches each id appears in and the
+fewest matches between any two appearances of an id. The summaries are kept
+in an index in the srcomp cache directory, so that files are only read again
+once they've changed.
+
+Given a compstate, only the schedules which could be imported into it are
+shown, best fitting first. This is the order in which import-schedule picks
+from them when given the directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+
+def format_range(values: list[int]) -> str:
+    low, high = min(values, default=0), max(values, default=0)
+    return str(low) if low == high else f"{low}-{high}"
+
+
+def command(args: argparse.Namespace) -> None:
+    from tabulate import tabulate
+
+    from sr.comp.cli.import_schedule import loading, seeds
+    from sr.comp.cli.import_schedule.types import Configuration
+    from sr.comp.types import MatchNumber
+
+    library = seeds.load_library(args.directory)
+
+    if args.compstate is not None:
+        team_ids, arena_ids, teams_per_game = loading.load_teams_areans(
+            args.compstate,
+            MatchNumber(0),
+        )
+        config = Configuration(arena_ids, team_ids, teams_per_game, MatchNumber(0))
+        library = seeds.rank_seeds(library, config, args.ignore_ids or ())
+
+    print(tabulate(
+        [
+            [
+                x.path.name,
+                x.num_ids,
+                x.num_matches,
+                ", ".join(map(str, x.match_sizes)),
+                format_range(list(x.appearances.values())),
+                '' if x.min_spacing is None else x.min_spacing,
+            ]
+            for x in library
+        ],
+        headers=["Schedule", "Ids", "Matches", "Ids per match", "Appearances", "Spacing"],
+        tablefmt='github',
+    ))
+
+
+def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]) -> None:
+    from sr.comp.cli.import_schedule import loading
+
+    parser = subparsers.add_parser(
+        'seed-schedules',
+        help="Summarise a directory of seed schedules.",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('directory', type=Path, help="directory of seed schedules")
+    parser.add_argument(
+        '--compstate',
+        type=Path,
+        help="only show the schedules which fit this compstate, best fitting first",
+    )
+    parser.add_argument(
+        '-i',
+        '--ignore-ids',
+        type=loading.parse_ids,
+        help=(
+            "Comma separated list of ids (as present in the schedule files) which "
+            "will be ignored when importing."
+        ),
+    )
+    parser.set_defaults(func=command)
@@ -0,0 +1,236 @@
+"""
+Serve a loaded compstate to other commands, reloading it when it changes.
+
+Loading a compstate means parsing all of its files, including the score sheet
+for every match which has been played. While this command is running, commands
+which only display information about the compstate (such as ``show-schedule``
+or ``show-league-table``) will ask it for their output rather than loading the
+compstate themselves.
+
+The compstate is watched for changes, both to its files and to its current git
+revision, and is reloaded as needed so that the output of commands is the same
+as if they had been run directly. If the compstate cannot be loaded then
+commands fall back to loading it themselves, so that any errors are reported
+as usual.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sr.comp.comp import SRComp
+
+CLIENT_TIMEOUT_SECONDS = 30
+
+# How long the server waits for a client to finish sending its request. Each
+# connection is handled on its own thread, so a slow client only holds up its
+# own request, but this stops idle connections from piling up.
+REQUEST_TIMEOUT_SECONDS = 5
+
+
+def socket_path(compstate: str | Path) -> Path:
+    """The path of the socket used to serve the given compstate."""
+    import hashlib
+    import tempfile
+
+    root = Path(compstate).resolve()
+    digest = hashlib.sha1(str(root).encode('utf-8')).hexdigest()[:16]
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return Path(runtime_dir) / f'srcomp-{os.getuid()}' / f'{digest}.sock'
+
+
+class CompstateServer:
+    """Holds a loaded compstate and runs commands against it."""
+
+    def __init__(self, root: Path) -> None:
+        from sr.comp.cli import comp_loader
+
+        self.root = root
+        self.lock = threading.Lock()
+        self.compstate = comp_loader.WatchedCompstate(root)
+
+    def refresh(self) -> SRComp | None:
+        """
+        Reload the compstate if it has changed since it was last loaded.
+
+        The caller must hold ``lock``. Returns the loaded compstate, or
+        ``None`` if it could not be loaded.
+        """
+        try:
+            if self.compstate.refresh():
+                assert self.compstate.comp is not None
+                print(f"Loaded compstate at {self.compstate.comp.state}.", file=sys.stderr)
+        except Exception as e:
+            print(f"Failed to load compstate ({e}).", file=sys.stderr)
+
+        return self.compstate.comp
+
+    def watch(self, interval: float) -> None:
+        import time
+
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                self.refresh()
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        import shlex
+
+        from sr.comp.cli import comp_loader
+        from sr.comp.cli.command_line import (
+            COMMANDS,
+            find_command_name,
+            run_captured,
+        )
+
+        args: list[str] = request['args']
+        command = COMMANDS.get(find_command_name(args) or '')
+        if command is None or not command.servable:
+            return {'status': 'unavailable'}
+
+        with self.lock:
+            comp = self.refresh()
+            if comp is None:
+                return {'status': 'unavailable'}
+
+            cwd = os.getcwd()
+            try:
+                # Relative paths in the arguments are relative to the client
+                os.chdir(request['cwd'])
+                with comp_loader.preloaded(comp):
+                    exit_code, stdout, stderr = run_captured(args)
+            finally:
+                os.chdir(cwd)
+
+        print(f"Ran 'srcomp {shlex.join(args)}' (exit code {exit_code}).", file=sys.stderr)
+        return {
+            'status': 'ok',
+            'exit_code': exit_code,
+            'stdout': stdout,
+            'stderr': stderr,
+        }
+
+
+def _send(path: Path, request: dict[str, Any]) -> dict[str, Any]:
+    import json
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CLIENT_TIMEOUT_SECONDS)
+        sock.connect(str(path))
+        sock.sendall(json.dumps(request).encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as f:
+            response: dict[str, Any] = json.loads(f.read())
+            return response
+
+
+def run_remote(compstate: str | Path, args: list[str]) -> bool:
+    """
+    Run the given command via the server for the compstate, if there is one.
+
+    Returns whether or not the command was run. If it was then its output will
+    have been written to stdout and stderr as appropriate and a non-zero exit
+    status will have been raised as ``SystemExit``.
+    """
+    path = socket_path(compstate)
+    try:
+        if path.parent.stat().st_uid != os.getuid():
+            return False
+        response = _send(path, {'args': args, 'cwd': os.getcwd()})
+    except (OSError, ValueError):
+        return False
+
+    if response.get('status') != 'ok':
+        return False
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+
+    exit_code = response['exit_code']
+    if exit_code:
+        exit(exit_code)
+
+    return True
+
+
+def command(args: argparse.Namespace) -> None:
+    import signal
+    import socketserver
+
+    root = Path(args.compstate).resolve()
+    path = socket_path(root)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    if path.exists():
+        try:
+            _send(path, {'args': [], 'cwd': os.getcwd()})
+        except (OSError, ValueError):
+            # Left over from a server which didn't shut down cleanly
+            path.unlink()
+        else:
+            exit(f"Compstate {root} is already being served (at {path}).")
+
+    server = CompstateServer(root)
+    with server.lock:
+        server.refresh()
+
+    class Handler(socketserver.StreamRequestHandler):
+        timeout = REQUEST_TIMEOUT_SECONDS
+
+        def handle(self) -> None:
+            import json
+
+            try:
+                request = json.loads(self.rfile.read())
+            except (OSError, ValueError):
+                # Timed out or garbled; the client will fall back to running
+                # the command itself
+                return
+
+            response = server.handle(request)
+            self.wfile.write(json.dumps(response).encode('utf-8'))
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        # Commands are run one at a time, under ``server.lock``, but reading
+        # requests happens in parallel so that one client can't block others
+        daemon_threads = True
+
+    # Ensure we tidy up the socket when asked to stop
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    with Server(str(path), Handler) as socket_server:
+        watcher = threading.Thread(target=server.watch, args=(args.interval,), daemon=True)
+        watcher.start()
+
+        print(f"Serving {root} on {path}.", file=sys.stderr)
+        try:
+            socket_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def add_subparser(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]) -> None:
+    help_msg, *_ = __doc__.strip().splitlines()
+    parser = subparsers.add_parser(
+        'serve',
+        help=help_msg,
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('compstate', help="competition state repository")
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=1,
+        help="how often to check the compstate for changes, in seconds (default: %(default)s)",
+    )
+    parser.set_defaults(func=command)
@@ -37,9 +37,9 @@ def command(args: argparse.Namespace) -> None:
 
     from tabulate import tabulate
 
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
 
-    comp = SRComp(os.path.realpath(args.compstate))
+    comp = comp_loader.load(os.path.realpath(args.compstate))
 
     tie_count = Counter(comp.scores.league.positions.values())
     tied_positions = set(x for x, y in tie_count.items() if y > 1)
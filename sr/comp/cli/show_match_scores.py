@@ -151,7 +151,9 @@ def command(settings):
 
     from tabulate import tabulate
 
-    comp = SRComp(os.path.realpath(settings.compstate))
+    from sr.comp.cli import comp_loader
+
+    comp = comp_loader.load(os.path.realpath(settings.compstate))
 
     match_results: List[MatchResult] = []
 
@@ -23,9 +23,9 @@ def command(settings: argparse.Namespace) -> None:
     import os.path
     from datetime import datetime, timedelta
 
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
 
-    comp = SRComp(os.path.realpath(settings.compstate))
+    comp = comp_loader.load(os.path.realpath(settings.compstate))
 
     num_teams_per_arena = getattr(comp, 'num_teams_per_arena', len(comp.corners))
 
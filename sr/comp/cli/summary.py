@@ -15,9 +15,9 @@ def counter_to_string(cntr):
 def command(args: argparse.Namespace) -> None:
     from collections import Counter
 
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
 
-    comp = SRComp(args.compstate)
+    comp = comp_loader.load(args.compstate)
 
     print("Number of arenas: {} ({})".format(
         len(comp.arenas),
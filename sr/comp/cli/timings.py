@@ -0,0 +1,178 @@
+"""
+Recording of how long the phases of running a command take.
+
+Code marks out a phase using ``phase``, which records nothing unless a
+``Recorder`` is active. Phases may be nested; the time spent in a phase is
+reported both in total and excluding any phases nested within it.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, NamedTuple, TextIO
+
+
+class PhaseEvent(NamedTuple):
+    name: str
+    start: float
+    duration: float
+    depth: int
+
+
+class PhaseSummary(NamedTuple):
+    name: str
+    calls: int
+    total: float
+    self_time: float
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.events: list[PhaseEvent] = []
+        # Entries are the name, start time and time spent in nested phases
+        self._stack: list[tuple[str, float, float]] = []
+        self._self_times: dict[str, float] = {}
+
+    def push(self, name: str) -> None:
+        self._stack.append((name, time.perf_counter(), 0))
+
+    def pop(self) -> None:
+        name, start, nested = self._stack.pop()
+        duration = time.perf_counter() - start
+
+        self.events.append(PhaseEvent(name, start, duration, len(self._stack)))
+        self._self_times[name] = self._self_times.get(name, 0) + duration - nested
+
+        if self._stack:
+            parent_name, parent_start, parent_nested = self._stack[-1]
+            self._stack[-1] = (parent_name, parent_start, parent_nested + duration)
+
+    def summary(self) -> list[PhaseSummary]:
+        """Summarise the phases by name, in the order they were first entered."""
+        calls: dict[str, int] = {}
+        totals: dict[str, float] = {}
+        for event in sorted(self.events, key=lambda x: x.start):
+            calls[event.name] = calls.get(event.name, 0) + 1
+            totals[event.name] = totals.get(event.name, 0) + event.duration
+
+        return [
+            PhaseSummary(name, calls[name], totals[name], self._self_times[name])
+            for name in calls
+        ]
+
+    def print_summary(self, stream: TextIO) -> None:
+        from tabulate import tabulate
+
+        wall_time = time.perf_counter() - self.start
+
+        rows = [
+            [x.name, x.calls, x.total * 1000, x.self_time * 1000]
+            for x in self.summary()
+        ]
+        rows.append(["(wall time)", None, wall_time * 1000, None])
+
+        print(
+            tabulate(
+                rows,
+                headers=["Phase", "Calls", "Total (ms)", "Self (ms)"],
+                floatfmt='.1f',
+            ),
+            file=stream,
+        )
+
+    def write_trace(self, path: Path) -> None:
+        """
+        Write the recorded phases in the Trace Event Format, as understood by
+        Chrome's ``about:tracing`` and by Perfetto.
+        """
+        import json
+        import os
+
+        pid = os.getpid()
+        trace: dict[str, Any] = {
+            'displayTimeUnit': 'ms',
+            'traceEvents': [
+                {
+                    'name': event.name,
+                    'ph': 'X',
+                    'ts': (event.start - self.start) * 1_000_000,
+                    'dur': event.duration * 1_000_000,
+                    'pid': pid,
+                    'tid': 0,
+                }
+                for event in self.events
+            ],
+        }
+
+        with path.open(mode='w') as f:
+            json.dump(trace, f, indent=1)
+
+
+_active: Recorder | None = None
+
+
+@contextmanager
+def recording() -> Iterator[Recorder]:
+    """Record the phases entered within this context."""
+    global _active
+    previous = _active
+    _active = recorder = Recorder()
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Mark out a phase of work, for recording if a ``Recorder`` is active."""
+    recorder = _active
+    if recorder is None:
+        yield
+        return
+
+    recorder.push(name)
+    try:
+        yield
+    finally:
+        recorder.pop()
+
+
+@contextmanager
+def profiled(path: Path | None) -> Iterator[None]:
+    """Profile the code within this context, if given a path to write to."""
+    if path is None:
+        yield
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+class TimedStream:
+    """Wraps an output stream such that writing to it is recorded as a phase."""
+
+    def __init__(self, stream: TextIO, name: str = 'output') -> None:
+        self._stream = stream
+        self._name = name
+
+    def write(self, text: str) -> int:
+        with phase(self._name):
+            return self._stream.write(text)
+
+    def flush(self) -> None:
+        with phase(self._name):
+            self._stream.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
@@ -0,0 +1,37 @@
+"""Helpers shared between commands."""
+
+from __future__ import annotations
+
+import os
+import signal
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, IO, Iterator
+
+
+def ignore_interrupts() -> None:
+    """Leave the handling of interrupts to the parent process, which stops the workers."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+@contextmanager
+def atomic_file(path: Path, mode: str = 'w') -> Iterator[IO[Any]]:
+    """
+    Open a temporary file to write in place of the given one, which replaces it
+    once the block completes, so that it's never left partially written.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def write_atomically(path: Path, content: str) -> None:
+    """Write a file via a temporary file, so that it's never left partially written."""
+    with atomic_file(path) as f:
+        f.write(content)
@@ -4,10 +4,10 @@ import argparse
 
 
 def command(settings: argparse.Namespace) -> None:
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
     from sr.comp.validation import validate
 
-    comp = SRComp(settings.compstate)
+    comp = comp_loader.load(settings.compstate)
 
     if settings.lax:
         error_count = 0
@@ -24,12 +24,12 @@ def _start_time(slot: MatchSlot) -> datetime.datetime:
 
 
 def command(settings: argparse.Namespace) -> None:
-    from sr.comp.comp import SRComp
+    from sr.comp.cli import comp_loader
 
     offset = datetime.timedelta(seconds=settings.offset_seconds)
     match_number: int = settings.match_number
 
-    comp = SRComp(settings.compstate)
+    comp = comp_loader.load(settings.compstate)
 
     slots = comp.schedule.matches[match_number:]
 
@@ -0,0 +1,373 @@
+"""
+Generation of synthetic compstates, for testing how commands scale.
+
+The generated compstate is valid and loadable: each team plays once per league
+round (in a random order), matches are scored in order up to the requested
+fraction of the competition and the knockouts are scheduled from the resulting
+league positions. The compstate is committed to a new git repository.
+
+Run as ``python -m tests.compstate_factory <path>`` to generate one from the
+command line.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import random
+import subprocess
+from pathlib import Path
+from typing import Any, Sequence
+
+from dateutil.tz import UTC
+
+from sr.comp.cli import yaml_round_trip as yaml
+from sr.comp.match_period import Match
+from sr.comp.types import TLA
+
+from .factories import build_match
+
+START_TIME = datetime.datetime(2030, 4, 13, 10, 0, tzinfo=UTC)
+SLOT_SECONDS = 300
+MAX_SCORE = 20
+
+# Only used by the scorer, which simply reports the score given for each team
+SCORER = '''\
+class Scorer:
+    def __init__(self, teams_data, arena_data):
+        self._teams_data = teams_data
+
+    def calculate_scores(self):
+        return {tla: info['score'] for tla, info in self._teams_data.items()}
+'''
+
+
+def build_tlas(num_teams: int) -> list[TLA]:
+    width = max(3, len(str(num_teams - 1)))
+    return [TLA(f'T{n:0{width}d}') for n in range(num_teams)]
+
+
+def build_league_matches(
+    tlas: Sequence[TLA],
+    arenas: Sequence[str],
+    corners: int,
+    rounds: int,
+    rng: random.Random,
+) -> list[list[Match]]:
+    """
+    Build the league, as a list of match slots each holding a match per arena.
+
+    Each round contains every team once, in a random order. Where the teams
+    don't fill the round's matches exactly the empty places are spread across
+    the matches, as a real schedule would.
+    """
+    slot_size = len(arenas) * corners
+    slots_per_round = -(-len(tlas) // slot_size)
+    matches_per_round = slots_per_round * len(arenas)
+    slots: list[list[Match]] = []
+
+    for _ in range(rounds):
+        teams = list(tlas)
+        rng.shuffle(teams)
+
+        # Deal the teams out to the matches
+        match_teams: list[list[TLA | None]] = [
+            [*teams[idx::matches_per_round]]
+            for idx in range(matches_per_round)
+        ]
+        for match in match_teams:
+            match += [None] * (corners - len(match))
+
+        for slot_idx in range(slots_per_round):
+            num = len(slots)
+            slots.append([
+                build_match(
+                    num=num,
+                    arena=arena,
+                    teams=match_teams[slot_idx * len(arenas) + arena_idx],
+                )
+                for arena_idx, arena in enumerate(arenas)
+            ])
+
+    return slots
+
+
+def build_score(match: Match, rng: random.Random) -> dict[str, Any]:
+    return {
+        'arena_id': match.arena,
+        'match_number': match.num,
+        'teams': {
+            tla: {'zone': zone, 'score': rng.randint(0, MAX_SCORE)}
+            for zone, tla in enumerate(match.teams)
+            if tla is not None
+        },
+    }
+
+
+def write_yaml(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    yaml.dump(data, path)
+
+
+def write_score(root: Path, match: Match, rng: random.Random) -> None:
+    path = root / match.type.value / match.arena / f'{match.num:03d}.yaml'
+    write_yaml(path, build_score(match, rng))
+
+
+def build_knockout_config(
+    arenas: Sequence[str],
+    corners: int,
+    knockout_size: int,
+    start_time: datetime.datetime,
+) -> dict[str, Any]:
+    """
+    Build the knockout configuration for ``schedule.yaml``.
+
+    The automatic knockout scheduler only supports four teams per match, so
+    for other numbers of corners the knockout is instead a single static
+    final between the top seeds.
+    """
+    if corners == 4:
+        return {
+            'knockout': {
+                'scheduler': 'automatic',
+                'arity': knockout_size,
+                'round_spacing': {
+                    'default': {
+                        'delay_flex': 0,
+                        'minimum': SLOT_SECONDS,
+                        'nominal': SLOT_SECONDS,
+                    },
+                },
+                'single_arena': {'rounds': 1, 'arenas': [arenas[0]]},
+            },
+        }
+
+    return {
+        'knockout': {'scheduler': 'static'},
+        'static_knockout': {
+            'rounds': {
+                0: {
+                    'matches': {
+                        0: {
+                            'arena': arenas[0],
+                            'start_time': start_time,
+                            'teams': [f'S{n + 1}' for n in range(corners)],
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+
+def build_schedule(
+    arenas: Sequence[str],
+    corners: int,
+    knockout_size: int,
+    num_league_slots: int,
+) -> dict[str, Any]:
+    slot = datetime.timedelta(seconds=SLOT_SECONDS)
+    league_end = START_TIME + slot * (num_league_slots + 1)
+    knockout_start = league_end + datetime.timedelta(hours=1)
+    # Generous, as each knockout round may need several slots
+    knockout_end = knockout_start + slot * (knockout_size + 10)
+
+    return {
+        'match_slot_lengths': {
+            'pre': 60,
+            'match': 150,
+            'post': 90,
+            'total': SLOT_SECONDS,
+        },
+        'staging': {
+            'opens': 300,
+            'closes': 120,
+            'duration': 180,
+            'signal_shepherds': {'Blue': 241},
+            'signal_teams': 240,
+        },
+        'timezone': 'Europe/London',
+        'delays': [],
+        'match_periods': {
+            'league': [{
+                'start_time': START_TIME,
+                'end_time': league_end,
+                'description': "League",
+            }],
+            'knockout': [{
+                'start_time': knockout_start,
+                'end_time': knockout_end,
+                'description': "Knockouts",
+            }],
+        },
+        'league': {'extra_spacing': []},
+        **build_knockout_config(arenas, corners, knockout_size, knockout_start),
+    }
+
+
+def git(root: Path, *args: str) -> None:
+    subprocess.check_call(
+        [
+            'git',
+            '-c',
+            'user.name=Compstate Factory',
+            '-c',
+            'user.email=compstate-factory@example.com',
+            *args,
+        ],
+        cwd=root,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def build_compstate(
+    root: Path,
+    *,
+    num_teams: int = 24,
+    num_arenas: int = 2,
+    corners: int = 4,
+    rounds: int = 6,
+    knockout_size: int = 16,
+    scored: float = 1.0,
+    seed: int = 0,
+) -> None:
+    """
+    Write a compstate to the given (new or empty) directory.
+
+    ``scored`` is the fraction of all the matches, including those in the
+    knockouts, which have been scored. The result is entirely determined by
+    the arguments.
+    """
+    if not 0 <= scored <= 1:
+        raise ValueError(f"Fraction of matches scored must be in [0, 1], not {scored}")
+    if not 1 <= num_arenas <= 26:
+        raise ValueError(f"Number of arenas must be in [1, 26], not {num_arenas}")
+    num_knockout_teams = knockout_size if corners == 4 else corners
+    if num_knockout_teams > num_teams:
+        raise ValueError(
+            f"Cannot have {num_knockout_teams} teams in the knockouts with only "
+            f"{num_teams} teams",
+        )
+
+    rng = random.Random(seed)
+    tlas = build_tlas(num_teams)
+    arenas = [chr(ord('A') + n) for n in range(num_arenas)]
+
+    root.mkdir(parents=True, exist_ok=True)
+
+    write_yaml(root / 'teams.yaml', {
+        'teams': {
+            tla: {'name': f"Team {tla}", 'rookie': idx % 3 == 0}
+            for idx, tla in enumerate(tlas)
+        },
+    })
+    write_yaml(root / 'arenas.yaml', {
+        'arenas': {
+            arena: {'display_name': f"Arena {arena}", 'colour': '#ff0000'}
+            for arena in arenas
+        },
+        'corners': {
+            corner: {'colour': '#00ff00'}
+            for corner in range(corners)
+        },
+    })
+    write_yaml(root / 'layout.yaml', {
+        'teams': [{'name': 'pits', 'display_name': "Pits", 'teams': tlas}],
+    })
+    write_yaml(root / 'shepherding.yaml', {
+        'shepherds': [{'name': 'Blue', 'colour': '#0000ff', 'regions': ['pits']}],
+    })
+    write_yaml(root / 'deployments.yaml', {'deployments': []})
+    (root / 'scoring').mkdir(exist_ok=True)
+    (root / 'scoring' / 'score.py').write_text(SCORER)
+
+    league = build_league_matches(tlas, arenas, corners, rounds, rng)
+    write_yaml(root / 'league.yaml', {
+        'matches': {
+            slot[0].num: {match.arena: match.teams for match in slot}
+            for slot in league
+        },
+    })
+    write_yaml(
+        root / 'schedule.yaml',
+        build_schedule(arenas, corners, knockout_size, len(league)),
+    )
+
+    league_games = [match for slot in league for match in slot]
+    num_league_scored = round(len(league_games) * scored)
+    for match in league_games[:num_league_scored]:
+        write_score(root, match, rng)
+
+    git(root, 'init', '--quiet')
+    git(root, 'add', '.')
+    git(root, 'commit', '--quiet', '--message', "Generate compstate")
+
+    if num_league_scored == len(league_games):
+        score_knockouts(root, len(league_games), scored, rng)
+
+
+def score_knockouts(
+    root: Path,
+    num_league_games: int,
+    scored: float,
+    rng: random.Random,
+) -> None:
+    """
+    Score the requested fraction of the knockouts, a round at a time as the
+    teams in each round depend on the scores of the previous one.
+    """
+    from sr.comp.comp import SRComp
+
+    comp = SRComp(root)
+    rounds = comp.schedule.knockout_rounds
+    num_games = num_league_games + sum(len(x) for x in rounds)
+    num_to_score = round(num_games * scored) - num_league_games
+
+    for round_num in range(len(rounds)):
+        if num_to_score <= 0:
+            break
+
+        for match in comp.schedule.knockout_rounds[round_num][:num_to_score]:
+            write_score(root, match, rng)
+            num_to_score -= 1
+
+        git(root, 'add', '.')
+        git(root, 'commit', '--quiet', '--message', f"Score knockout round {round_num}")
+        comp = SRComp(root)
+
+
+def argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='python -m tests.compstate_factory',
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('root', type=Path, help="directory to create the compstate in")
+    parser.add_argument('--teams', dest='num_teams', type=int, default=24)
+    parser.add_argument('--arenas', dest='num_arenas', type=int, default=2)
+    parser.add_argument('--corners', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=6, help="number of league rounds")
+    parser.add_argument(
+        '--knockout-size',
+        type=int,
+        default=16,
+        help="number of teams in the knockouts (only used with four corners)",
+    )
+    parser.add_argument(
+        '--scored',
+        type=float,
+        default=1.0,
+        help="fraction of the matches which have been scored",
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def main() -> None:
+    settings = argument_parser().parse_args()
+    build_compstate(**vars(settings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from .compstate_factory import build_compstate
+
+
+class BatchTests(unittest.TestCase):
+    maxDiff = None
+
+    # Not knocked-out-teams, as its output order isn't stable between processes
+    COMMANDS = ['summary', 'show-league-table', 'awards', 'top-match-points']
+
+    compstate: Path
+    env: dict[str, str]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        tempdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tempdir.cleanup)
+        cls.compstate = Path(tempdir.name) / 'compstate'
+        build_compstate(cls.compstate, num_teams=16, rounds=2, knockout_size=8)
+
+        cls.env = dict(
+            os.environ,
+            SRCOMP_CACHE_DIR='',
+            XDG_RUNTIME_DIR=tempdir.name,
+        )
+
+    def run_srcomp(
+        self,
+        *args: str,
+        stdin: str | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            ['srcomp', *args],
+            input=stdin,
+            capture_output=True,
+            text=True,
+            env=self.env,
+        )
+
+    def test_matches_individual_commands(self) -> None:
+        result = self.run_srcomp(
+            'batch',
+            str(self.compstate),
+            stdin="\n".join(self.COMMANDS),
+        )
+        self.assertEqual(0, result.returncode, result.stderr)
+
+        expected = ''
+        for command in self.COMMANDS:
+            individual = self.run_srcomp(command, str(self.compstate))
+            self.assertEqual(0, individual.returncode, individual.stderr)
+            expected += f"==> {command} <==\n" + individual.stdout
+
+        self.assertEqual(expected, result.stdout)
+
+    def test_json_output(self) -> None:
+        script = self.compstate.parent / 'script.txt'
+        script.write_text(
+            "# End of day report\n"
+            "summary\n"
+            "\n"
+            "show-league-table --sort 'team'\n"
+            "validate --spam\n"
+            "show-schedule 'spam\n"
+            "summary\n",
+        )
+
+        result = self.run_srcomp('batch', str(self.compstate), str(script), '--json')
+        self.assertEqual(1, result.returncode, result.stderr)
+        self.assertEqual("2 command(s) failed.\n", result.stderr)
+
+        outputs = [json.loads(x) for x in result.stdout.splitlines()]
+
+        self.assertEqual(
+            [
+                (['summary'], 0),
+                (['show-league-table', '--sort', 'team'], 0),
+                (['validate', '--spam'], 2),
+                (None, 2),
+                (['summary'], 0),
+            ],
+            [(x['command'], x['exit_code']) for x in outputs],
+        )
+        self.assertIn("Number of teams: 16", outputs[0]['stdout'])
+        self.assertEqual("show-league-table --sort team", outputs[1]['line'])
+        self.assertIn("unrecognized arguments: --spam", outputs[2]['stderr'])
+        self.assertEqual("show-schedule 'spam", outputs[3]['line'])
+        self.assertIn("No closing quotation", outputs[3]['stderr'])
+
+    def test_unparseable_line(self) -> None:
+        result = self.run_srcomp(
+            'batch',
+            str(self.compstate),
+            stdin="summary 'spam\nsummary\n",
+        )
+
+        self.assertEqual(1, result.returncode, result.stderr)
+        self.assertEqual(
+            "Cannot parse \"summary 'spam\": No closing quotation.\n"
+            "\"summary 'spam\" failed with exit status 2.\n"
+            "1 command(s) failed.\n",
+            result.stderr,
+        )
+        self.assertIn("==> summary <==\n", result.stdout)
+        self.assertIn("Number of teams: 16", result.stdout)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import textwrap
+import unittest
+
+from sr.comp.cli.command_line import (
+    argument_parser,
+    COMMANDS,
+    find_command_name,
+)
+
+
+class CommandLineTests(unittest.TestCase):
+    maxDiff = None
+
+    def test_registry_matches_commands(self) -> None:
+        parser = argument_parser()
+        subparsers_action, = parser._subparsers._group_actions  # type: ignore[union-attr]
+        assert isinstance(subparsers_action, argparse._SubParsersAction)
+
+        helps = {
+            action.dest: action.help
+            for action in subparsers_action._choices_actions
+        }
+        helps.pop('list-commands')
+
+        self.assertEqual(
+            {name: command.help_text for name, command in COMMANDS.items()},
+            helps,
+            "Command registry out of sync with the commands' own help",
+        )
+
+    def test_list_commands_imports_no_commands(self) -> None:
+        code = textwrap.dedent('''
+            import sys
+            from sr.comp.cli.command_line import COMMANDS, main
+            main(['list-commands'])
+            loaded = [x.module for x in COMMANDS.values() if x.module in sys.modules]
+            print(loaded)
+        ''')
+        output = subprocess.check_output([sys.executable, '-c', code], text=True)
+        *_, loaded = output.splitlines()
+
+        self.assertEqual('[]', loaded, "Should not have imported any command modules")
+
+    def test_help_imports_no_commands(self) -> None:
+        code = textwrap.dedent('''
+            import sys
+            from sr.comp.cli.command_line import COMMANDS, main
+            try:
+                main(['--help'])
+            except SystemExit:
+                pass
+            loaded = [x.module for x in COMMANDS.values() if x.module in sys.modules]
+            print(loaded)
+        ''')
+        output = subprocess.check_output([sys.executable, '-c', code], text=True)
+        *_, loaded = output.splitlines()
+
+        self.assertEqual('[]', loaded, "Should not have imported any command modules")
+
+    def test_find_command_name(self) -> None:
+        for args, expected in [
+            ([], None),
+            (['--help'], None),
+            (['summary', 'compstate'], 'summary'),
+            (['--timings', 'summary', 'compstate'], 'summary'),
+            (['--profile', 'out.pstats', 'summary', 'compstate'], 'summary'),
+            (['--profile=out.pstats', 'summary', 'compstate'], 'summary'),
+            (['--timings-trace', 'trace.json', '--timings', 'awards', '.'], 'awards'),
+        ]:
+            with self.subTest(args):
+                self.assertEqual(expected, find_command_name(args))
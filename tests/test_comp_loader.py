@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from sr.comp.cli.comp_loader import (
+    _read_snapshot,
+    _write_snapshot,
+    cache_dir,
+    cache_root,
+    evict_snapshots,
+    load,
+    load_cached,
+    preloaded,
+    snapshot_key,
+    WatchedCompstate,
+)
+from sr.comp.comp import SRComp
+from sr.comp.types import TLA
+
+from .compstate_factory import build_compstate, git
+
+
+class CacheDirTests(unittest.TestCase):
+    def test_configured(self) -> None:
+        with mock.patch.dict(os.environ, {'SRCOMP_CACHE_DIR': '/spam'}):
+            self.assertEqual(Path('/spam'), cache_dir())
+
+    def test_disabled(self) -> None:
+        with mock.patch.dict(os.environ, {'SRCOMP_CACHE_DIR': ''}):
+            self.assertIsNone(cache_dir())
+
+    def test_xdg(self) -> None:
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': '/cache'}):
+            os.environ.pop('SRCOMP_CACHE_DIR', None)
+            self.assertEqual(Path('/cache/srcomp/snapshots'), cache_dir())
+            self.assertEqual(Path('/cache/srcomp'), cache_root())
+
+    def test_root_ignores_snapshots_configuration(self) -> None:
+        with mock.patch.dict(
+            os.environ,
+            {'XDG_CACHE_HOME': '/cache', 'SRCOMP_CACHE_DIR': ''},
+        ):
+            self.assertEqual(Path('/cache/srcomp'), cache_root())
+
+
+class EvictSnapshotsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.directory = Path(tempdir.name)
+
+    def create(self, name: str, size: int, mtime: int) -> Path:
+        path = self.directory / name
+        path.write_bytes(b'x' * size)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_within_limit(self) -> None:
+        self.create('a.pickle', 10, 1)
+        self.create('b.pickle', 10, 2)
+
+        evict_snapshots(self.directory, max_bytes=20)
+
+        self.assertEqual(
+            ['a.pickle', 'b.pickle'],
+            sorted(x.name for x in self.directory.iterdir()),
+        )
+
+    def test_removes_least_recently_used(self) -> None:
+        self.create('old.pickle', 10, 1)
+        self.create('new.pickle', 10, 3)
+        self.create('mid.pickle', 10, 2)
+        self.create('other.txt', 100, 0)
+
+        evict_snapshots(self.directory, max_bytes=25)
+
+        self.assertEqual(
+            ['mid.pickle', 'new.pickle', 'other.txt'],
+            sorted(x.name for x in self.directory.iterdir()),
+            "Should have removed only the oldest snapshot",
+        )
+
+
+class WatchedCompstateTests(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.root = Path(tempdir.name) / 'compstate'
+        build_compstate(self.root, num_teams=8, rounds=1, knockout_size=4)
+
+        patcher = mock.patch.dict(os.environ, {'SRCOMP_CACHE_DIR': ''})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_while_unchanged(self) -> None:
+        compstate = WatchedCompstate(self.root)
+        first = compstate.load()
+
+        self.assertIs(first, compstate.load())
+        self.assertFalse(compstate.refresh())
+
+    def test_reloads_on_change(self) -> None:
+        compstate = WatchedCompstate(self.root)
+        first = compstate.load()
+
+        teams_yaml = self.root / 'teams.yaml'
+        teams_yaml.write_text(teams_yaml.read_text().replace("Team T000", "Spam"))
+
+        second = compstate.load()
+        self.assertIsNot(first, second)
+        self.assertEqual("Spam", second.teams[TLA('T000')].name)
+
+    def test_load_error(self) -> None:
+        (self.root / 'teams.yaml').write_text('teams: [')
+        compstate = WatchedCompstate(self.root)
+
+        with self.assertRaisesRegex(Exception, 'teams'):
+            compstate.refresh()
+
+        self.assertIsNone(compstate.comp)
+
+        # Remembers the error until the compstate changes
+        with self.assertRaisesRegex(Exception, 'teams'):
+            compstate.load()
+
+    def test_preloaded(self) -> None:
+        compstate = WatchedCompstate(self.root)
+
+        with preloaded(compstate):
+            comp = load(self.root / '.')
+
+        self.assertIs(compstate.comp, comp)
+
+
+class LoadCachedTests(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.root = Path(tempdir.name) / 'compstate'
+        build_compstate(self.root, num_teams=8, rounds=1, knockout_size=4)
+        self.cache = Path(tempdir.name) / 'cache'
+
+        patcher = mock.patch.dict(os.environ, {'SRCOMP_CACHE_DIR': str(self.cache)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def head(self) -> str:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=self.root,
+            text=True,
+        ).strip()
+
+    def assertEquivalent(self, expected: SRComp, actual: SRComp) -> None:
+        self.assertEqual(expected.teams, actual.teams)
+        self.assertEqual(
+            [x.keys() for x in expected.schedule.matches],
+            [x.keys() for x in actual.schedule.matches],
+        )
+        self.assertEqual(
+            expected.scores.league.positions,
+            actual.scores.league.positions,
+        )
+        self.assertEqual(
+            expected.scores.league._scorer.__name__,
+            actual.scores.league._scorer.__name__,
+        )
+
+    def test_snapshot_hit(self) -> None:
+        expected = load_cached(self.root)
+        self.assertEqual(1, len(list(self.cache.glob('*.pickle'))))
+
+        # A commit which doesn't change the content still uses the snapshot
+        git(self.root, 'commit', '--quiet', '--allow-empty', '--message', "Empty")
+
+        with mock.patch.object(SRComp, '__init__', side_effect=AssertionError):
+            comp = load_cached(self.root)
+
+        self.assertEquivalent(expected, comp)
+        self.assertEqual(self.head(), comp.state)
+
+    def test_key_changes(self) -> None:
+        key, revision = snapshot_key(self.root)
+        self.assertEqual(self.head(), revision)
+        keys = {key}
+
+        teams_yaml = self.root / 'teams.yaml'
+        teams_yaml.write_text(teams_yaml.read_text().replace("Team T000", "Spam"))
+        key, _ = snapshot_key(self.root)
+        self.assertNotIn(key, keys, "Dirty file should change the key")
+        keys.add(key)
+
+        (self.root / 'spam.txt').write_text('spam')
+        key, _ = snapshot_key(self.root)
+        self.assertNotIn(key, keys, "Untracked file should change the key")
+        keys.add(key)
+
+        git(self.root, 'add', '.')
+        git(self.root, 'commit', '--quiet', '--message', "Spam")
+        key, revision = snapshot_key(self.root)
+        self.assertNotIn(key, keys, "New commit should change the key")
+        self.assertEqual(self.head(), revision)
+
+    def test_corrupt_snapshot(self) -> None:
+        expected = load_cached(self.root)
+        snapshot, = self.cache.glob('*.pickle')
+        snapshot.write_bytes(b'spam')
+
+        comp = load_cached(self.root)
+
+        self.assertEquivalent(expected, comp)
+        self.assertIsNotNone(_read_snapshot(snapshot, self.root), "Should be replaced")
+
+    def test_snapshot_round_trip(self) -> None:
+        expected = SRComp(self.root)
+        snapshot = self.cache / 'snapshot.pickle'
+
+        _write_snapshot(snapshot, expected)
+        comp = _read_snapshot(snapshot, self.root)
+
+        assert comp is not None
+        self.assertEquivalent(expected, comp)
+        # The scorer is loaded from the compstate again
+        self.assertIsNot(expected.scores.league._scorer, comp.scores.league._scorer)
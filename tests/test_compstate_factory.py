@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from sr.comp.comp import SRComp
+from sr.comp.match_period import MatchType
+from sr.comp.validation import validate
+
+from .compstate_factory import build_compstate
+
+
+class CompstateFactoryTests(unittest.TestCase):
+    def build_and_load(self, **kwargs: object) -> SRComp:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        root = Path(tmp.name) / 'compstate'
+        build_compstate(root, **kwargs)  # type: ignore[arg-type]
+        comp = SRComp(root)
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            num_errors = validate(comp)
+        self.assertEqual(0, num_errors, stderr.getvalue())
+
+        return comp
+
+    def test_fully_scored(self) -> None:
+        comp = self.build_and_load(
+            num_teams=20,
+            num_arenas=2,
+            corners=4,
+            rounds=3,
+            knockout_size=8,
+            scored=1,
+        )
+
+        self.assertEqual(20, len(comp.teams))
+        self.assertEqual(['A', 'B'], list(comp.arenas.keys()))
+
+        league_slots = [
+            slot
+            for slot in comp.schedule.matches
+            if MatchType.league in {x.type for x in slot.values()}
+        ]
+        # 20 teams need 3 slots of 8 places per round
+        self.assertEqual(9, len(league_slots))
+        self.assertEqual(18, len(comp.scores.league.game_points))
+
+        for tla in comp.teams:
+            self.assertEqual(
+                3,
+                sum(tla in match.teams for slot in league_slots for match in slot.values()),
+                f"Wrong number of league matches for {tla}",
+            )
+
+        num_knockout_games = sum(len(x) for x in comp.schedule.knockout_rounds)
+        self.assertEqual(3, num_knockout_games)
+        self.assertEqual(num_knockout_games, len(comp.scores.knockout.game_points))
+
+    def test_partially_scored_without_automatic_knockouts(self) -> None:
+        comp = self.build_and_load(
+            num_teams=12,
+            num_arenas=1,
+            corners=2,
+            rounds=2,
+            scored=0.5,
+        )
+
+        # Half of the 12 league games; the final can't be scored before them
+        self.assertEqual(6, len(comp.scores.league.game_points))
+        self.assertEqual(1, len(comp.schedule.knockout_rounds))
+        self.assertEqual({}, comp.scores.knockout.game_points)
+
+    def test_deterministic(self) -> None:
+        first = self.build_and_load(seed=4)
+        second = self.build_and_load(seed=4)
+
+        self.assertEqual(
+            first.scores.league.ranked_points,
+            second.scores.league.ranked_points,
+        )
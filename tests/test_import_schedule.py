@@ -1,82 +1,177 @@
+from __future__ import annotations
+
+import random
 import unittest
 
-from sr.comp.cli.import_schedule.core import build_schedule, get_id_subsets
-from sr.comp.cli.import_schedule.types import Configuration
+from sr.comp.cli.import_schedule.core import (
+    are_better_matches,
+    build_matches,
+    build_schedule,
+    chunks_of_size,
+    EmptyIdSearch,
+    MAX_SEARCH_STEPS,
+)
+from sr.comp.cli.import_schedule.loading import load_ids_schedule
+from sr.comp.cli.import_schedule.types import BadMatch, Configuration, ID
 from sr.comp.types import ArenaName, MatchNumber, TLA
 
 
+def random_schedule(
+    num_ids: int,
+    num_rounds: int,
+    seed: int,
+) -> tuple[list[ID], list[list[ID]]]:
+    """A schedule for two arenas of four corners, with every id in each round."""
+    ids = [ID(str(n)) for n in range(num_ids)]
+    rng = random.Random(seed)
+    schedule: list[list[ID]] = []
+    for _ in range(num_rounds):
+        round_ids = list(ids)
+        rng.shuffle(round_ids)
+        schedule += chunks_of_size(round_ids, 8)
+    return ids, schedule
+
+
+def bad_matches(
+    ids: list[ID],
+    schedule: list[list[ID]],
+    empty: list[ID],
+) -> list[BadMatch]:
+    used_ids = [id_ for id_ in ids if id_ not in empty]
+    _, bad = build_matches(
+        {id_: TLA(f'T{id_}') for id_ in used_ids},
+        schedule,
+        [ArenaName('A'), ArenaName('B')],
+        4,
+        0,
+    )
+    return bad
+
+
 class ImportScheduleTests(unittest.TestCase):
-    def test_num_ids_equals_num_teams(self) -> None:
-        ids = list(range(5))
-        maps = list(get_id_subsets(ids, 5))
+    def test_chunks_of_size(self) -> None:
+        chunks = list(chunks_of_size(list(range(6)), 2))
 
-        expected = [ids]
+        self.assertEqual([[0, 1], [2, 3], [4, 5]], chunks)
 
-        self.assertEqual(
-            expected,
-            maps,
-            "Only one possible combination when same number of ids as teams",
-        )
+        with self.assertRaises(ValueError):
+            list(chunks_of_size(list(range(5)), 2))
 
-    def test_one_spare_id(self) -> None:
-        ids = list(range(3))
-        num_teams = 2
+    def test_search_leaves_ids_in_different_games_empty(self) -> None:
+        ids = [ID(str(n)) for n in range(8)]
+        schedule = [
+            ids,
+            [ids[x] for x in (0, 1, 4, 5, 2, 3, 6, 7)],
+        ]
 
-        ids_set = set(ids)
+        empty, is_best = EmptyIdSearch(ids, schedule, 4).search(2, 1000)
 
-        subsets = list(get_id_subsets(ids, num_teams))
+        self.assertTrue(is_best)
+        self.assertEqual([ids[0], ids[6]], empty)
 
-        self.assertEqual(
-            3,
-            len(subsets),
-            "Should have as many maps as valid permutations",
-        )
+    def test_search_stops_after_max_steps(self) -> None:
+        ids = [ID(str(n)) for n in range(8)]
+        schedule = [
+            ids,
+            [ids[x] for x in (0, 1, 4, 5, 2, 3, 6, 7)],
+        ]
+
+        empty, is_best = EmptyIdSearch(ids, schedule, 4).search(2, 1)
 
-        # Don't actually care what the mappings are, only that all are explored
-        ids_omitted = []
-        for subset in subsets:
-            ids_used = set(subset)
-            omitted = ids_set - ids_used
+        self.assertFalse(is_best)
+        self.assertEqual(2, len(set(empty)))
 
-            self.assertEqual(1, len(omitted), "Omitted wrong number of ids")
-            ids_omitted.append(omitted.pop())
+    def test_search_finishes_for_many_spare_ids(self) -> None:
+        ids, schedule = random_schedule(56, num_rounds=12, seed=0)
 
-        self.assertEqual(
-            set(ids_omitted),
-            ids_set,
-            "Should have omitted each id once",
+        empty, is_best = EmptyIdSearch(ids, schedule, 4).search(11, MAX_SEARCH_STEPS)
+
+        self.assertTrue(is_best)
+        num_bad_games = sum(
+            len(set(game) & set(empty)) >= 2
+            for match in schedule
+            for game in chunks_of_size(match, 4)
+        )
+        # As found by an exhaustive search
+        self.assertEqual(10, num_bad_games)
+
+    def test_search_in_parallel(self) -> None:
+        ids = [ID(str(n)) for n in range(12)]
+        schedule = [
+            ids,
+            [ids[x] for x in (0, 4, 8, 1, 5, 9, 2, 6, 10, 3, 7, 11)],
+            [ids[x] for x in (0, 5, 10, 3, 4, 9, 2, 7, 8, 1, 6, 11)],
+        ]
+
+        expected = EmptyIdSearch(ids, schedule, 3).search(5, 1000)
+        result = EmptyIdSearch(ids, schedule, 3).search_in_parallel(5, 1000, 2)
+
+        self.assertEqual(expected, result)
+
+    def test_search_in_parallel_out_of_steps(self) -> None:
+        ids, schedule = random_schedule(56, num_rounds=12, seed=2)
+
+        serial, serial_is_best = EmptyIdSearch(ids, schedule, 4).search(11, 100)
+        parallel, parallel_is_best = EmptyIdSearch(ids, schedule, 4).search_in_parallel(
+            11,
+            100,
+            2,
         )
 
-    def test_two_spare_ids(self) -> None:
-        ids = list(range(4))
-        num_teams = 2
+        self.assertFalse(serial_is_best)
+        self.assertFalse(parallel_is_best)
+        self.assertFalse(
+            are_better_matches(
+                bad_matches(ids, schedule, parallel),
+                bad_matches(ids, schedule, serial),
+                4,
+            ),
+            "Searching in parallel should be no worse than searching in turn",
+        )
 
-        ids_set = set(ids)
+    def test_search_in_parallel_independent_of_jobs(self) -> None:
+        ids, schedule = random_schedule(56, num_rounds=12, seed=2)
 
-        subsets = list(get_id_subsets(ids, num_teams))
+        # With the same steps in total, how the tasks are spread across the
+        # processes mustn't change the choice
+        one_job = EmptyIdSearch(ids, schedule, 4).search_in_parallel(11, 400, 1)
+        two_jobs = EmptyIdSearch(ids, schedule, 4).search_in_parallel(11, 200, 2)
+        four_jobs = EmptyIdSearch(ids, schedule, 4).search_in_parallel(11, 100, 4)
 
-        expected_omitted = set(["0,1", "0,2", "0,3", "1,2", "1,3", "2,3"])
+        self.assertFalse(one_job[1])
+        self.assertEqual(one_job, two_jobs)
+        self.assertEqual(one_job, four_jobs)
 
-        self.assertEqual(
-            len(expected_omitted),
-            len(subsets),
-            "Should have as many maps as valid permutations",
+    def test_build_schedule_many_spare_ids(self) -> None:
+        lines = [
+            '0|1|2|3|4|5|6|7',
+            '8|9|10|11|12|13|14|15',
+            '4|5|6|7|8|9|10|11',
+            '12|13|14|15|0|1|2|3',
+        ]
+        teams = [TLA(f'T{n:02d}') for n in range(12)]
+
+        matches, bad = build_schedule(
+            Configuration(
+                [ArenaName('A'), ArenaName('B')],
+                teams,
+                teams_per_game=4,
+                first_match_number=MatchNumber(0),
+            ),
+            lines,
+            ids_to_ignore=[],
         )
 
-        # Don't actually care what the mappings are, only that all are explored
-        ids_omitted = []
-        for subset in subsets:
-            ids_used = set(subset)
-            omitted = ids_set - ids_used
+        expected_matches = {
+            0: {'A': [None, 'T00', 'T01', 'T02'], 'B': [None, 'T03', 'T04', 'T05']},
+            1: {'A': [None, 'T06', 'T07', 'T08'], 'B': [None, 'T09', 'T10', 'T11']},
+            2: {'A': [None, 'T03', 'T04', 'T05'], 'B': [None, 'T06', 'T07', 'T08']},
+            3: {'A': [None, 'T09', 'T10', 'T11'], 'B': [None, 'T00', 'T01', 'T02']},
+        }
 
-            self.assertEqual(2, len(omitted), "Omitted wrong number of ids")
-            ids_omitted.append(",".join(map(str, sorted(omitted))))
+        self.assertEqual(expected_matches, matches, "Wrong matches")
 
-        self.assertEqual(
-            expected_omitted,
-            set(ids_omitted),
-            "Should have omitted each id pair once",
-        )
+        self.assertEqual([], bad, "Should not be any 'bad' matches")
 
     def test_build_schedule(self) -> None:
         lines = ['0|1|2|3', '1|2|3|4']
@@ -149,3 +244,29 @@ class ImportScheduleTests(unittest.TestCase):
         self.assertEqual(expected_matches, matches, "Wrong matches")
 
         self.assertEqual([], bad, "Should not be any 'bad' matches")
+
+
+class LoadIdsScheduleTests(unittest.TestCase):
+    def test_load_ids_schedule(self) -> None:
+        lines = [
+            '# A comment\n',
+            '3|1|0|4  # Another comment\n',
+            '\n',
+            '1|2|4|0\n',
+        ]
+
+        ids, schedule = load_ids_schedule(lines, num_arenas=1, teams_per_game=4)
+
+        self.assertEqual(['3', '1', '0', '4', '2'], ids)
+        self.assertEqual([['3', '1', '0', '4'], ['1', '2', '4', '0']], schedule)
+
+    def test_error_gives_line_number(self) -> None:
+        lines = [
+            '# A comment\n',
+            '3|1|0|4\n',
+            '\n',
+            '1|2|4|1\n',
+        ]
+
+        with self.assertRaisesRegex(ValueError, r"^Match 1 \(line 4\) contains the same id"):
+            load_ids_schedule(lines, num_arenas=1, teams_per_game=4)
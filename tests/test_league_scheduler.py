@@ -0,0 +1,438 @@
+from __future__ import annotations
+
+import io
+import itertools
+import json
+import os
+import random
+import tempfile
+import unittest
+from collections import Counter
+from contextlib import redirect_stderr
+from itertools import combinations
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from sr.comp.cli.league_scheduler import (
+    ANNEAL_STEPS,
+    Backtracker,
+    find_lcg_params,
+    LCG_MEMO_FILE,
+    memoised_lcg_params,
+    Scheduler,
+    ScheduleState,
+)
+from sr.comp.cli.schedule_league import Matches
+
+TEAMS = [f'T{n:02d}' for n in range(12)]
+
+
+def build_scheduler(**kwargs: object) -> Scheduler:
+    with redirect_stderr(io.StringIO()):
+        return Scheduler(
+            TEAMS,
+            max_match_periods=12,
+            num_corners=4,
+            random=random.Random(1),
+            enable_lcg=False,
+            **kwargs,
+        )
+
+
+class LcgParamsTests(unittest.TestCase):
+    def test_find_lcg_params(self) -> None:
+        m, round_length, epm, separation = 48, 6, 8, 2
+
+        params = find_lcg_params(m, round_length, epm, separation)
+
+        assert params is not None
+        a, c = params
+        next_round = [(a * x + c) % m for x in range(m)]
+        self.assertEqual(set(range(m)), set(next_round))
+        # Neither of the last two matches' entrants may be in the first match
+        # of the next round, nor the last's in the second
+        self.assertTrue(set(next_round[-2 * epm:]).isdisjoint(range(epm)))
+        self.assertTrue(set(next_round[-epm:]).isdisjoint(range(2 * epm)))
+
+    def test_find_lcg_params_none_valid(self) -> None:
+        self.assertIsNone(find_lcg_params(24, 1, 24, 1))
+
+    def test_memoised_lcg_params(self) -> None:
+        with tempfile.TemporaryDirectory() as cache:
+            # Disabling snapshots leaves the memo alone
+            with mock.patch.dict(
+                os.environ,
+                {'XDG_CACHE_HOME': cache, 'SRCOMP_CACHE_DIR': ''},
+            ):
+                params = memoised_lcg_params(48, 6, 8, 2)
+                memo_path = Path(cache) / 'srcomp' / LCG_MEMO_FILE
+                memo = json.loads(memo_path.read_text())
+                self.assertEqual({'48,6,8,2': list(params)}, memo)
+
+                with mock.patch(
+                    'sr.comp.cli.league_scheduler.find_lcg_params',
+                ) as mock_find:
+                    self.assertEqual(params, memoised_lcg_params(48, 6, 8, 2))
+
+                mock_find.assert_not_called()
+
+
+class ScheduleStateTests(unittest.TestCase):
+    def test_pop_undoes_push(self) -> None:
+        state = ScheduleState(4)
+        state.push([[0, 1, 4, 5]], [0b0011], [1])
+        state.push([[0, 2, 3, 4]], [0b1101], [2, 3, 11])
+
+        state.pop()
+
+        self.assertEqual([[0, 1, 4, 5]], state.matches)
+        self.assertEqual([0b0011], state.entrant_masks)
+        self.assertEqual([0, 1] + [0] * 14, list(state.matchups))
+
+    def test_fingerprint_ignores_order_of_earlier_matches(self) -> None:
+        first = ScheduleState(4)
+        first.push([[0, 1, 2, 3]], [0b1111], [1, 2, 3])
+        first.push([[0, 2, 1, 3]], [0b1111], [2, 3, 1])
+        second = ScheduleState(4)
+        second.push([[2, 3, 0, 1]], [0b1111], [3, 1, 2])
+        second.push([[0, 1, 2, 3]], [0b1111], [1, 2, 3])
+
+        self.assertEqual(first.fingerprint(1), second.fingerprint(1))
+
+    def test_fingerprint_after_pop(self) -> None:
+        state = ScheduleState(4)
+        state.push([[0, 1, 4, 5]], [0b0011], [1])
+        fingerprint = state.fingerprint(1)
+
+        state.push([[0, 1, 4, 5]], [0b0011], [1])
+        self.assertNotEqual(fingerprint, state.fingerprint(1))
+
+        state.pop()
+        self.assertEqual(fingerprint, state.fingerprint(1))
+
+
+class BacktrackerTests(unittest.TestCase):
+    def build_state(self, num_rounds: int) -> ScheduleState:
+        state = ScheduleState(8)
+        for n in range(num_rounds):
+            state.push([[n % 8]], [1 << (n % 8)], [])
+        return state
+
+    def test_unwinds_further_without_progress(self) -> None:
+        backtracker = Backtracker(separation=1, round_length=1)
+        state = self.build_state(6)
+
+        self.assertEqual(1, backtracker.backtrack(state, 0))
+        self.assertEqual(2, backtracker.backtrack(state, 0))
+        self.assertEqual(3, len(state.matches))
+
+        # Stops at the minimum length
+        self.assertEqual(2, backtracker.backtrack(state, 1))
+        self.assertEqual(1, len(state.matches))
+
+    def test_unwinds_one_round_after_progress(self) -> None:
+        backtracker = Backtracker(separation=1, round_length=1)
+        state = self.build_state(3)
+        backtracker.backtrack(state, 0)
+        backtracker.backtrack(state, 0)
+
+        for n in range(4):
+            state.push([[n]], [1 << n], [])
+
+        self.assertEqual(1, backtracker.backtrack(state, 0))
+
+    def test_remembers_dead_ends(self) -> None:
+        backtracker = Backtracker(separation=1, round_length=1)
+        state = self.build_state(3)
+        backtracker.backtrack(state, 0)
+
+        state.push([[4]], [1 << 4], [])
+        self.assertFalse(backtracker.is_dead_end(state))
+        state.pop()
+
+        state.push([[2]], [1 << 2], [])
+        self.assertTrue(backtracker.is_dead_end(state))
+
+        backtracker.reset()
+        self.assertFalse(backtracker.is_dead_end(state))
+
+    def test_only_remembers_failed_schedules(self) -> None:
+        backtracker = Backtracker(separation=1, round_length=1)
+        state = self.build_state(6)
+        # Unwinds one round, then two
+        backtracker.backtrack(state, 0)
+        backtracker.backtrack(state, 0)
+
+        # The fourth round was unwound without having been found to fail
+        state.push([[3]], [1 << 3], [])
+        self.assertFalse(backtracker.is_dead_end(state))
+
+        state.push([[4]], [1 << 4], [])
+        self.assertTrue(backtracker.is_dead_end(state))
+
+    def test_unwinds_whole_rounds(self) -> None:
+        backtracker = Backtracker(separation=1, round_length=2)
+        state = ScheduleState(8)
+        for n in range(4):
+            state.push([[n], [n + 4]], [1 << n, 1 << (n + 4)], [])
+
+        self.assertEqual(1, backtracker.backtrack(state, 0))
+        self.assertEqual(2, backtracker.backtrack(state, 0))
+        self.assertEqual(1, backtracker.backtrack(state, 0))
+        self.assertEqual([], state.matches)
+        # Limited to the rounds there were to unwind
+        self.assertEqual(1, backtracker.depth)
+
+
+class CheckMatchesTests(unittest.TestCase):
+    def encode(self, scheduler: Scheduler, matches: list[list[str]]) -> list[list[int]]:
+        return [[scheduler._team_ids[x] for x in match] for match in matches]
+
+    def test_rejects_tight_spacing_at_start(self) -> None:
+        scheduler = build_scheduler()
+
+        checked = scheduler._check_matches(ScheduleState(12), self.encode(scheduler, [
+            ['T00', 'T01', 'T02', 'T03'],
+            ['T00', 'T04', 'T05', 'T06'],
+        ]))
+
+        self.assertIsNone(checked)
+
+    def test_rejects_tight_spacing_across_rounds(self) -> None:
+        scheduler = build_scheduler()
+        state = ScheduleState(12)
+        state.push(self.encode(scheduler, [['T00', 'T01', 'T02', 'T03']]), [0b1111], [])
+
+        checked = scheduler._check_matches(
+            state,
+            self.encode(scheduler, [['T04', 'T05', 'T06', 'T00']]),
+        )
+
+        self.assertIsNone(checked)
+
+    def test_rejects_two_pseudo_teams(self) -> None:
+        scheduler = build_scheduler()
+
+        checked = scheduler._check_matches(ScheduleState(12), self.encode(scheduler, [
+            ['T00', 'T01', '~', '~'],
+        ]))
+
+        self.assertIsNone(checked)
+
+    def test_counts_matchups(self) -> None:
+        scheduler = build_scheduler()
+        state = ScheduleState(12)
+
+        checked = scheduler._check_matches(state, self.encode(scheduler, [
+            ['T02', 'T00', 'T01', '~'],
+        ]))
+
+        assert checked is not None
+        masks, matchups = checked
+        self.assertEqual([0b111], masks)
+        self.assertEqual([1, 2, 12 + 2], sorted(matchups))
+        self.assertEqual(0, sum(state.matchups), "Check should not change the state")
+
+    def test_uses_given_matchup_max(self) -> None:
+        scheduler = build_scheduler(max_matchups=1)
+        state = ScheduleState(12)
+        state.push(self.encode(scheduler, [['T00', 'T01', 'T02', 'T03']]), [0b1111], [1])
+        new_matches = self.encode(scheduler, [
+            ['T04', 'T05', 'T06', 'T07'],
+            ['T08', 'T09', 'T10', 'T11'],
+            ['T00', 'T01', 'T02', '~'],
+        ])
+
+        self.assertIsNone(scheduler._check_matches(state, new_matches))
+        self.assertIsNotNone(scheduler._check_matches(state, new_matches, 2))
+
+
+class SchedulerTests(unittest.TestCase):
+    def assertMeetsConstraints(self, scheduler: Scheduler) -> None:
+        with redirect_stderr(io.StringIO()):
+            schedule = scheduler.run()
+
+        self.assertEqual(scheduler.total_matches, len(schedule))
+
+        matchups: Counter[tuple[str, str]] = Counter()
+        previous: set[str] = set()
+        for match in schedule.values():
+            entrants = [x for x in match['main'] if x is not None]
+            self.assertTrue(previous.isdisjoint(entrants), match)
+            previous = set(entrants)
+            matchups.update(combinations(sorted(entrants), 2))
+
+        self.assertLessEqual(max(matchups.values()), scheduler.max_matchups)
+
+    def test_run_meets_constraints(self) -> None:
+        self.assertMeetsConstraints(build_scheduler(separation=1))
+
+    def test_run_meets_constraints_anneal(self) -> None:
+        self.assertMeetsConstraints(build_scheduler(separation=1, search='anneal'))
+
+    def test_stats(self) -> None:
+        scheduler = build_scheduler(separation=1)
+
+        with redirect_stderr(io.StringIO()) as stderr:
+            scheduler.run()
+
+        stats = scheduler.stats.summary()
+        self.assertEqual(
+            stats['attempts'],
+            stats['accepted_rounds'] + sum(stats['rejections'].values()),
+        )
+        self.assertGreaterEqual(stats['accepted_rounds'], scheduler.num_rounds)
+        self.assertIn(f"Search statistics: {json.dumps(stats)}", stderr.getvalue())
+
+    def test_progress(self) -> None:
+        streamed: Matches = {}
+
+        def progress(first_match: int, matches: Matches) -> None:
+            for match_num in range(first_match, len(streamed)):
+                del streamed[match_num]
+            streamed.update(matches)
+
+        scheduler = build_scheduler(separation=1, progress=progress)
+        with redirect_stderr(io.StringIO()):
+            schedule = scheduler.run()
+
+        self.assertEqual(schedule, streamed)
+
+    def test_check_matches_counts_rejections(self) -> None:
+        scheduler = build_scheduler()
+        teams = scheduler._team_ids
+
+        scheduler._check_matches(ScheduleState(12), [
+            [teams['T00'], teams['T01'], teams['T02'], teams['T03']],
+            [teams['T00'], teams['T04'], teams['T05'], teams['T06']],
+        ])
+
+        self.assertEqual({'spacing': 1}, scheduler.stats.rejections)
+
+    def test_run_stops_at_time_limit(self) -> None:
+        scheduler = build_scheduler(time_limit=0)
+
+        with redirect_stderr(io.StringIO()):
+            schedule = scheduler.run()
+
+        self.assertEqual({}, schedule)
+        self.assertTrue(scheduler.timed_out)
+        self.assertEqual(
+            ["Stopped at the time limit with 0 of 12 matches scheduled."],
+            scheduler.relaxations(),
+        )
+
+    def test_resume_from_checkpoint(self) -> None:
+        checkpoints: list[dict[str, Any]] = []
+        scheduler = build_scheduler(
+            separation=1,
+            checkpoint=checkpoints.append,
+            checkpoint_interval=0,
+        )
+        with redirect_stderr(io.StringIO()):
+            expected = scheduler.run()
+
+        self.assertGreater(len(checkpoints), 1)
+        for checkpoint in checkpoints:
+            with self.subTest(num_matches=len(checkpoint['matches'])):
+                resumed = build_scheduler(separation=1)
+                resumed.resume(checkpoint)
+
+                with redirect_stderr(io.StringIO()):
+                    schedule = resumed.run()
+
+                self.assertEqual(expected, schedule)
+
+    def test_resume_from_time_limit_checkpoint(self) -> None:
+        # Few enough attempts per round that it often backtracks
+        with mock.patch('sr.comp.cli.league_scheduler.SHUFFLE_ATTEMPTS', 20):
+            with redirect_stderr(io.StringIO()):
+                expected = build_scheduler(separation=1).run()
+
+            # Make the clock tick once each time it's read, so that the time
+            # limits reached are the same on every run
+            for time_limit in range(0, 1000, 50):
+                with self.subTest(time_limit=time_limit):
+                    checkpoints: list[dict[str, Any]] = []
+                    scheduler = build_scheduler(
+                        separation=1,
+                        checkpoint=checkpoints.append,
+                        time_limit=time_limit,
+                    )
+                    with mock.patch(
+                        'time.monotonic',
+                        side_effect=itertools.count(),
+                    ), redirect_stderr(io.StringIO()):
+                        scheduler.run()
+
+                    self.assertTrue(scheduler.timed_out)
+                    resumed = build_scheduler(separation=1)
+                    resumed.resume(checkpoints[-1])
+
+                    with redirect_stderr(io.StringIO()):
+                        schedule = resumed.run()
+
+                    self.assertEqual(expected, schedule)
+
+    def test_anneal_round_repairs_round(self) -> None:
+        scheduler = build_scheduler(search='anneal')
+        state = ScheduleState(12)
+        state.push([[0, 1, 2, 3], [4, 5, 6, 7]], [0b1111, 0b11110000], [])
+        teams = list(scheduler._teams)
+
+        found = scheduler._anneal_round(state, teams, 2, lambda amount: None)
+
+        self.assertTrue(found)
+        self.assertEqual(sorted(scheduler._teams), sorted(teams))
+        self.assertEqual(
+            (0, set(), 0),
+            scheduler._round_violations(state, teams, 2),
+        )
+
+    def test_anneal_round_only_bumps_for_matchups(self) -> None:
+        def unrepaired_bumps(separation: int, max_matchups: int) -> list[int]:
+            with redirect_stderr(io.StringIO()):
+                scheduler = Scheduler(
+                    TEAMS[:8],
+                    max_match_periods=4,
+                    num_corners=4,
+                    random=random.Random(1),
+                    separation=separation,
+                    max_matchups=max_matchups,
+                    enable_lcg=False,
+                    search='anneal',
+                )
+            state = ScheduleState(8)
+            state.push([[0, 1, 2, 3], [4, 5, 6, 7]], [0b1111, 0b11110000], [])
+            bumps: list[int] = []
+
+            found = scheduler._anneal_round(
+                state,
+                list(scheduler._teams),
+                max_matchups,
+                bumps.append,
+            )
+
+            self.assertFalse(found)
+            return bumps
+
+        # Every team played in the last two matches, so only the spacing can't
+        # be met
+        self.assertEqual([], unrepaired_bumps(separation=2, max_matchups=100))
+        # No team may meet another, which is all that can't be met
+        self.assertEqual([ANNEAL_STEPS], unrepaired_bumps(separation=0, max_matchups=0))
+
+    def test_round_violations(self) -> None:
+        scheduler = build_scheduler(max_matchups=1)
+        state = ScheduleState(12)
+        state.push([[0, 1, 2, 3]], [0b1111], [1])
+
+        # T00 and T01 play again straight away, and meet each other again
+        teams = [0, 1, 8, 9] + [4, 5, 6, 7] + [10, 11, 2, 3]
+
+        cost, bad_positions, matchup_excess = scheduler._round_violations(state, teams, 1)
+
+        self.assertEqual(3, cost)
+        self.assertEqual({0, 1}, bad_positions)
+        self.assertEqual(1, matchup_excess)
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from sr.comp.cli import yaml_round_trip as yaml
+from sr.comp.cli.league_scheduler import Scheduler
+from sr.comp.cli.schedule_league import (
+    memoise_lcg_params,
+    StreamToFile,
+    worker_seeds,
+)
+
+from .compstate_factory import build_compstate
+
+
+class WorkerSeedsTests(unittest.TestCase):
+    def test_derived_from_seed(self) -> None:
+        seeds = worker_seeds(42, 4)
+
+        self.assertEqual(seeds, worker_seeds(42, 4))
+        self.assertEqual(4, len(set(seeds)))
+        self.assertNotEqual(seeds, worker_seeds(43, 4))
+
+
+class MemoiseLcgParamsTests(unittest.TestCase):
+    def test_schedulers_use_memoised_params(self) -> None:
+        scheduler_options = {
+            'teams': [f'T{n:02d}' for n in range(13)],
+            'max_match_periods': 20,
+            'arenas': ['A', 'B'],
+            'num_corners': 4,
+            'separation': 1,
+            'max_matchups': 2,
+            'appearances_per_round': 1,
+            'base_matches': [],
+            'enable_lcg': True,
+            'search': 'shuffle',
+            'time_limit': None,
+        }
+
+        with tempfile.TemporaryDirectory() as cache:
+            with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache}):
+                memoise_lcg_params(scheduler_options)
+
+                with mock.patch(
+                    'sr.comp.cli.league_scheduler.find_lcg_params',
+                ) as mock_find:
+                    Scheduler(**scheduler_options)
+
+                mock_find.assert_not_called()
+
+
+class StreamToFileTests(unittest.TestCase):
+    def test_rewrites_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / 'league.yaml'
+            stream = StreamToFile(path, 42)
+
+            stream(0, {0: {'A': ['ABC', None]}, 1: {'A': ['DEF', 'GHI']}})
+            self.assertEqual(
+                {0: {'A': ['ABC', None]}, 1: {'A': ['DEF', 'GHI']}},
+                yaml.load(path)['matches'],
+            )
+            self.assertIn("with seed 42", path.read_text())
+
+            # Going back over old ground only rewrites the file occasionally
+            stream(1, {})
+            self.assertEqual(2, len(yaml.load(path)['matches']))
+
+            stream(1, {1: {'A': ['GHI', 'DEF']}, 2: {'A': [None, 'ABC']}})
+            self.assertEqual(
+                {0: {'A': ['ABC', None]}, 1: {'A': ['GHI', 'DEF']}, 2: {'A': [None, 'ABC']}},
+                yaml.load(path)['matches'],
+            )
+
+
+class ScheduleLeagueTests(unittest.TestCase):
+    compstate: Path
+    env: dict[str, str]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        tempdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tempdir.cleanup)
+        cls.compstate = Path(tempdir.name) / 'compstate'
+        build_compstate(cls.compstate, num_teams=16, rounds=2, knockout_size=8)
+
+        # Keep the memoised LCG parameters out of the real cache
+        cls.env = dict(os.environ, XDG_CACHE_HOME=str(Path(tempdir.name) / 'cache'))
+
+    def schedule_league(
+        self,
+        *args: str,
+        compstate: Path | None = None,
+    ) -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            [
+                'srcomp',
+                'schedule-league',
+                str(compstate or self.compstate),
+                '--spacing',
+                '1',
+                *args,
+            ],
+            capture_output=True,
+            text=True,
+            env=self.env,
+        )
+
+    def assertValidSchedule(self, matches: dict[int, dict[str, list[str | None]]]) -> None:
+        appearances: Counter[str] = Counter(
+            team
+            for match in matches.values()
+            for teams in match.values()
+            for team in teams
+            if team is not None
+        )
+        self.assertEqual(16, len(appearances), appearances)
+        self.assertEqual({2}, set(appearances.values()), appearances)
+
+    def test_parallel(self) -> None:
+        result = self.schedule_league('--parallel', '2', '--seed', '42')
+
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertValidSchedule(yaml.load(io.StringIO(result.stdout))['matches'])
+        self.assertIn("Using 2 workers, seeded from 42", result.stderr)
+        self.assertRegex(result.stderr, r"Worker [01] \(seed \d+\) found a schedule\.")
+
+    def test_seed_regenerates_schedule(self) -> None:
+        first = self.schedule_league()
+        self.assertEqual(0, first.returncode, first.stderr)
+
+        match = re.match(
+            r"# Generated .* with seed (\d+)\. Run with\n# '--seed \1' and the same "
+            r"options to regenerate it\.",
+            first.stdout,
+        )
+        assert match is not None, first.stdout
+        seed = match.group(1)
+
+        second = self.schedule_league('--seed', seed)
+        self.assertEqual(0, second.returncode, second.stderr)
+
+        self.assertEqual(first.stdout, second.stdout)
+
+    def test_seed_regenerates_parallel_schedule(self) -> None:
+        first = self.schedule_league('--parallel', '2', '--seed', '42')
+        self.assertEqual(0, first.returncode, first.stderr)
+
+        match = re.match(
+            r"# Generated .* with seed (\d+),\n# by worker [01] of a '--parallel' run "
+            r"seeded from 42\. Run with\n# '--seed \1' and the same options but "
+            r"without\n# '--parallel' to regenerate it\.",
+            first.stdout,
+        )
+        assert match is not None, first.stdout
+        seed = match.group(1)
+
+        second = self.schedule_league('--seed', seed)
+        self.assertEqual(0, second.returncode, second.stderr)
+
+        # Only the header differs, as it names the worker
+        self.assertEqual(
+            first.stdout.split('matches:', 1)[1],
+            second.stdout.split('matches:', 1)[1],
+        )
+
+    def test_resume(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            checkpoint = Path(tempdir) / 'checkpoint.json'
+
+            stopped = self.schedule_league(
+                '--seed',
+                '42',
+                '--time-limit',
+                '0',
+                '--checkpoint',
+                str(checkpoint),
+            )
+            self.assertEqual(0, stopped.returncode, stopped.stderr)
+            self.assertIn("Stopped at the time limit", stopped.stderr)
+
+            resumed = self.schedule_league('--checkpoint', str(checkpoint), '--resume')
+            self.assertEqual(0, resumed.returncode, resumed.stderr)
+
+            mismatched = self.schedule_league(
+                '--max-repeated-matchups',
+                '3',
+                '--checkpoint',
+                str(checkpoint),
+                '--resume',
+            )
+            self.assertNotEqual(0, mismatched.returncode)
+            self.assertIn("different options", mismatched.stderr)
+
+        uninterrupted = self.schedule_league('--seed', '42')
+        self.assertEqual(0, uninterrupted.returncode, uninterrupted.stderr)
+
+        self.assertEqual(uninterrupted.stdout, resumed.stdout)
+
+    def test_stream_to_stdout(self) -> None:
+        streamed = self.schedule_league('--seed', '42', '--stream')
+        self.assertEqual(0, streamed.returncode, streamed.stderr)
+
+        expected = self.schedule_league('--seed', '42')
+        self.assertEqual(0, expected.returncode, expected.stderr)
+
+        matches: dict[int, dict[str, list[str | None]]] = {}
+        lines = streamed.stdout.splitlines()
+        for line in lines[:-1]:
+            change = json.loads(line)
+            matches = {n: x for n, x in matches.items() if n < change['first_match']}
+            matches.update((int(n), x) for n, x in change['matches'].items())
+
+        final = json.loads(lines[-1])
+        self.assertEqual(0, final['first_match'])
+        self.assertEqual(matches, {int(n): x for n, x in final['matches'].items()})
+        self.assertEqual(yaml.load(io.StringIO(expected.stdout))['matches'], matches)
+
+    def test_reschedule_without_dropped_out_teams(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            compstate = Path(tempdir) / 'compstate'
+            shutil.copytree(self.compstate, compstate)
+            teams_yaml = compstate / 'teams.yaml'
+            teams = yaml.load(teams_yaml)
+            teams['teams']['T000']['dropped_out_after'] = 1
+            yaml.dump(teams, teams_yaml)
+            league = yaml.load(compstate / 'league.yaml')['matches']
+
+            result = self.schedule_league('--reschedule-from', '2', compstate=compstate)
+
+        self.assertEqual(0, result.returncode, result.stderr)
+        matches = yaml.load(io.StringIO(result.stdout))['matches']
+        self.assertEqual([league[0], league[1]], [matches[0], matches[1]])
+        self.assertGreater(len(matches), 2)
+        for num in range(2, len(matches)):
+            entrants = [x for teams in matches[num].values() for x in teams]
+            self.assertNotIn('T000', entrants, f"match {num}")
+
+    def test_output_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            output = Path(tempdir) / 'league.yaml'
+
+            result = self.schedule_league('--output', str(output))
+
+            self.assertEqual(0, result.returncode, result.stderr)
+            self.assertEqual('', result.stdout)
+            self.assertValidSchedule(yaml.load(output)['matches'])
+            self.assertEqual(['league.yaml'], [x.name for x in Path(tempdir).iterdir()])
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+import subprocess
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Sequence
+from unittest import mock
+
+from sr.comp.cli import yaml_round_trip as yaml
+from sr.comp.cli.import_schedule.seeds import (
+    INDEX_FILE,
+    load_library,
+    rank_seeds,
+    summarise,
+)
+from sr.comp.cli.import_schedule.types import Configuration, ID
+from sr.comp.types import ArenaName, MatchNumber, TLA
+
+from .compstate_factory import build_compstate
+
+# 8 ids in 6 matches of one arena, each appearing 3 times one match apart
+EIGHT_IDS = '\n'.join([
+    '0|1|2|3',
+    '4|5|6|7',
+    '2|3|0|1',
+    '6|7|4|5',
+    '1|0|3|2',
+    '5|4|7|6',
+])
+
+# 10 ids in 4 matches of two arenas, appearing up to 4 times without spacing
+TEN_IDS = '\n'.join([
+    '0|1|2|3|4|5|6|7',
+    '8|9|0|1|2|3|4|5',
+    '6|7|8|9|0|1|2|3',
+    '4|5|6|7|8|9|0|1',
+])
+
+
+def configuration(num_teams: int, num_arenas: int) -> Configuration:
+    return Configuration(
+        [ArenaName(chr(ord('A') + n)) for n in range(num_arenas)],
+        [TLA(f'T{n:02d}') for n in range(num_teams)],
+        teams_per_game=4,
+        first_match_number=MatchNumber(0),
+    )
+
+
+class SeedSchedulesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.cache = Path(tempdir.name) / 'cache'
+        self.library = Path(tempdir.name) / 'library'
+        self.library.mkdir()
+        (self.library / 'eight.txt').write_text(EIGHT_IDS)
+        (self.library / 'ten.txt').write_text(TEN_IDS)
+
+        patcher = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': str(self.cache)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_summarise(self) -> None:
+        lines = ['# A comment\n', '0|1|2|3\n', '4|5|2|6  # Another\n', '\n', '7|0|1|3\n']
+
+        seed = summarise(Path('seed.txt'), lines)
+
+        self.assertEqual(3, seed.num_matches)
+        self.assertEqual([4], seed.match_sizes)
+        self.assertEqual(
+            {'0': 2, '1': 2, '2': 2, '3': 2, '4': 1, '5': 1, '6': 1, '7': 1},
+            seed.appearances,
+        )
+        self.assertEqual(0, seed.min_spacing)
+
+    def test_summarise_error_gives_line_number(self) -> None:
+        with self.assertRaisesRegex(ValueError, r"^Match 1 \(line 3\)"):
+            summarise(Path('seed.txt'), ['0|1|2|3\n', '\n', '4|5|4|6\n'])
+
+    def test_load_library_uses_index(self) -> None:
+        seeds = load_library(self.library)
+
+        self.assertEqual(['eight.txt', 'ten.txt'], [x.path.name for x in seeds])
+        self.assertEqual([8, 10], [x.num_ids for x in seeds])
+        self.assertEqual([1, 0], [x.min_spacing for x in seeds])
+
+        index = json.loads((self.cache / 'srcomp' / INDEX_FILE).read_text())
+        self.assertEqual(2, len(index['schedules']))
+
+        with mock.patch('sr.comp.cli.import_schedule.seeds.summarise') as mock_summarise:
+            self.assertEqual(seeds, load_library(self.library))
+
+        mock_summarise.assert_not_called()
+
+    def test_load_library_notices_changes(self) -> None:
+        load_library(self.library)
+
+        (self.library / 'ten.txt').unlink()
+        (self.library / 'eight.txt').write_text(TEN_IDS)
+
+        seeds = load_library(self.library)
+
+        self.assertEqual(['eight.txt'], [x.path.name for x in seeds])
+        self.assertEqual([10], [x.num_ids for x in seeds])
+
+        index = json.loads((self.cache / 'srcomp' / INDEX_FILE).read_text())
+        self.assertEqual(1, len(index['schedules']))
+
+    def test_load_library_skips_bad_files(self) -> None:
+        (self.library / 'bad.txt').write_text('0|1|0|2\n')
+
+        stderr = io.StringIO()
+        with redirect_stderr(stderr), redirect_stdout(io.StringIO()) as stdout:
+            seeds = load_library(self.library)
+
+        self.assertEqual(['eight.txt', 'ten.txt'], [x.path.name for x in seeds])
+        self.assertIn("Warning: skipping bad.txt (Match 0 (line 1)", stderr.getvalue())
+        self.assertEqual('', stdout.getvalue())
+
+    def test_rank_seeds(self) -> None:
+        seeds = load_library(self.library)
+
+        def ranked(config: Configuration, ids_to_ignore: Sequence[ID] = ()) -> list[str]:
+            return [x.path.name for x in rank_seeds(seeds, config, ids_to_ignore)]
+
+        # Fewest spare ids first
+        self.assertEqual(['eight.txt', 'ten.txt'], ranked(configuration(7, 2)))
+        # Too few ids
+        self.assertEqual(['ten.txt'], ranked(configuration(9, 2)))
+        self.assertEqual([], ranked(configuration(11, 2)))
+        # Too few ids once some are ignored
+        self.assertEqual(['ten.txt'], ranked(configuration(8, 2), [ID('0')]))
+        # Too many ids per match
+        self.assertEqual(['eight.txt'], ranked(configuration(8, 1)))
+
+    def test_import_schedule_from_library(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            compstate = Path(tempdir) / 'compstate'
+            build_compstate(compstate, num_teams=9, rounds=1, knockout_size=4)
+
+            result = subprocess.run(
+                ['srcomp', 'import-schedule', str(compstate), str(self.library)],
+                capture_output=True,
+                text=True,
+            )
+
+            self.assertEqual(0, result.returncode, result.stderr)
+            self.assertIn("Using seed schedule ten.txt.", result.stdout)
+            matches = yaml.load(compstate / 'league.yaml')['matches']
+
+        self.assertEqual(4, len(matches))
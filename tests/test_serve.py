@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from sr.comp.cli.serve import CLIENT_TIMEOUT_SECONDS, socket_path
+
+from .compstate_factory import build_compstate
+
+
+class ServeTests(unittest.TestCase):
+    compstate: Path
+    env: dict[str, str]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        tempdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tempdir.cleanup)
+        cls.compstate = Path(tempdir.name) / 'compstate'
+        build_compstate(cls.compstate, num_teams=16, rounds=2, knockout_size=8)
+
+        cls.env = dict(
+            os.environ,
+            SRCOMP_CACHE_DIR='',
+            XDG_RUNTIME_DIR=tempdir.name,
+        )
+
+    def start_server(self) -> None:
+        server = subprocess.Popen(
+            ['srcomp', 'serve', str(self.compstate)],
+            stderr=subprocess.PIPE,
+            text=True,
+            env=self.env,
+        )
+
+        def stop() -> None:
+            server.terminate()
+            server.wait()
+            assert server.stderr is not None
+            server.stderr.close()
+
+        self.addCleanup(stop)
+
+        assert server.stderr is not None
+        for line in server.stderr:
+            if line.startswith("Serving"):
+                break
+        else:
+            self.fail("Server exited before starting")
+
+    def run_srcomp(self, *args: str) -> subprocess.CompletedProcess[str]:
+        return subprocess.run(
+            ['srcomp', *args],
+            capture_output=True,
+            text=True,
+            env=self.env,
+        )
+
+    def test_idle_client_does_not_block_others(self) -> None:
+        expected = self.run_srcomp('summary', str(self.compstate))
+        self.assertEqual(0, expected.returncode, expected.stderr)
+
+        self.start_server()
+
+        with mock.patch.dict(os.environ, self.env):
+            path = socket_path(self.compstate)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+            # Connect without ever finishing a request
+            idle.connect(str(path))
+
+            start = time.monotonic()
+            result = self.run_srcomp('summary', str(self.compstate))
+            duration = time.monotonic() - start
+
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertEqual(expected.stdout, result.stdout)
+        self.assertLess(duration, CLIENT_TIMEOUT_SECONDS / 2)
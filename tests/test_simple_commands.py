@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import os
 import subprocess
+import tempfile
 import unittest
 from pathlib import Path
 
@@ -23,40 +25,115 @@ class SimpleCommandsTests(unittest.TestCase):
         ('youtube-chapters', '600'),
     ]
 
-    def test_command_snapshot(self) -> None:
+    # Of the above, those which can also be answered by `srcomp serve`.
+    SERVABLE_COMMANDS: list[tuple[str, ...]] = [
+        ('awards',),
+        ('knocked-out-teams',),
+        ('show-league-table',),
+        ('show-schedule',),
+        ('summary',),
+        ('top-match-points',),
+    ]
+
+    env: dict[str, str]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        # Keep caches and server sockets away from the user's own
+        tempdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tempdir.cleanup)
+        cls.env = dict(
+            os.environ,
+            XDG_CACHE_HOME=str(Path(tempdir.name) / 'cache'),
+            XDG_RUNTIME_DIR=tempdir.name,
+        )
+        cls.env.pop('SRCOMP_CACHE_DIR', None)
+
+    def assertSnapshot(self, command_parts: tuple[str, ...]) -> None:
         dummy_compstate = Path(__file__).parent / 'dummy'
         snapshots = Path(__file__).parent / 'snapshots'
 
+        command, *args = command_parts
+
+        result = subprocess.run(
+            ['srcomp', command, str(dummy_compstate), *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=self.env,
+        )
+        self.assertEqual(0, result.returncode, result.stdout.decode())
+
+        snapshot = (snapshots / command).with_suffix('.txt')
+
+        # To record a new snapshot, uncomment the following line and run the tests:
+        # snapshot.write_bytes(result.stdout)
+
+        expected = snapshot.read_bytes()
+        self.assertEqual(
+            expected.decode(),
+            result.stdout.decode(),
+            "Command output unexpected content",
+        )
+
+    def test_command_snapshot(self) -> None:
         for command_parts in self.SIMPLE_COMMANDS:
-            command, *args = command_parts
+            with self.subTest(command_parts):
+                self.assertSnapshot(command_parts)
 
-            with self.subTest(args):
-                result = subprocess.run(
-                    ['srcomp', command, str(dummy_compstate), *args],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                )
-                self.assertEqual(0, result.returncode, result.stdout.decode())
+    def test_command_snapshot_via_server(self) -> None:
+        dummy_compstate = Path(__file__).parent / 'dummy'
 
-                snapshot = (snapshots / command).with_suffix('.txt')
+        server = subprocess.Popen(
+            ['srcomp', 'serve', str(dummy_compstate)],
+            stderr=subprocess.PIPE,
+            text=True,
+            env=self.env,
+        )
+        try:
+            assert server.stderr is not None
+            for line in server.stderr:
+                if line.startswith("Serving"):
+                    break
+            else:
+                self.fail("Server exited before starting")
 
-                # To record a new snapshot, uncomment the following line and run the tests:
-                # snapshot.write_bytes(result.stdout)
+            for command_parts in self.SERVABLE_COMMANDS:
+                with self.subTest(command_parts):
+                    self.assertSnapshot(command_parts)
+        finally:
+            server.terminate()
+            server.wait()
 
-                expected = snapshot.read_bytes()
-                self.assertEqual(
-                    expected.decode(),
-                    result.stdout.decode(),
-                    "Command output unexpected content",
-                )
+        # Check that the output came from the server rather than from the
+        # commands falling back to loading the compstate themselves
+        ran = [
+            line.split()[2]
+            for line in server.stderr
+            if line.startswith("Ran 'srcomp ")
+        ]
+        server.stderr.close()
+        self.assertEqual(
+            [command for command, *_ in self.SERVABLE_COMMANDS],
+            ran,
+            "Commands should have been run by the server",
+        )
 
     def test_commands_list(self) -> None:
-        output = subprocess.check_output(['srcomp', 'list-commands'], text=True)
+        output = subprocess.check_output(
+            ['srcomp', 'list-commands'],
+            text=True,
+            env=self.env,
+        )
         commands = set(output.split())
         self.assertIn('list-commands', commands)
 
     def test_commands_are_documented(self) -> None:
-        output = subprocess.check_output(['srcomp', 'list-commands'], text=True)
+        output = subprocess.check_output(
+            ['srcomp', 'list-commands'],
+            text=True,
+            env=self.env,
+        )
         commands = set(output.split())
 
         commands_docs_dir = Path(__file__).parent.parent / 'docs' / 'commands'
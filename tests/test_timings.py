@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+from sr.comp.cli import timings
+from sr.comp.cli.command_line import main
+
+
+class TimingsTests(unittest.TestCase):
+    def test_no_recording_when_inactive(self) -> None:
+        with timings.recording() as recorder:
+            pass
+
+        with timings.phase('outside'):
+            pass
+
+        self.assertEqual([], recorder.events)
+
+    def test_nested_phases(self) -> None:
+        clock = mock.Mock(side_effect=[0, 0, 1, 3, 4, 6, 9, 10, 11])
+
+        with mock.patch('time.perf_counter', clock):
+            with timings.recording() as recorder:
+                with timings.phase('outer'):
+                    with timings.phase('inner'):
+                        pass
+                    with timings.phase('inner'):
+                        pass
+                with timings.phase('inner'):
+                    pass
+
+        self.assertEqual(
+            [
+                timings.PhaseSummary('outer', calls=1, total=9, self_time=5),
+                timings.PhaseSummary('inner', calls=3, total=5, self_time=5),
+            ],
+            recorder.summary(),
+        )
+
+        self.assertEqual(
+            [0, 1, 1, 0],
+            [x.depth for x in sorted(recorder.events, key=lambda x: x.start)],
+        )
+
+    def test_main_reports_timings(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            trace_path = Path(tmp) / 'trace.json'
+            stdout, stderr = io.StringIO(), io.StringIO()
+
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                main(['--timings-trace', str(trace_path), 'list-commands'])
+
+            trace = json.loads(trace_path.read_text())
+
+        self.assertIn('summary', stdout.getvalue())
+
+        phases = {x['name'] for x in trace['traceEvents']}
+        self.assertEqual({'parse arguments', 'run command', 'output'}, phases)
+
+        for phase in phases:
+            self.assertIn(phase, stderr.getvalue())